@@ -0,0 +1,119 @@
+// Times one conduction step three ways on the same cup:
+//   legacy  - the old per-pair loop through PointRef, getPosition() and calculate_K
+//   scalar  - the CSR operator, one neighbor at a time
+//   simd    - the CSR operator with the AVX2 kernel (if the CPU has it)
+//   float32 - the same operator on a FLOAT32 cloud
+//   grid    - the matrix free lattice stencil (StructuredGrid)
+//   active  - the CSR operator over the ActiveSet of the initial temperatures, including the set update
+//
+// usage: bench_kernel [point_spacing=0.004] [steps=20]
+
+#include "HeatSolver.hpp"
+#include "CupGenerator.hpp"
+#include "CellList.hpp"
+#include "ActiveSet.hpp"
+#include <chrono>
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+#include <vector>
+
+namespace {
+
+using Clock = std::chrono::steady_clock;
+
+double secondsSince(Clock::time_point start) {
+    return std::chrono::duration<double>(Clock::now() - start).count();
+}
+
+// The step kernel as it was before the operator, minus the console output and the brute force search
+void legacyStep(PointCloud& cloud, HeatSolver& solver, const std::vector<Material>& materials, double dt,
+                std::vector<double>& newTemperatures) {
+    for (size_t i = 0; i < cloud.size(); ++i) {
+        auto focal = cloud.getPoint(i);
+        double currentTemp = focal.getTemperature();
+        double total = 0.0;
+        for (size_t j : focal.getNeighborIndices()) {
+            auto neighbor = cloud.getPoint(j);
+            Position a = focal.getPosition();
+            Position b = neighbor.getPosition();
+            double dx = b.x - a.x, dy = b.y - a.y, dz = b.z - a.z;
+            double distance = std::sqrt(dx*dx + dy*dy + dz*dz);
+            double k_eff = solver.calculate_K(focal.getMaterial(), neighbor.getMaterial());
+            total += k_eff * 1e-6 * (neighbor.getTemperature() - currentTemp) / distance;
+        }
+        const Material& mat = materials[static_cast<int>(focal.getMaterial())];
+        newTemperatures[i] = currentTemp + total * dt / (mat.getDensity() * mat.getSpecificHeat() * 1e-9);
+    }
+}
+
+template <class F>
+double timePerStep(int steps, F&& step) {
+    step();  // warm up caches
+    auto start = Clock::now();
+    for (int s = 0; s < steps; ++s) {
+        step();
+    }
+    return secondsSince(start) / steps;
+}
+
+}  // namespace
+
+int main(int argc, char** argv) {
+    CupGenerator::Parameters params;
+    params.pointSpacing = argc > 1 ? std::atof(argv[1]) : 0.004;
+    int steps = argc > 2 ? std::atoi(argv[2]) : 20;
+
+    CupGenerator generator;
+    PointCloud cloud = generator.generate(params);
+    std::vector<Material> materials = {Material::Coffee(), Material::Ceramic(), Material::Air()};
+    const double dt = 1e-3;
+
+    HeatSolver solver(cloud, materials, dt);
+    solver.setNumThreads(1);
+    auto start = Clock::now();
+    const auto& op = solver.getConductanceOperator();
+    double assembly = secondsSince(start);
+
+    std::vector<double> out(cloud.size());
+    const double* temps = cloud.getTemperatures().data();
+
+    double legacy = timePerStep(steps, [&] { legacyStep(cloud, solver, materials, dt, out); });
+    double scalar = timePerStep(steps, [&] { op.applyScalar(temps, out.data(), dt, 1); });
+
+    std::printf("points %zu, pairs %zu, neighbor lists + assembly %.3f s\n", cloud.size(), op.nonZeros(), assembly);
+    std::printf("legacy  %10.3f ms/step\n", legacy * 1e3);
+    std::printf("scalar  %10.3f ms/step  (%.1fx)\n", scalar * 1e3, legacy / scalar);
+    if (ConductanceOperator::hasSimdKernel()) {
+        double simd = timePerStep(steps, [&] { op.apply(temps, out.data(), dt, 1); });
+        std::printf("simd    %10.3f ms/step  (%.1fx)\n", simd * 1e3, legacy / simd);
+    } else {
+        std::printf("simd    not available on this CPU\n");
+    }
+
+    PointCloud single = cloud;
+    single.setPrecision(Precision::FLOAT32);
+    HeatSolver singleSolver(single, materials, dt);
+    singleSolver.setNumThreads(1);
+    const auto& singleOp = singleSolver.getConductanceOperator();
+    std::vector<float> out32(single.size());
+    const float* temps32 = single.getTemperatures32().data();
+    double float32 = timePerStep(steps, [&] { singleOp.apply(temps32, out32.data(), dt, 1); });
+    std::printf("float32 %10.3f ms/step  (%.1fx)\n", float32 * 1e3, legacy / float32);
+
+    if (solver.usesStructuredGrid()) {
+        const auto& grid = solver.getStructuredGrid();
+        double stencil = timePerStep(steps, [&] { grid.apply(temps, out.data(), dt, 1); });
+        std::printf("grid    %10.3f ms/step  (%.1fx, %zu point stencil)\n", stencil * 1e3, legacy / stencil,
+                    grid.getStencilSize());
+    }
+
+    // the set of the initial temperatures: the cup walls, the coffee surface and the air next to them
+    ActiveSet active;
+    std::vector<double> back(cloud.getTemperatures());
+    active.step(op, temps, back.data(), dt, 1);
+    double activeStep = timePerStep(steps, [&] { active.step(op, temps, back.data(), dt, 1); });
+    std::printf("active  %10.3f ms/step  (%.1fx, %zu of %zu points)\n", activeStep * 1e3, legacy / activeStep,
+                active.size(), cloud.size());
+    return 0;
+}
@@ -77,14 +77,9 @@ def main():
     
     plt.subplot(2, 2, 2)
     # Temperature profile along vertical axis (z)
-    z_positions = []
-    z_temperatures = []
-    for i in range(point_cloud.size()):
-        point = point_cloud.get_point(i)
-        if point.get_material() == 0:  # Coffee only
-            pos = point.get_position()
-            z_positions.append(pos.z)
-            z_temperatures.append(point.get_temperature())
+    coffee = point_cloud.get_materials() == 0  # Coffee only
+    z_positions = point_cloud.get_zs()[coffee]
+    z_temperatures = point_cloud.get_temperatures()[coffee]
     
     plt.scatter(z_positions, z_temperatures, alpha=0.6)
     plt.xlabel('Z position (m)')
@@ -94,9 +89,7 @@ def main():
     
     plt.subplot(2, 2, 3)
     # Final temperature distribution
-    final_temps = []
-    for i in range(point_cloud.size()):
-        final_temps.append(point_cloud.get_point(i).get_temperature())
+    final_temps = point_cloud.get_temperatures()
     
     plt.hist(final_temps, bins=50, alpha=0.7)
     plt.xlabel('Temperature (K)')
@@ -134,20 +134,10 @@ def update_visualization(gen_clicks, sim_clicks, size_mult, air_opacity, color_b
     
     try:
         # Extract data for visualization
-        points = []
-        materials = []
-        temperatures = []
-
-        for i in range(point_cloud.size()):
-            point = point_cloud.get_point(i)
-            pos = point.get_position()
-            points.append([pos.x, pos.y, pos.z])
-            materials.append(int(point.get_material()))
-            temperatures.append(point.get_temperature())
-        
-        points = np.array(points)
-        materials = np.array(materials)
-        temperatures = np.array(temperatures)
+        # zero-copy views of the cloud's arrays, copied once so the plot keeps this frame
+        points = np.column_stack((point_cloud.get_xs(), point_cloud.get_ys(), point_cloud.get_zs()))
+        materials = point_cloud.get_materials().copy()
+        temperatures = point_cloud.get_temperatures().copy()
         
         # DEBUG: Print temperature ranges
         print(f"Temperature range: {np.min(temperatures):.1f}K to {np.max(temperatures):.1f}K")
@@ -0,0 +1,61 @@
+#pragma once
+#include "ConductanceOperator.hpp"
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+/*
+    Explicit steps that skip thermally idle points.
+
+    Far from the cup most air points sit exactly at the ambient temperature with every neighbor at the same value,
+    so a step computes zero flux for them. A point is hot if a step changes it by more than the tolerance, and
+    the set of points that get stepped is the hot points plus a halo of their neighbors (one explicit step can't
+    carry heat further than that), so it grows as heat spreads into still air.
+
+    The step runs the operator's kernel over the set's rows, then compares old and new temperatures of those rows.
+    A row that turns hot flags its neighbors, and after that the set is sticky: rows stay in it without being
+    re-flagged, and it is only trimmed back to the current hot rows and their halo every few dozen steps, so
+    tracking the set costs little more than a compare per row. A point's flux can only change
+    if it or a neighbor changed, so with a tolerance of 0 the skipped points are exactly the ones whose step would
+    be a no-op, and any tolerance bounds how far a skipped point can lag per step.
+*/
+class ActiveSet {
+public:
+    ActiveSet();
+
+    void setTolerance(double tolerance) { tolerance_ = tolerance; }
+    double getTolerance() const { return tolerance_; }
+
+    // out = T + dt * (sum_j w_ij (T_j - T_i)) over the active rows, out = T for the rest. out must be the buffer
+    // the previous step read from (the double buffer), so rows that stay idle already hold their value.
+    // Temperatures changed by anything but these steps (implicit steps, edits, a new operator) need reset()
+    // first, which makes the next step compute every row
+    template <class Real>
+    void step(const ConductanceOperator& op, const Real* temperatures, Real* out, double dt, int numThreads = 1);
+    void reset() { valid_ = false; }
+    // False until a step has run since the last reset
+    bool isValid() const { return valid_; }
+
+    // Checkpoint section (see Checkpoint.hpp). The set only carries over together with the back buffer it was
+    // stepping into (PointCloud::writeCheckpoint) and belongs to op, read from the same checkpoint
+    void writeCheckpoint(CheckpointWriter& writer) const;
+    void readCheckpoint(CheckpointReader& reader, const ConductanceOperator& op);
+    // Takes over a set read into scratch, for op, which took over the scratch operator it was read against
+    void restoreFrom(ActiveSet&& loaded, const ConductanceOperator& op);
+
+    // Rows the last step computed, ascending
+    const std::vector<int32_t>& getPoints() const { return points_; }
+    size_t size() const { return points_.size(); }
+
+private:
+    std::vector<int32_t> points_;     // rows computed by the last step
+    std::vector<int32_t> released_;   // rows computed last step but idle next, copied across by the next step
+    std::vector<uint8_t> marks_;      // per row, set if the next step has to compute it
+    std::vector<uint8_t> expanded_;   // per row, set once it has flagged its neighbors since the last trim
+
+    double tolerance_;
+    uint64_t generation_;  // operator generation the set was built from
+    size_t stepsSinceTrim_;
+    bool changed_;         // marks_ differs from points_
+    bool valid_;
+};
@@ -0,0 +1,73 @@
+#pragma once
+#include "PointCloud.hpp"
+#include <vector>
+#include <cstddef>
+#include <cmath>
+
+/*
+    Uniform cell list over the PointCloud SoA arrays.
+
+    Points are bucketed into cubic cells of side cellSize with a counting sort, so the build is O(n).
+    A radius query only visits the cells overlapping the query sphere, which for a cutoff close to the
+    cell size is the 27 surrounding cells. This is the lattice-friendly replacement for the n^2 scan
+    HeatSolver::step used to do.
+*/
+class CellList {
+public:
+    CellList(const PointCloud& cloud, double cellSize);
+
+    // Calls visit(j) for every point j within the cutoff radius of (x, y, z) (see withinCutoff), in ascending
+    // index order per cell
+    template <class Visitor>
+    void forEachInRadius(double x, double y, double z, double radius, Visitor&& visit) const;
+
+    // Indices of all points within radius of (x, y, z), sorted ascending
+    void radiusSearch(double x, double y, double z, double radius, std::vector<size_t>& out) const;
+
+    // Fills the cloud's neighbor lists with every other point within radius (PointCloud::getPairRadius on a
+    // scaled cloud)
+    void buildNeighbors(PointCloud& cloud, double radius) const;
+
+    size_t size() const { return cellPoints_.size(); }
+    double getCellSize() const { return cellSize_; }
+
+private:
+    size_t cellCoord(double value, double origin, size_t count) const;
+
+    const PointCloud& cloud_;
+    double cellSize_;
+    double minX_, minY_, minZ_;
+    size_t nx_, ny_, nz_;
+    std::vector<size_t> cellStart_;   // CSR-style offsets into cellPoints_, one per cell plus end
+    std::vector<size_t> cellPoints_;  // point indices grouped by cell
+};
+
+template <class Visitor>
+void CellList::forEachInRadius(double x, double y, double z, double radius, Visitor&& visit) const {
+    if (cellPoints_.empty()) return;
+
+    // range of cells the query sphere (with the cutoff slack) can touch, clamped to the grid
+    auto reach = radius * (1.0 + kCutoffTolerance);
+    auto lowX = cellCoord(x - reach, minX_, nx_), highX = cellCoord(x + reach, minX_, nx_);
+    auto lowY = cellCoord(y - reach, minY_, ny_), highY = cellCoord(y + reach, minY_, ny_);
+    auto lowZ = cellCoord(z - reach, minZ_, nz_), highZ = cellCoord(z + reach, minZ_, nz_);
+
+    for (auto cz = lowZ; cz <= highZ; ++cz) {
+        for (auto cy = lowY; cy <= highY; ++cy) {
+            for (auto cx = lowX; cx <= highX; ++cx) {
+                auto cell = (cz * ny_ + cy) * nx_ + cx;
+                for (auto k = cellStart_[cell]; k < cellStart_[cell + 1]; ++k) {
+                    auto j = cellPoints_[k];
+
+                    // same distance expression as the original brute force loop so the cutoff test is identical
+                    double dx = cloud_.getX(j) - x;
+                    double dy = cloud_.getY(j) - y;
+                    double dz = cloud_.getZ(j) - z;
+                    if (withinCutoff(std::sqrt(dx*dx + dy*dy + dz*dz), radius)) {
+                        visit(j);
+                    }
+                }
+            }
+        }
+    }
+}
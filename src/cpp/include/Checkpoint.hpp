@@ -0,0 +1,113 @@
+#pragma once
+#include <cstddef>
+#include <cstdint>
+#include <fstream>
+#include <string>
+#include <type_traits>
+#include <vector>
+
+/*
+    Binary checkpoints, so a long run can stop and pick up later with the same temperatures it would have had.
+
+    A checkpoint is one file of sections in a fixed order:
+
+        header     "HEATCKPT", format version (uint32), byte order mark (uint32 0x01020304), sections (uint32)
+        cloud      PointCloud::writeCheckpoint: SoA arrays, per point scales and surface areas, neighbor lists
+        solver     HeatSolver time, step, materials and run settings
+        operator   the ConductanceOperator CSR arrays, so a restart doesn't reassemble
+        active set the ActiveSet rows and marks
+
+    The sections field has a CheckpointSection bit for each section present, so a reader knows what the file
+    holds before it reads any of it.
+
+    Scalars are written as their raw bytes and arrays as a uint64 count followed by the raw values, so saving and
+    loading are a handful of large reads and writes. A checkpoint is written to path + ".tmp" and renamed over
+    path once complete, so a crash during a save leaves the previous checkpoint intact. Files use the byte order of the machine that wrote them; a
+    file from a machine of the other order, or from a newer format version, is rejected. Any I/O or format error
+    throws std::runtime_error.
+*/
+constexpr uint32_t kCheckpointVersion = 1;
+
+enum CheckpointSection : uint32_t {
+    CHECKPOINT_CLOUD = 1,
+    CHECKPOINT_SOLVER = 2,
+    CHECKPOINT_OPERATOR = 4,
+    CHECKPOINT_ACTIVE_SET = 8
+};
+
+class CheckpointWriter {
+public:
+    // Creates path + ".tmp" and writes the header for the given CheckpointSection bits
+    CheckpointWriter(const std::string& path, uint32_t sections);
+    // Removes the temporary file of a checkpoint that was never closed
+    ~CheckpointWriter();
+
+    CheckpointWriter(const CheckpointWriter&) = delete;
+    CheckpointWriter& operator=(const CheckpointWriter&) = delete;
+
+    template <class T>
+    void write(const T& value) {
+        static_assert(std::is_trivially_copyable<T>::value, "checkpoint values are written as raw bytes");
+        writeBytes(&value, sizeof(T));
+    }
+    template <class T>
+    void writeArray(const T* values, size_t count) {
+        static_assert(std::is_trivially_copyable<T>::value, "checkpoint arrays are written as raw bytes");
+        write<uint64_t>(count);
+        writeBytes(values, count * sizeof(T));
+    }
+    template <class T>
+    void writeArray(const std::vector<T>& values) { writeArray(values.data(), values.size()); }
+
+    // Flushes the file and renames it over path, throws if any write failed
+    void close();
+
+private:
+    void writeBytes(const void* data, size_t bytes);
+
+    std::string path_;
+    std::string temporary_;
+    std::ofstream out_;
+};
+
+class CheckpointReader {
+public:
+    // Opens path and checks the header
+    explicit CheckpointReader(const std::string& path);
+
+    uint32_t getVersion() const { return version_; }
+    bool hasSection(CheckpointSection section) const { return (sections_ & section) != 0; }
+
+    template <class T>
+    T read() {
+        static_assert(std::is_trivially_copyable<T>::value, "checkpoint values are read as raw bytes");
+        T value;
+        readBytes(&value, sizeof(T));
+        return value;
+    }
+    template <class T>
+    std::vector<T> readArray() {
+        static_assert(std::is_trivially_copyable<T>::value, "checkpoint arrays are read as raw bytes");
+        auto count = read<uint64_t>();
+        // a corrupt count would otherwise allocate whatever it says before the read fails
+        if (count > remaining() / sizeof(T)) {
+            fail("array runs past the end of the file");
+        }
+        std::vector<T> values(count);
+        readBytes(values.data(), count * sizeof(T));
+        return values;
+    }
+
+    // Throws a runtime_error naming the file
+    [[noreturn]] void fail(const std::string& message) const;
+
+private:
+    void readBytes(void* data, size_t bytes);
+    uint64_t remaining();
+
+    std::string path_;
+    std::ifstream in_;
+    uint64_t size_;
+    uint32_t version_;
+    uint32_t sections_;
+};
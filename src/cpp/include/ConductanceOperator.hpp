@@ -0,0 +1,103 @@
+#pragma once
+#include "PointCloud.hpp"
+#include "Material.hpp"
+#include <array>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+// Effective conductivity for every (material, material) pair, indexed by MaterialType
+using ConductanceTable = std::array<std::array<double, 3>, 3>;
+
+// Heat exchange of exposed points (PointCloud::getSurfaceArea) with the surroundings
+struct SurfaceExchange {
+    double coefficient = 0.0;            // combined heat transfer coefficient h, W/(m^2 K)
+    double ambientTemperature = 293.15;  // K
+};
+
+/*
+    Precompiled conduction operator in compressed sparse row form.
+
+    Geometry and materials don't change during a run, so the distance, the k_eff harmonic mean and the contact
+    area of every neighbor pair are folded into one weight when the operator is assembled:
+
+        w_ij = k_eff * A / (d_ij * rho_i * c_i * V)        so that      dT_i/dt = sum_j w_ij (T_j - T_i)
+
+    On a cloud with point scales, V becomes V * s_i^3 and A becomes A * min(s_i, s_j)^2, so C_i * w_ij stays symmetric.
+    On an axisymmetric cloud V is the ring's volume V * m_i and A the mean ring A * (m_i + m_j) / 2 (m_i =
+    PointCloud::getRingFactor), times a constant that gives the plane stencil the diffusivity of the 3D one.
+
+    Exposed points also lose heat to the surroundings, dT_i/dt += g_i (T_amb - T_i) with g_i = h * A * a_i / (rho_i c_i V)
+    for an exposed area of a_i contact areas. The sinks live next to the rows and every kernel adds them.
+
+    Row i holds the neighbors of point i (columns ascending). A time step is then a single sparse pass over
+    the temperature array. The arrays use the scipy.sparse.csr_matrix layout (indptr, indices, data).
+*/
+class ConductanceOperator {
+public:
+    ConductanceOperator();
+
+    // Builds the rows from the cloud's neighbor lists
+    void assemble(const PointCloud& cloud, const std::vector<Material>& materials,
+                  const ConductanceTable& conductance, double contactArea, double pointVolume,
+                  int numThreads = 1, const SurfaceExchange& surface = SurfaceExchange{});
+
+    // True if assembled from this revision of the cloud
+    bool isCurrent(const PointCloud& cloud) const;
+    void invalidate();
+
+    // out[i] = T[i] + dt * (sum_j w_ij (T[j] - T[i]) + g_i (T_amb - T[i])), rows split over numThreads OpenMP threads.
+    // Uses the AVX2 kernel when the CPU has it, which may differ from applyScalar in the last bits
+    void apply(const double* temperatures, double* out, double dt, int numThreads = 1) const;
+    // Portable kernel, one neighbor at a time in column order
+    void applyScalar(const double* temperatures, double* out, double dt, int numThreads = 1) const;
+    // Single precision step on the float weights, only available when assembled from a FLOAT32 cloud
+    void apply(const float* temperatures, float* out, double dt, int numThreads = 1) const;
+    // apply() for rowList[0..count) only (rows 0..count if rowList is null), leaving the rest of out untouched
+    void applySubset(const int32_t* rowList, size_t count, const double* temperatures, double* out, double dt,
+                     int numThreads = 1) const;
+    void applySubset(const int32_t* rowList, size_t count, const float* temperatures, float* out, double dt,
+                     int numThreads = 1) const;
+    // True if apply() runs the AVX2 kernel on this machine
+    static bool hasSimdKernel();
+
+    size_t rows() const { return rowPointers_.empty() ? 0 : rowPointers_.size() - 1; }
+    size_t nonZeros() const { return weights_.size(); }
+
+    const std::vector<int64_t>& getRowPointers() const { return rowPointers_; }
+    const std::vector<int32_t>& getColumnIndices() const { return columnIndices_; }
+    const std::vector<double>& getWeights() const { return weights_; }
+    // Rounded copy of the weights, empty unless assembled from a FLOAT32 cloud
+    const std::vector<float>& getWeights32() const { return weights32_; }
+    // rho_i * c_i * V per row, so w_ij * C_i recovers the symmetric conductance k_eff * A / d
+    const std::vector<double>& getCapacities() const { return capacities_; }
+    // Surface sink g_i per row, empty if no point is exposed or the coefficient is 0
+    const std::vector<double>& getSinks() const { return sinks_; }
+    double getAmbientTemperature() const { return ambientTemperature_; }
+    // Explicit Euler is stable for dt <= 1 / max_i (sum_j w_ij + g_i) (infinite if no point has neighbors)
+    double getStableTimeStep() const { return stableTimeStep_; }
+    // Incremented on every assemble, lets caches built from the operator tell when it changed
+    uint64_t getGeneration() const { return generation_; }
+
+    // Checkpoint section (see Checkpoint.hpp). Reading counts as an assemble from cloud, which has to be the cloud
+    // the operator was saved with, just read from the same checkpoint
+    void writeCheckpoint(CheckpointWriter& writer) const;
+    void readCheckpoint(CheckpointReader& reader, const PointCloud& cloud);
+    // Takes over an operator read into scratch, whose cloud has since been moved into cloud (PointCloud::restoreFrom)
+    void restoreFrom(ConductanceOperator&& loaded, const PointCloud& cloud);
+
+private:
+    std::vector<int64_t> rowPointers_;
+    std::vector<int32_t> columnIndices_;
+    std::vector<double> weights_;
+    std::vector<float> weights32_;
+    std::vector<double> capacities_;
+    std::vector<double> sinks_;
+    std::vector<float> sinks32_;
+    double ambientTemperature_;
+
+    const PointCloud* source_;  // nullptr until assembled
+    uint64_t revision_;
+    uint64_t generation_;
+    double stableTimeStep_;
+};
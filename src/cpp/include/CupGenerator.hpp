@@ -1,5 +1,7 @@
 #pragma once
 #include "PointCloud.hpp"
+#include <cstddef>
+#include <limits>
 
 class CupGenerator {
 public:
@@ -12,9 +14,36 @@ public:
         double coffeeTemp = 383.15;    // in Kelvin
         double cupTemp = 300.15;       // 20°C in Kelvin
         double airTemp = 293.15;       // 20°C in Kelvin
+        Precision precision = Precision::FLOAT64;  // temperature storage of the generated cloud
+        double coarseSpacing = 0.0;    // graded cloud when larger than pointSpacing: spacing far from the cup
+        double refinementBand = 0.0;   // extra distance from a material interface kept at every level's finer spacing
+        bool includeAir = true;        // false: only coffee and cup points, with the exposed ones given surface areas
+        bool axisymmetric = false;     // true: the (r, z) half plane only, one point per ring (coarseSpacing is ignored)
+        // only the lattice layers firstLayer <= k < lastLayer (z = k * pointSpacing), so a process can generate just
+        // its slab of a partitioned run; not available for graded clouds
+        size_t firstLayer = 0;
+        size_t lastLayer = std::numeric_limits<size_t>::max();
     };
     
     CupGenerator();
     
+    // Uniform lattice, or with coarseSpacing > pointSpacing an octree-graded cloud: a cube of lattice points that
+    // is a single material, along with half its edge (plus refinementBand) around it, merges into one point whose
+    // scale is the cube edge in lattice steps. Levels go up in powers of two, up to coarseSpacing, so the spacing
+    // grows gradually away from the cup walls and the coffee surface.
+    // Without air, points are only made for the coffee and the cup, and every point gets one reference contact
+    // area of surface (PointCloud::setSurfaceArea) per lattice face that looks onto air or out of the box, for
+    // HeatSolver's surface heat transfer model.
+    // The cup is a body of revolution, so an axisymmetric cloud (PointCloud::setAxisymmetric) of the lattice
+    // rows at y = 0, x >= 0 carries the same solution with a fraction of the points; the air then fills the
+    // cylinder of the box's half width rather than the square box
     PointCloud generate(const Parameters& params);
+    // Lattice layers in z of the full box. Clouds are generated layer by layer, so the points of a layer are
+    // contiguous and come in the same order whichever layer range is generated
+    static size_t getLayerCount(const Parameters& params);
+
+private:
+    // Lattice and octree path behind the graded and air-free clouds
+    PointCloud generateOctree(const Parameters& params);
+    PointCloud generateAxisymmetric(const Parameters& params);
 };
\ No newline at end of file
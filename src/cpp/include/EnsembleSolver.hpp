@@ -0,0 +1,95 @@
+#pragma once
+#include "HeatSolver.hpp"
+#include <array>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+/*
+    Many scenarios on one geometry, stepped together.
+
+    A parameter study runs the same cup with other starting temperatures or material variants. The pair
+    weights split into a geometric part, A / (d V) with the scale and ring factors, that only depends on the
+    cloud, and a material part k_eff(m_i, m_j) / (rho_i c_i) that only depends on the two materials:
+
+        w_ij^s = g_ij * K^s[m_i][m_j]
+
+    so the ensemble assembles g once (a HeatSolver over unit materials, which also builds the neighbor lists)
+    and keeps a 3x3 table per scenario. Temperatures are an n x scenarios row-major matrix, so a step reads
+    every row of the operator once and updates all scenarios of a point from contiguous memory.
+
+    Scenarios start from the cloud's temperatures when they are added; the cloud itself is never stepped.
+*/
+class EnsembleSolver {
+public:
+    EnsembleSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep);
+
+    // New scenario with these materials (the ensemble's if empty), starting from the cloud's temperatures.
+    // Returns its index
+    size_t addScenario(const std::vector<Material>& materials = {});
+    size_t getScenarioCount() const { return scenarios_.size(); }
+    const std::vector<Material>& getMaterials(size_t scenario) const;
+
+    // Starting conditions: every point of the material, or the whole column of the scenario
+    void setTemperature(size_t scenario, MaterialType material, double temperature);
+    void setTemperatures(size_t scenario, const std::vector<double>& temperatures);
+    std::vector<double> getTemperatures(size_t scenario) const;
+    // The n x scenarios matrix, row-major
+    const std::vector<double>& getTemperatureMatrix() const { return temperatures_; }
+
+    // One explicit Euler step of every scenario
+    void step();
+    void run_for_time(double duration);
+    double getCurrentTime() const { return currentTime_; }
+    double getTimeStep() const { return timeStep_; }
+    // Largest step that is stable for every scenario
+    double getStableTimeStep();
+
+    // Volume weighted, like HeatSolver::getAverageTemperature
+    double getAverageTemperature(size_t scenario, MaterialType material) const;
+    // run_for_time records the averages of every scenario after every recordInterval-th step (and the last one)
+    void setRecordInterval(size_t steps);
+    // Times of the records since the last run_for_time started
+    const std::vector<double>& getTimes() const { return times_; }
+    // records x scenarios, row-major
+    const std::vector<double>& getAverageTemperatureSeries(MaterialType material) const;
+
+    // Forwarded to the geometry solver (the sinks are shared; each scenario divides them by its own rho * c)
+    void setSurfaceHeatTransfer(double convectionCoefficient, double emissivity = 0.9);
+    void setAmbientTemperature(double temperature);
+    double getAmbientTemperature() const;
+
+    void setNumThreads(int numThreads);
+    int getNumThreads() const;
+
+private:
+    struct Scenario {
+        std::vector<Material> materials;
+    };
+
+    // Reassembles the geometric operator and the per pair material codes if the cloud changed
+    void ensureGeometry();
+    // Rebuilds the scenario tables if a scenario was added
+    void ensureTables();
+    void record();
+
+    PointCloud& pointCloud_;
+    std::vector<Material> materials_;
+    HeatSolver geometry_;  // unit materials, so its operator weights are g_ij
+    double timeStep_;
+    double currentTime_;
+
+    std::vector<Scenario> scenarios_;
+    std::vector<double> temperatures_;      // n x scenarios
+    std::vector<double> nextTemperatures_;
+
+    uint64_t generation_;                   // geometry operator generation the codes belong to (0 = never)
+    std::vector<uint8_t> pairCodes_;        // 3 * m_i + m_j per nonzero
+    std::vector<double> pairTables_;        // 9 x scenarios: k_eff / (rho_i c_i) by pair code
+    std::vector<double> sinkTables_;        // 3 x scenarios: 1 / (rho c) by material
+    bool tablesCurrent_;
+
+    size_t recordInterval_;
+    std::vector<double> times_;
+    std::array<std::vector<double>, 3> series_;
+};
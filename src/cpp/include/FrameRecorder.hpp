@@ -0,0 +1,133 @@
+#pragma once
+#include "PointCloud.hpp"
+#include <condition_variable>
+#include <cstddef>
+#include <cstdint>
+#include <deque>
+#include <exception>
+#include <fstream>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+/*
+    Snapshots of a run without stalling it on disk I/O.
+
+    FrameRecorder::record copies the cloud's temperature buffer into one of a fixed pool of frame buffers and
+    hands it to a writer thread, which appends it to a single frame file. The solver only ever pays for the copy:
+    the file system calls happen on the writer thread. When every buffer is queued, the writer is behind, and
+    record either drops the frame (DROP, the default: the run never waits) or waits for the writer to free a
+    buffer (BLOCK, so no frame is lost and the run slows to the disk's pace).
+
+    The frame file holds the geometry once and then fixed size frames:
+
+        header   "HEATFRMS", version (uint32), byte order mark (uint32), precision (uint32), points (uint64)
+        geometry x, y, z (double) and material (uint8) of every point
+        frames   time (double) and the temperatures in the cloud's precision, back to back
+
+    so frame k sits at a computed offset and FrameReader reads any frame without scanning. The frame count comes
+    from the file size, so a file cut short by a crash still reads up to its last complete frame.
+*/
+
+enum class QueueOverflow {
+    BLOCK = 0,  // record waits for the writer to free a buffer
+    DROP = 1    // record skips the frame and counts it, the default
+};
+
+class FrameRecorder {
+public:
+    // Creates path and writes the geometry of cloud, whose size and precision every recorded frame must have.
+    // queueCapacity frame buffers are allocated up front
+    FrameRecorder(const std::string& path, const PointCloud& cloud, size_t queueCapacity = 8,
+                  QueueOverflow overflow = QueueOverflow::DROP);
+    // Writes out the queued frames
+    ~FrameRecorder();
+
+    FrameRecorder(const FrameRecorder&) = delete;
+    FrameRecorder& operator=(const FrameRecorder&) = delete;
+
+    // Queues the cloud's current temperatures as the frame at time. Returns false if the frame was dropped or the
+    // recorder is closed. Rethrows a write error of the writer thread
+    bool record(const PointCloud& cloud, double time);
+    // Waits until every queued frame is in the file and flushed
+    void flush();
+    // Flushes and stops the writer thread; record afterwards does nothing. Safe to call more than once and from
+    // several threads: every call returns once the file is closed
+    void close();
+    bool isClosed() const;
+
+    size_t getWrittenFrames() const;
+    size_t getDroppedFrames() const;
+    // Times record had to wait for a free buffer
+    size_t getStalls() const;
+    const std::string& getPath() const { return path_; }
+
+private:
+    struct Frame {
+        double time = 0.0;
+        std::vector<double> values;
+        std::vector<float> values32;
+    };
+
+    void writeLoop();
+    void rethrow();
+
+    std::string path_;
+    std::ofstream file_;
+    size_t points_;
+    Precision precision_;
+    QueueOverflow overflow_;
+
+    std::vector<Frame> frames_;       // the buffer pool
+    std::deque<size_t> free_;         // buffers record can fill
+    std::deque<size_t> queued_;       // buffers waiting for the writer, oldest first
+    bool writing_;                    // the writer holds a buffer outside both queues
+    bool closing_;                    // close was called; the first caller joins the writer
+    bool stopped_;                    // the writer thread has left its loop
+    bool closed_;                     // the writer is joined and the file closed
+    std::exception_ptr error_;
+    size_t written_;
+    size_t dropped_;
+    size_t stalls_;
+
+    mutable std::mutex mutex_;
+    std::condition_variable frameQueued_;
+    std::condition_variable bufferFreed_;  // also signals stopped_ and closed_
+    std::thread writer_;                   // joined only by the close call that set closing_
+};
+
+// Random access to the frames of a FrameRecorder file, which may still be growing
+class FrameReader {
+public:
+    explicit FrameReader(const std::string& path);
+
+    size_t getPointCount() const { return points_; }
+    Precision getPrecision() const { return precision_; }
+    // Complete frames in the file right now
+    size_t getFrameCount();
+
+    const std::vector<double>& getXs() const { return x_; }
+    const std::vector<double>& getYs() const { return y_; }
+    const std::vector<double>& getZs() const { return z_; }
+    const std::vector<MaterialType>& getMaterials() const { return materials_; }
+
+    double getTime(size_t frame);
+    // Temperatures of the frame, widened to double for a FLOAT32 file; out holds getPointCount values
+    void readTemperatures(size_t frame, double* out);
+    std::vector<double> getTemperatures(size_t frame);
+
+private:
+    // Seeks to the start of the frame, throws if it isn't complete yet
+    void seekFrame(size_t frame);
+
+    std::string path_;
+    std::ifstream file_;
+    size_t points_;
+    Precision precision_;
+    uint64_t dataStart_;
+    uint64_t frameBytes_;
+    std::vector<double> x_, y_, z_;
+    std::vector<MaterialType> materials_;
+    std::vector<float> scratch32_;
+};
@@ -1,24 +1,240 @@
 #pragma once
 #include "PointCloud.hpp"
 #include "Material.hpp"
+#include "ConductanceOperator.hpp"
+#include "StructuredGrid.hpp"
+#include "ActiveSet.hpp"
+#include "FrameRecorder.hpp"
+#include "Log.hpp"
+#include <Eigen/Sparse>
+#include <Eigen/IterativeLinearSolvers>
+#include <atomic>
+#include <cstdint>
+#include <functional>
+#include <string>
 #include <vector>
 
+// Time integration scheme used by HeatSolver::step
+enum class Integrator {
+    EXPLICIT_EULER = 0,  // forward Euler on the CSR operator, cheap but only stable for small steps
+    BACKWARD_EULER = 1,  // implicit, unconditionally stable and damped
+    CRANK_NICOLSON = 2   // implicit trapezoidal rule, second order in time
+};
+
+// How explicit steps find their neighbors
+enum class Backend {
+    AUTO = 0,             // structured grid if the cloud is a complete lattice, point cloud otherwise
+    POINT_CLOUD = 1,      // neighbor lists and the CSR operator, works for any geometry
+    STRUCTURED_GRID = 2   // fixed stencil on the lattice, throws if the cloud isn't one
+};
+
+// How far a FLOAT32 run ends up from the same run in FLOAT64
+struct PrecisionDrift {
+    double maxDifference = 0.0;      // largest |T32 - T64| over all points, K
+    double rmsDifference = 0.0;      // root mean square of T32 - T64, K
+    double coffeeDifference = 0.0;   // average coffee temperature, FLOAT32 minus FLOAT64, K
+    size_t steps = 0;
+};
+
+// Shared with another thread that watches a run_for_time in progress (SimulationJob): the run publishes its time
+// and step count after every committed step, and stops between two steps once cancel is set
+struct RunControl {
+    std::atomic<bool> cancel{false};
+    std::atomic<double> time{0.0};
+    std::atomic<uint64_t> steps{0};
+    // Called on the run's thread after every committed step, while the solver is between steps and may be read
+    std::function<void()> onStep;
+};
+
 class HeatSolver {
 public:
-    HeatSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep);
+    HeatSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep,
+               Integrator integrator = Integrator::EXPLICIT_EULER);
 
     double calculate_K(MaterialType mat1, MaterialType mat2);
+    // The pair conductivity law (harmonic mean across materials) for any material table; EnsembleSolver builds its
+    // per scenario tables with it too
+    static double calculate_K(const std::vector<Material>& materials, MaterialType mat1, MaterialType mat2);
+    static ConductanceTable conductanceTable(const std::vector<Material>& materials);
     void step();
     void run_for_time(double duration);
+    // run_for_time reporting to control, false if it was cancelled before duration had passed
+    bool run_for_time(double duration, RunControl& control);
     
     double getCurrentTime() const;
     double getAverageTemperature(MaterialType material) const;
     double getMaxTemperature() const;
     double getMinTemperature() const;
 
+    // Points closer than this exchange heat (the 1 cm cutoff)
+    double getNeighborRadius() const;
+
+    // Replacing the material table forces the operator to be reassembled on the next step
+    void setMaterials(const std::vector<Material>& materials);
+    const std::vector<Material>& getMaterials() const;
+
+    // The precompiled conduction operator, assembled first if the cloud or materials changed
+    const ConductanceOperator& getConductanceOperator();
+
+    // OpenMP threads used by step() and the statistics (0 = OpenMP default)
+    void setNumThreads(int numThreads);
+    int getNumThreads() const;
+    // Deterministic mode makes every result bit-identical regardless of thread count
+    void setDeterministic(bool deterministic);
+    bool isDeterministic() const;
+    // Threads available to OpenMP, 1 when built without it
+    static int getMaxThreads();
+
+    Integrator getIntegrator() const;
+    void setIntegrator(Integrator integrator);
+    // Relative residual and iteration cap for the conjugate gradient solve of the implicit modes
+    void setSolverTolerance(double tolerance);
+    void setMaxSolverIterations(int iterations);
+    int getLastSolverIterations() const;
+    double getLastSolverError() const;
+
+    // Adaptive mode: run_for_time sizes each step from the stability limit and the temperature change per step
+    void setAdaptiveTimeStep(bool enabled, double maxTemperatureChange = 0.5);
+    bool isAdaptiveTimeStep() const;
+    void setMaxTimeStep(double maxTimeStep);
+    // Largest stable explicit Euler step for the current operator
+    double getStableTimeStep();
+    double getTimeStep() const;
+    // Step sizes taken by the last adaptive run_for_time
+    const std::vector<double>& getStepSizes() const;
+
+    // Explicit steps on a lattice cloud run matrix free on a StructuredGrid; the implicit modes always use the operator
+    void setBackend(Backend backend);
+    Backend getBackend() const;
+    // True if explicit steps currently run on the structured grid
+    bool usesStructuredGrid();
+    const StructuredGrid& getStructuredGrid();
+
+    // run_for_time logs progress at INFO level at most once per this many seconds of wall time
+    void setProgressInterval(double seconds);
+
+    // Active set stepping: explicit steps only compute points that changed by more than tolerance K in their last
+    // step, plus their neighbors (see ActiveSet). Runs on the point cloud backend. Temperatures edited between
+    // steps (PointCloud::getTemperatureRevision) make the next step compute every point again
+    void setActiveSetStepping(bool enabled, double tolerance = 1e-6);
+    bool isActiveSetStepping() const;
+    void resetActiveSet();
+    // Points the last step updated (all of them unless active set stepping is on)
+    size_t getActiveCount() const;
+    // Points updated by each step since the last run_for_time started
+    const std::vector<size_t>& getActiveCounts() const;
+
+    // Surface loss for clouds generated without air: exposed points (PointCloud::getSurfaceArea) exchange heat
+    // with the ambient by convection and by radiation linearized around the ambient, so the combined coefficient
+    // is h = convection + 4 * emissivity * sigma * T_amb^3 (defaults 10 W/(m^2 K) and 0.9)
+    void setSurfaceHeatTransfer(double convectionCoefficient, double emissivity = 0.9);
+    double getSurfaceHeatTransferCoefficient() const;
+    // Ambient the surface exchanges with, the air material's ambient temperature unless set
+    void setAmbientTemperature(double temperature);
+    double getAmbientTemperature() const;
+
+    // Binary checkpoint (see Checkpoint.hpp) of the cloud, the time, step, materials and settings, and the
+    // assembled operator and active set. Loading replaces the cloud's contents and this solver's state, so stepping
+    // on gives bit for bit the temperatures of the run that saved it. The thread count and progress interval are
+    // the loading machine's business and stay as they are
+    void saveCheckpoint(const std::string& path) const;
+    void loadCheckpoint(const std::string& path);
+
+    // Hands the temperatures to recorder after every interval-th step (counted from here), so snapshots are written
+    // on the recorder's thread while the run goes on. The solver doesn't own the recorder; nullptr detaches it
+    void setFrameRecorder(FrameRecorder* recorder, size_t interval = 1);
+
 private:
+    // (Re)builds the cloud's neighbor lists with a cell list if they are missing or use another radius
+    void ensureNeighbors();
+    // Reassembles the CSR operator if the cloud or materials changed since the last build
+    void ensureOperator();
+    // Rebuilds the lattice stencil if needed, true if the next explicit step should use it
+    bool ensureStructuredGrid();
+    // Stability limit of whichever backend explicit steps use
+    double currentStableTimeStep();
+    ConductanceTable conductanceTable();
+    int threadCount() const;
+    // Computes the temperatures after a step of dt into the cloud's back buffer without touching the committed ones
+    void computeStep(double dt);
+    // Explicit step over the active set only
+    template <class Real>
+    void activeStep(const std::vector<Real>& temps, std::vector<Real>& next, double dt);
+    // Largest change between the committed and back buffers
+    double maxTemperatureChange();
+    template <class Real>
+    double maxTemperatureChange(const std::vector<Real>& temps, const std::vector<Real>& next) const;
+    template <class Real>
+    double averageTemperature(const std::vector<Real>& temps, MaterialType material) const;
+    template <class Real>
+    double maxTemperature(const std::vector<Real>& temps) const;
+    template <class Real>
+    double minTemperature(const std::vector<Real>& temps) const;
+    void runAdaptive(double endTime);
+    void reportProgress(ProgressReporter& progress, double endTime) const;
+    // Bookkeeping after a step is committed: recording frames, publishing progress to control_
+    void stepCommitted();
+    bool stopRequested() const { return control_ && control_->cancel.load(std::memory_order_relaxed); }
+    // Implicit step: solves (C + theta*dt*(D - G)) T' = C T + (1 - theta)*dt*(G - D) T with CG
+    void implicitStep(double dt, const std::vector<double>& temps, std::vector<double>& newTemperatures);
+    // Rebuilds the implicit system matrix if the operator, step size or scheme changed
+    void ensureImplicitSystem(double dt, double theta);
+
     PointCloud& pointCloud_;
-    const std::vector<Material> materials_;
+    std::vector<Material> materials_;
     double timeStep_;
     double currentTime_;
-};
\ No newline at end of file
+    double neighborRadius_;
+    ConductanceOperator conductance_;
+    int numThreads_;
+    bool deterministic_;
+
+    Integrator integrator_;
+    using SystemMatrix = Eigen::SparseMatrix<double, Eigen::RowMajor>;
+    SystemMatrix implicitMatrix_;
+    // the system is symmetric positive definite, so CG on the full matrix (Lower|Upper lets Eigen thread the products)
+    Eigen::ConjugateGradient<SystemMatrix, Eigen::Lower | Eigen::Upper> conjugateGradient_;
+    uint64_t implicitGeneration_;  // operator generation the matrix was built from (0 = never)
+    double implicitTimeStep_;
+    double implicitTheta_;
+    double solverTolerance_;
+    int maxSolverIterations_;
+    int lastSolverIterations_;
+    double lastSolverError_;
+    std::vector<double> implicitInput_;   // double copies of a FLOAT32 cloud's temperatures for the CG solve
+    std::vector<double> implicitOutput_;
+
+    bool adaptive_;
+    double maxTemperatureChange_;
+    double maxTimeStep_;
+    double adaptiveTimeStep_;  // next step size the controller will try
+    std::vector<double> stepSizes_;
+    bool stabilityChecked_;
+    double progressInterval_;
+
+    Backend backend_;
+    StructuredGrid structuredGrid_;
+
+    bool activeSetStepping_;
+    ActiveSet activeSet_;
+    size_t activeCount_;
+    std::vector<size_t> activeCounts_;
+
+    double convectionCoefficient_;
+    double emissivity_;
+    double ambientTemperature_;
+    bool ambientOverride_;
+
+    FrameRecorder* recorder_;
+    size_t recordInterval_;
+    size_t stepsSinceRecord_;
+
+    uint64_t temperatureRevision_;  // the cloud's temperature revision the active set last saw
+    RunControl* control_;  // of the run_for_time in progress, if it has one
+};
+
+// Runs copies of cloud in both precisions for duration and compares the final temperatures, to judge
+// whether single precision is accurate enough for a run
+PrecisionDrift measurePrecisionDrift(const PointCloud& cloud, const std::vector<Material>& materials,
+                                     double timeStep, double duration,
+                                     Integrator integrator = Integrator::EXPLICIT_EULER);
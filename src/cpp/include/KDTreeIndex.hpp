@@ -0,0 +1,38 @@
+#pragma once
+#include "PointCloud.hpp"
+#include <nanoflann.hpp>
+#include <memory>
+#include <vector>
+#include <cstddef>
+
+/*
+    KD-tree radius index for point clouds that are not lattice aligned (scanned or jittered geometry),
+    built on the nanoflann adaptor hooks PointCloud already exposes. Build is O(n log n) and a radius
+    query is O(log n + k).
+
+    The tree only reads coordinates, so one index can fill the neighbor lists of any cloud with the same
+    geometry, which lets many solver runs share a single build.
+*/
+class KDTreeIndex {
+public:
+    explicit KDTreeIndex(const PointCloud& cloud, size_t leafSize = 10);
+
+    // Indices of all points within radius of (x, y, z), sorted ascending
+    void radiusSearch(double x, double y, double z, double radius, std::vector<size_t>& out) const;
+
+    // Fills the neighbor lists of cloud (which must have the indexed geometry) with every other point within radius
+    // (PointCloud::getPairRadius on a scaled cloud)
+    void buildNeighbors(PointCloud& cloud, double radius) const;
+
+    size_t size() const { return pointCount_; }
+    size_t getLeafSize() const { return leafSize_; }
+
+private:
+    using Tree = nanoflann::KDTreeSingleIndexAdaptor<
+        nanoflann::L2_Simple_Adaptor<double, PointCloud>, PointCloud, 3, size_t>;
+
+    const PointCloud& cloud_;
+    size_t pointCount_;
+    size_t leafSize_;
+    std::unique_ptr<Tree> tree_;
+};
@@ -0,0 +1,72 @@
+#pragma once
+#include <atomic>
+#include <chrono>
+#include <functional>
+#include <sstream>
+#include <string>
+
+enum class LogLevel {
+    TRACE = 0,
+    DEBUG = 1,
+    INFO = 2,
+    WARNING = 3,
+    ERROR = 4,
+    OFF = 5
+};
+
+// Messages below this level are compiled out entirely (pass -DHEAT_LOG_MIN_LEVEL=0 to keep TRACE)
+#ifndef HEAT_LOG_MIN_LEVEL
+#define HEAT_LOG_MIN_LEVEL 1
+#endif
+
+/*
+    Leveled diagnostics channel for the solver.
+
+    Messages go through HEAT_LOG, which checks the compile-time floor and the runtime level before the message
+    is even formatted, so a disabled message costs one comparison. The default level is WARNING, so nothing is
+    written per step or per pair in production. Output goes to a sink, stderr by default; the Python module
+    installs one that forwards to the "heat_transfer" logger.
+*/
+namespace Log {
+
+using Sink = std::function<void(LogLevel, const std::string&)>;
+
+void setLevel(LogLevel level);
+LogLevel getLevel();
+
+void setSink(Sink sink);
+void resetSink();  // back to stderr
+
+void write(LogLevel level, const std::string& message);
+
+// Runtime level, read on every HEAT_LOG with a relaxed load so the check inlines to a compare
+extern std::atomic<int> currentLevel;
+
+inline bool enabled(LogLevel level) {
+    return static_cast<int>(level) >= HEAT_LOG_MIN_LEVEL &&
+           static_cast<int>(level) >= currentLevel.load(std::memory_order_relaxed);
+}
+
+}  // namespace Log
+
+#define HEAT_LOG(level, expr)                                 \
+    do {                                                      \
+        if (Log::enabled(level)) {                            \
+            std::ostringstream heat_log_stream_;              \
+            heat_log_stream_ << expr;                         \
+            Log::write(level, heat_log_stream_.str());        \
+        }                                                     \
+    } while (0)
+
+// Lets a long loop report progress at most once every interval of wall time
+class ProgressReporter {
+public:
+    explicit ProgressReporter(double intervalSeconds = 1.0);
+
+    // True when a report is due, restarting the interval
+    bool due();
+
+private:
+    std::chrono::steady_clock::duration interval_;
+    std::chrono::steady_clock::time_point last_;
+};
@@ -1,23 +1,85 @@
 #pragma once
 #include "Point.hpp"
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <limits>
 #include <vector>
 #include <string>
 #include <cstddef>  // For size_t
+#include <cstdint>  // For uint64_t
+#include <utility>  // For std::move
+
+// Storage type of the temperature buffers (coordinates are always double, they're only read when
+// neighbor lists and the operator are built)
+enum class Precision {
+    FLOAT64 = 0,
+    FLOAT32 = 1   // half the memory traffic per step, for runs that don't need double accuracy
+};
+
+// Two points are neighbors if their distance is within the cutoff radius. Lattice points exactly one cutoff
+// apart would otherwise drop in and out depending on how their coordinates rounded, so the test allows this
+// relative slack; every neighbor index and the structured grid use it
+constexpr double kCutoffTolerance = 1e-9;
+inline bool withinCutoff(double distance, double radius) {
+    return distance <= radius * (1.0 + kCutoffTolerance);
+}
+
+// Volume weighted temperature sums over a range of points, by MaterialType, so averages over several clouds (the
+// partitions of a decomposed run) can be combined: average = weighted / volume
+struct TemperatureSums {
+    std::array<double, 3> weighted{};  // sum of v_i * T_i
+    std::array<double, 3> volume{};    // sum of v_i (PointCloud::getVolumeFactor)
+    double max = -std::numeric_limits<double>::infinity();
+    double min = std::numeric_limits<double>::infinity();
+};
+
+// for the ring volumes of axisymmetric clouds
+constexpr double kPi = 3.14159265358979323846;
 
 // Forward declaration for nanoflann compatibility
 template <class T> struct nanoflann_adaptor;
 
+class CheckpointWriter;
+class CheckpointReader;
+
 class PointCloud {
 private:
     // SoA storage
     std::vector<double> x_;
     std::vector<double> y_;
     std::vector<double> z_;
-    std::vector<double> temperatures_;
+    std::vector<double> temperatures_;      // committed (front) buffer, what every accessor reads
+    std::vector<double> nextTemperatures_;  // back buffer the solver writes a step into before swapping
+    std::vector<float> temperatures32_;      // same pair of buffers in FLOAT32 mode (the double ones stay empty)
+    std::vector<float> nextTemperatures32_;
+    Precision precision_ = Precision::FLOAT64;
     std::vector<MaterialType> materials_;
     
-    // For neighbor storage (will be added later)
+    // Size of each point relative to a reference point, empty when every point is the reference size. A point
+    // of scale s stands for s^3 of the reference volume, touches its neighbors through s^2 of the reference
+    // contact area, and its pairs reach the neighbor cutoff times the mean scale of the two points (graded clouds
+    // from CupGenerator)
+    std::vector<double> scales_;
+    
+    // Area of each point open to the surroundings, in units of the reference contact area, empty when no point
+    // is exposed (clouds that model the air with points)
+    std::vector<double> surfaceAreas_;
+    
+    // Lattice spacing of an axisymmetric cloud, 0 for an ordinary 3D one (see setAxisymmetric)
+    double ringSpacing_ = 0.0;
+    
+    // Neighbor lists, filled by a spatial index (CellList) for every point within neighborRadius_
     std::vector<std::vector<size_t>> neighbors_;
+    double neighborRadius_ = 0.0;  // 0 when the lists are missing or stale
+    
+    // Bumped whenever geometry, materials or neighbor lists change, so cached operators know to rebuild
+    uint64_t revision_ = 0;
+    
+    // Bumped whenever temperatures change other than by a solver committing a step (setTemperature,
+    // assignTemperatures, writable views), so an active set knows its idle rows may be stale
+    uint64_t temperatureRevision_ = 0;
+    size_t temperatureWriters_ = 0;  // writable temperature views alive, whose writes can't be seen one by one
     
 public:
     PointCloud();
@@ -37,11 +99,11 @@ public:
         }
         
         double getTemperature() const { 
-            return cloud_->temperatures_[index_]; 
+            return cloud_->getTemperature(index_); 
         }
         
         void setTemperature(double temp) { 
-            cloud_->temperatures_[index_] = temp; 
+            cloud_->setTemperature(index_, temp); 
         }
         
         MaterialType getMaterial() const { 
@@ -49,7 +111,7 @@ public:
         }
         
         void setMaterial(MaterialType material) { 
-            cloud_->materials_[index_] = material; 
+            cloud_->setMaterial(index_, material);
         }
         
         // For neighbor support (to be added)
@@ -80,22 +142,173 @@ public:
         x_.push_back(x);
         y_.push_back(y);
         z_.push_back(z);
-        temperatures_.push_back(temp);
+        if (precision_ == Precision::FLOAT32) {
+            temperatures32_.push_back(static_cast<float>(temp));
+        } else {
+            temperatures_.push_back(temp);
+        }
         materials_.push_back(mat);
+        if (!scales_.empty()) {
+            scales_.push_back(1.0);
+        }
+        if (!surfaceAreas_.empty()) {
+            surfaceAreas_.push_back(0.0);
+        }
         neighbors_.emplace_back();  // Empty neighbor list
+        neighborRadius_ = 0.0;      // existing lists don't know about the new point
+        ++revision_;
         return index;
     }
     
+    // Adds a point standing for scale times the reference point size
+    size_t addPoint(double x, double y, double z, double temp, MaterialType mat, double scale);
+    
+    // Bulk counterpart of addPoint for count points: xyz interleaved (x0 y0 z0 x1 ...), one temperature and one
+    // MaterialType code each. Storage grows once for the whole batch; an unknown material code throws before
+    // anything is added
+    void addPoints(const double* xyz, const double* temperatures, const int32_t* materials, size_t count);
+    // Makes room for count points in total, so a run of addPoint calls doesn't reallocate
+    void reserve(size_t count);
+    
     // Direct array access methods for performance
     double getX(size_t i) const { return x_[i]; }
     double getY(size_t i) const { return y_[i]; }
     double getZ(size_t i) const { return z_[i]; }
-    double getTemperature(size_t i) const { return temperatures_[i]; }
-    void setTemperature(size_t i, double temp) { temperatures_[i] = temp; }
+    double getTemperature(size_t i) const {
+        return precision_ == Precision::FLOAT32 ? temperatures32_[i] : temperatures_[i];
+    }
+    void setTemperature(size_t i, double temp) {
+        if (precision_ == Precision::FLOAT32) {
+            temperatures32_[i] = static_cast<float>(temp);
+        } else {
+            temperatures_[i] = temp;
+        }
+        ++temperatureRevision_;
+    }
     MaterialType getMaterial(size_t i) const { return materials_[i]; }
+    void setMaterial(size_t i, MaterialType mat) { materials_[i] = mat; ++revision_; }
+    // Converts the stored temperatures; the neighbor lists are kept but cached operators rebuild
+    void setPrecision(Precision precision);
+    Precision getPrecision() const { return precision_; }
+    
+    // Temperature buffers of the current precision (the other pair is empty)
+    const std::vector<double>& getTemperatures() const { return temperatures_; }
+    const std::vector<float>& getTemperatures32() const { return temperatures32_; }
+    
+    // Whole SoA arrays, for kernels that stream over the cloud instead of going through PointRef
+    const std::vector<double>& getXs() const { return x_; }
+    const std::vector<double>& getYs() const { return y_; }
+    const std::vector<double>& getZs() const { return z_; }
+    const std::vector<MaterialType>& getMaterials() const { return materials_; }
+    
+    // Double buffering: a step is written into the back buffer and made visible by swapping, so stepping
+    // neither allocates nor copies. The back buffer is sized on first use and its contents are scratch.
+    std::vector<double>& getNextTemperatures() {
+        if (nextTemperatures_.size() != temperatures_.size()) {
+            nextTemperatures_.resize(temperatures_.size());
+        }
+        return nextTemperatures_;
+    }
+    std::vector<float>& getNextTemperatures32() {
+        if (nextTemperatures32_.size() != temperatures32_.size()) {
+            nextTemperatures32_.resize(temperatures32_.size());
+        }
+        return nextTemperatures32_;
+    }
+    void swapTemperatures() {
+        if (precision_ == Precision::FLOAT32) {
+            temperatures32_.swap(nextTemperatures32_);
+        } else {
+            temperatures_.swap(nextTemperatures_);
+        }
+    }
+    uint64_t getRevision() const { return revision_; }
+    
+    // Edits to the committed temperatures from outside a step. Code that writes through getTemperatures' storage
+    // directly calls touchTemperatures afterwards; a writer that may write at any time (a writable numpy view)
+    // is registered for as long as it exists, and every step treats the temperatures as edited meanwhile
+    uint64_t getTemperatureRevision() const { return temperatureRevision_; }
+    void touchTemperatures() { ++temperatureRevision_; }
+    void openTemperatureWriter() { ++temperatureWriters_; ++temperatureRevision_; }
+    void closeTemperatureWriter() { --temperatureWriters_; ++temperatureRevision_; }
+    bool hasTemperatureWriters() const { return temperatureWriters_ > 0; }
+    
+    // Point sizes (1 for every point of a uniform cloud)
+    double getPointScale(size_t i) const { return scales_.empty() ? 1.0 : scales_[i]; }
+    bool hasPointScales() const { return !scales_.empty(); }
+    const std::vector<double>& getPointScales() const { return scales_; }
+    double getMaxPointScale() const {
+        return scales_.empty() ? 1.0 : *std::max_element(scales_.begin(), scales_.end());
+    }
+    // Neighbor cutoff for the pair (i, j): radius scaled by the mean of the two point scales, so it is symmetric
+    double getPairRadius(size_t i, size_t j, double radius) const {
+        return scales_.empty() ? radius : radius * (scales_[i] + scales_[j]) / 2.0;
+    }
+    
+    // Exposed area of point i (0 for interior points), set by CupGenerator for clouds without air points
+    double getSurfaceArea(size_t i) const { return surfaceAreas_.empty() ? 0.0 : surfaceAreas_[i]; }
+    void setSurfaceArea(size_t i, double area);
+    bool hasSurfaceAreas() const { return !surfaceAreas_.empty(); }
+    const std::vector<double>& getSurfaceAreas() const { return surfaceAreas_; }
     
-    // VTK export (update implementation needed)
+    // Axisymmetric clouds hold the (r, z) half plane of a body of revolution on a lattice of this spacing: x is
+    // the radius, y is 0, and every point stands for the ring it sweeps around the z axis. A ring of radius r
+    // counts as the annulus [r - h/2, r + h/2] of width h, i.e. getRingFactor reference points
+    void setAxisymmetric(double spacing);
+    bool isAxisymmetric() const { return ringSpacing_ > 0.0; }
+    double getRingSpacing() const { return ringSpacing_; }
+    double getRingFactor(size_t i) const {
+        if (ringSpacing_ <= 0.0) return 1.0;
+        double h = ringSpacing_, outer = x_[i] + h / 2.0, inner = std::max(0.0, x_[i] - h / 2.0);
+        return kPi * (outer * outer - inner * inner) / (h * h);
+    }
+    // Reference volumes point i stands for: scale^3 times the ring factor
+    double getVolumeFactor(size_t i) const {
+        double s = getPointScale(i);
+        return s * s * s * getRingFactor(i);
+    }
+    // 3D cloud for visualization: every ring of an axisymmetric cloud swept into segments points (0 picks about
+    // one per ring spacing of circumference, as a 3D lattice would have), with its temperature, material and scale.
+    // The copy has no neighbor lists; an ordinary cloud is returned as is
+    PointCloud revolve(size_t segments = 0) const;
+    
+    // Ranges of points, for partitioned runs that exchange the temperatures of whole layers. Points are
+    // assumed sorted by z, as CupGenerator makes them
+    size_t findFirstAtOrAboveZ(double z) const {
+        return static_cast<size_t>(std::lower_bound(z_.begin(), z_.end(), z) - z_.begin());
+    }
+    void copyTemperatures(size_t begin, size_t end, double* out) const;
+    void assignTemperatures(size_t begin, const double* values, size_t count);
+    TemperatureSums sumTemperatures(size_t begin, size_t end) const;
+    
+    // Neighbor lists
+    const std::vector<size_t>& getNeighbors(size_t i) const { return neighbors_[i]; }
+    void setNeighbors(size_t i, std::vector<size_t> neighbors) { neighbors_[i] = std::move(neighbors); }
+    void clearNeighbors();
+    double getNeighborRadius() const { return neighborRadius_; }
+    void setNeighborRadius(double radius) { neighborRadius_ = radius; ++revision_; }
+    bool hasNeighborLists() const { return neighborRadius_ > 0.0; }
+    // Rebuilds every neighbor list for radius with a spatial index's search(x, y, z, reach, out), which fills out
+    // with the points within reach of (x, y, z). Both indexes (CellList, KDTreeIndex) go through this, so they
+    // keep the same pairs
+    template <class RadiusSearch>
+    void fillNeighbors(double radius, const RadiusSearch& search);
+    
+    // Binary checkpoints (see Checkpoint.hpp). The cloud section holds everything above, including the neighbor
+    // lists so a restart doesn't rebuild them; backBuffer also stores the back buffer, which ActiveSet steps
+    // rely on. Loading replaces the whole cloud, and reads the cloud of a solver checkpoint too
+    void saveCheckpoint(const std::string& path) const;
+    void loadCheckpoint(const std::string& path);
+    void writeCheckpoint(CheckpointWriter& writer, bool backBuffer = false) const;
+    void readCheckpoint(CheckpointReader& reader);
+    // Takes over everything loaded read from a checkpoint, so a load that reads further sections can parse into a
+    // scratch cloud and replace this one only once all of them checked out. Counts as a change of every point
+    void restoreFrom(PointCloud&& loaded);
+    
+    // VTK export (see VTKWriter): a binary XML .vtu if the name ends in .vtu, else a binary legacy .vtk
     void saveToVTK(const std::string& filename) const;
+    // .vtu with every array appended raw, or zlib compressed
+    void saveToVTU(const std::string& filename, bool compress = false) const;
     
     // nanoflann interface (for K-d tree later)
     size_t kdtree_get_point_count() const { return x_.size(); }
@@ -105,4 +318,28 @@ public:
     }
     
     template <class BBOX> bool kdtree_get_bbox(BBOX&) const { return false; }
-};
\ No newline at end of file
+};
+
+template <class RadiusSearch>
+void PointCloud::fillNeighbors(double radius, const RadiusSearch& search) {
+    clearNeighbors();
+
+    std::vector<size_t> found;
+    // on a scaled cloud each point searches out to the largest pair radius it can have, then keeps the pairs
+    // within their own radius
+    auto maxScale = getMaxPointScale();
+    for (auto i = size_t{0}; i < size(); ++i) {
+        auto reach = hasPointScales() ? radius * (getPointScale(i) + maxScale) / 2.0 : radius;
+        search(x_[i], y_[i], z_[i], reach, found);
+        found.erase(std::remove_if(found.begin(), found.end(), [&](size_t j) {
+            if (j == i) return true;
+            if (!hasPointScales()) return false;
+            double dx = x_[j] - x_[i];
+            double dy = y_[j] - y_[i];
+            double dz = z_[j] - z_[i];
+            return !withinCutoff(std::sqrt(dx*dx + dy*dy + dz*dz), getPairRadius(i, j, radius));
+        }), found.end());
+        setNeighbors(i, found);
+    }
+    setNeighborRadius(radius);
+}
\ No newline at end of file
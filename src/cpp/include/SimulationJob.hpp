@@ -0,0 +1,155 @@
+#pragma once
+#include "HeatSolver.hpp"
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <exception>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+/*
+    A HeatSolver::run_for_time on a thread of its own, so the caller stays free while the solver works.
+
+    The job is made, then started, either on a new thread or on a JobPool shared with other jobs. While it runs,
+    getProgress and getCurrentTime read what the run published after its last committed step (see RunControl),
+    without locking anything the run needs. A progress callback gets fuller reports (statistics, steps per
+    second) on the job's thread between steps. cancel asks the run to stop after the step in progress; the solver
+    is left at a consistent time, and a later run continues from there. A job still waiting in a pool's queue
+    is cancelled right away. wait blocks until the run is done and its done callbacks have run, optionally with a
+    timeout; after that the job's thread no longer touches the job, so it may be destroyed. join also rethrows
+    whatever the run threw. Done callbacks are for event loops that must not block: they run as soon as the run
+    ends, and must not wait on their own job.
+
+    Until the job is done the solver and its cloud belong to it; nothing else may step or modify them.
+*/
+
+enum class JobState {
+    PENDING = 0,    // made, not started
+    QUEUED = 1,     // started on a pool, waiting for a worker
+    RUNNING = 2,
+    FINISHED = 3,   // ran for the whole duration
+    CANCELLED = 4,  // stopped early by cancel
+    FAILED = 5      // the run threw; join rethrows it
+};
+
+// A report of a running job, see SimulationJob::setProgressCallback
+struct JobProgress {
+    double time = 0.0;            // simulated time, s
+    double progress = 0.0;        // fraction of the job's duration
+    uint64_t steps = 0;           // steps the job took so far
+    double stepsPerSecond = 0.0;  // since the job started running, wall time
+    double coffee = 0.0;          // average temperatures by material, K
+    double cup = 0.0;
+    double air = 0.0;
+    double max = 0.0;
+    double min = 0.0;
+    bool last = false;            // the report after the job's final step
+};
+
+class SimulationJob;
+
+// A fixed set of threads shared by jobs, so however many jobs are started on it, at most getWorkerCount run at a
+// time; the rest wait in line, oldest first. Each running solver still uses its own OpenMP threads, so a pool of
+// n workers wants solvers with about cores / n threads each
+class JobPool {
+public:
+    explicit JobPool(size_t workers);
+    // Runs the jobs still queued, then stops the workers
+    ~JobPool();
+
+    JobPool(const JobPool&) = delete;
+    JobPool& operator=(const JobPool&) = delete;
+
+    size_t getWorkerCount() const { return workers_.size(); }
+    // Jobs waiting for a worker
+    size_t getQueuedCount() const;
+
+private:
+    friend class SimulationJob;
+
+    void submit(SimulationJob* job);
+    // Takes a job that no worker has picked up out of the queue, false if it isn't queued any more
+    bool withdraw(SimulationJob* job);
+    void workLoop();
+
+    std::deque<SimulationJob*> queue_;
+    bool stopping_;
+    mutable std::mutex mutex_;
+    std::condition_variable jobQueued_;
+    std::vector<std::thread> workers_;
+};
+
+class SimulationJob {
+public:
+    // Runs solver for duration seconds of simulated time once started. The solver must outlive the job
+    SimulationJob(HeatSolver& solver, double duration);
+    // Cancels the run and waits for it
+    ~SimulationJob();
+
+    SimulationJob(const SimulationJob&) = delete;
+    SimulationJob& operator=(const SimulationJob&) = delete;
+
+    // Starts the run on a thread of its own; a job starts once
+    void start();
+    // Queues the run on pool, which must outlive the job
+    void start(JobPool& pool);
+    // Asks the run to stop after its current step, or drops it from the pool's queue; nothing happens if it is
+    // already done
+    void cancel();
+    // Waits until the run is done, at most timeoutSeconds if that isn't negative. True if it is done
+    bool wait(double timeoutSeconds = -1.0);
+    // Waits for the run and its thread, then rethrows the exception of a failed run
+    void join();
+    // Rethrows the exception of a failed run right away, nothing if the run hasn't failed (yet). Unlike join it
+    // never waits, so done callbacks and event loops can use it
+    void rethrowError() const;
+
+    JobState getState() const;
+    // True once wait would return right away
+    bool isDone() const;
+    // Fraction of the duration simulated so far, 0 to 1
+    double getProgress() const;
+    double getCurrentTime() const { return control_.time.load(); }
+    uint64_t getSteps() const { return control_.steps.load(); }
+    double getDuration() const { return duration_; }
+
+    // Calls callback on the job's thread with a report at most once per intervalSeconds of wall time while the
+    // run goes on, and once more after its final step. Set before starting; an exception from the callback fails
+    // the job
+    void setProgressCallback(std::function<void(const JobProgress&)> callback, double intervalSeconds = 1.0);
+    // Calls callback once the run is done, on the thread that ended it, or right away if it is done already.
+    // Exceptions thrown on the job's thread are dropped
+    void addDoneCallback(std::function<void()> callback);
+
+private:
+    friend class JobPool;
+
+    void runLoop();
+    // Publishes the final state, runs the done callbacks and then sets finished_ and wakes the waiters, the last
+    // access to the job
+    void finish(JobState state, std::exception_ptr error);
+    void report(bool last);
+    bool done() const { return state_ > JobState::RUNNING; }  // with mutex_ held; finished_ may lag behind
+
+    HeatSolver& solver_;
+    double duration_;
+    double startTime_;
+    RunControl control_;
+    JobPool* pool_;
+
+    std::function<void(const JobProgress&)> progressCallback_;
+    double progressInterval_;
+    ProgressReporter reporter_;
+    std::chrono::steady_clock::time_point runStart_;
+
+    JobState state_;
+    bool finished_;  // the done callbacks have run; what wait, join and the destructor wait for
+    std::exception_ptr error_;
+    std::vector<std::function<void()>> callbacks_;
+    mutable std::mutex mutex_;
+    std::condition_variable done_;
+    std::thread thread_;
+};
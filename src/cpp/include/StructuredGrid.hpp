@@ -0,0 +1,89 @@
+#pragma once
+#include "PointCloud.hpp"
+#include "Material.hpp"
+#include "ConductanceOperator.hpp"
+#include <array>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+/*
+    Backend for clouds that are a complete box lattice (what CupGenerator produces).
+
+    If point i sits at lattice index (ix, iy, iz) and i = ix*sx + iy*sy + iz*sz for fixed strides, the cloud's own
+    temperature array already is a dense 3D array with implicit coordinates, and a neighbor at lattice offset
+    (dx, dy, dz) is always dx*sx + dy*sy + dz*sz entries away. A step then needs no neighbor lists or column
+    indices: for each stencil offset it keeps one array of pair conductances k_eff * A / d (zero where the
+    neighbor would fall off the lattice) and sweeps it against the temperatures with unit stride. Pairs are
+    symmetric, so only the forward half of the stencil is stored. Exposed points add their surface conductance to
+    the ambient, like the operator's sinks.
+
+    The stencil holds every lattice offset within the neighbor radius, which is the 6 face neighbors (the 7-point
+    stencil) whenever spacing > radius / sqrt(2), and uses the same pair law as ConductanceOperator, so both
+    backends give the same answer.
+*/
+class StructuredGrid {
+public:
+    StructuredGrid();
+
+    // Recognizes the lattice and precomputes the stencil. Returns false (and isLattice() stays false) if the
+    // cloud isn't a complete, uniformly spaced box lattice stored in a fixed axis order (scaled and axisymmetric
+    // clouds never are). Exposed points get the same surface sinks as ConductanceOperator. The per point
+    // conductances are filled on numThreads OpenMP threads
+    bool build(const PointCloud& cloud, const std::vector<Material>& materials,
+               const ConductanceTable& conductance, double contactArea, double pointVolume, double radius,
+               const SurfaceExchange& surface = SurfaceExchange{}, int numThreads = 1);
+
+    // True if built (successfully or not) from this revision of the cloud
+    bool isCurrent(const PointCloud& cloud) const;
+    void invalidate();
+    bool isLattice() const { return lattice_; }
+
+    // out[i] = T[i] + dt * (sum over stencil of w (T[j] - T[i]) + g_i (T_amb - T[i])), split over numThreads
+    // OpenMP threads
+    void apply(const double* temperatures, double* out, double dt, int numThreads = 1) const;
+    void apply(const float* temperatures, float* out, double dt, int numThreads = 1) const;
+
+    // Points along x, y, z
+    const std::array<size_t, 3>& getDimensions() const { return dims_; }
+    const std::array<double, 3>& getSpacing() const { return spacing_; }
+    const std::array<double, 3>& getOrigin() const { return origin_; }
+    // Index distance between lattice neighbors along x, y, z
+    const std::array<int64_t, 3>& getStrides() const { return strides_; }
+    // Neighbor offsets per point, 6 for the face stencil
+    size_t getStencilSize() const { return 2 * offsets_.size(); }
+    // Same bound as ConductanceOperator::getStableTimeStep
+    double getStableTimeStep() const { return stableTimeStep_; }
+
+private:
+    // Finds dims, spacing, origin and strides; false if the cloud isn't a lattice
+    bool detect(const PointCloud& cloud);
+
+    template <class Real>
+    void applyStencil(const Real* temperatures, Real* out, const Real* conductances, const Real* inverseCapacities,
+                      const Real* sinks, double dt, int numThreads) const;
+
+    struct Offset {
+        std::array<int, 3> delta;    // lattice steps along x, y, z
+        int64_t stride;              // index distance, always positive
+        double distance;
+    };
+
+    std::array<size_t, 3> dims_;
+    std::array<double, 3> spacing_;
+    std::array<double, 3> origin_;
+    std::array<int64_t, 3> strides_;
+    std::vector<Offset> offsets_;              // forward half of the stencil, ascending stride
+    std::vector<double> conductances_;         // offsets_.size() arrays of n pair conductances, offset major
+    std::vector<double> inverseCapacities_;    // 1 / (rho * c * V) per point
+    std::vector<double> sinks_;                // surface conductance h * A * a_i per point, empty if none
+    double ambientTemperature_;
+    std::vector<float> conductances32_;        // rounded copies for FLOAT32 clouds
+    std::vector<float> inverseCapacities32_;
+    std::vector<float> sinks32_;
+
+    const PointCloud* source_;  // nullptr until built
+    uint64_t revision_;
+    bool lattice_;
+    double stableTimeStep_;
+};
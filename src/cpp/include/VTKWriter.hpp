@@ -0,0 +1,52 @@
+#pragma once
+#include "PointCloud.hpp"
+#include <string>
+#include <utility>
+#include <vector>
+
+/*
+    VTK XML output for ParaView.
+
+    A .vtu file is an UnstructuredGrid whose arrays sit after the XML header as raw little endian blocks
+    (encoding="raw" appended data), so writing one is a few bulk writes instead of formatting every value as text,
+    and doubles keep all their bits. The points form one poly-vertex cell. Point data: temperature (Float32 for a
+    FLOAT32 cloud), material, and scale and surface_area when the cloud has them.
+
+    With compression each array is split into blocks and deflated with zlib (vtkZLibDataCompressor). Builds
+    without zlib throw if asked to compress; hasCompression tells in advance.
+
+    writeLegacy keeps the old .vtk format for tools that only read that, but binary as well.
+
+    A .pvd file is a collection listing one .vtu per frame with its time, so ParaView opens a run as a time series.
+*/
+class VTKWriter {
+public:
+    // Writes cloud to path as a .vtu file
+    static void writeVTU(const PointCloud& cloud, const std::string& path, bool compress = false);
+    // Writes cloud to path as a binary legacy .vtk file (temperature and material)
+    static void writeLegacy(const PointCloud& cloud, const std::string& path);
+    // Writes a .pvd collection of (time, file) entries, file names relative to the .pvd
+    static void writeCollection(const std::string& path, const std::vector<std::pair<double, std::string>>& frames);
+    // True if built with zlib
+    static bool hasCompression();
+};
+
+// A time series on disk: every addFrame writes <base>_<frame>.vtu next to <base>.pvd and rewrites the .pvd, so
+// the collection is complete after every frame even if the run stops
+class VTKSeries {
+public:
+    // pvdPath names the collection ("out/run.pvd" writes out/run_000000.vtu, ...)
+    explicit VTKSeries(const std::string& pvdPath, bool compress = false);
+
+    // Writes the cloud as the next frame at time, returns the .vtu path
+    std::string addFrame(const PointCloud& cloud, double time);
+    const std::vector<std::pair<double, std::string>>& getFrames() const { return frames_; }
+    const std::string& getPath() const { return pvdPath_; }
+
+private:
+    std::string pvdPath_;
+    std::string directory_;  // of the .pvd, with a trailing separator (empty for the working directory)
+    std::string stem_;       // file name without .pvd
+    bool compress_;
+    std::vector<std::pair<double, std::string>> frames_;  // (time, file relative to the .pvd)
+};
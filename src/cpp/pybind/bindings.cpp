@@ -1,17 +1,112 @@
 #include "pybind11/pybind11.h"
 #include "pybind11/stl.h"
 #include "pybind11/numpy.h"
+#include "pybind11/functional.h"
+
+#include <algorithm>
 
 #include "Point.hpp"
 #include "PointCloud.hpp"
 #include "Material.hpp"
 #include "HeatSolver.hpp"
+#include "EnsembleSolver.hpp"
+#include "SimulationJob.hpp"
+#include "VTKWriter.hpp"
 #include "CupGenerator.hpp"
+#include "KDTreeIndex.hpp"
+#include "Log.hpp"
 
 namespace py = pybind11;
 
+namespace {
+
+// numpy array over a cloud's own storage, no copy. The array's base is the Python cloud, so the cloud lives as long as
+// any view of it; the view itself is only good until the cloud's arrays are reallocated (adding points, clear,
+// set_precision, load_checkpoint)
+template <class T>
+py::array_t<T> cloudView(const T* data, size_t size, py::handle cloud, bool writable) {
+    py::array_t<T> view(size, data, cloud);
+    if (!writable) {
+        view.attr("flags").attr("writeable") = false;
+    }
+    return view;
+}
+
+// Base of a writable temperature view: keeps the cloud alive, and registers the view as a temperature writer
+// (PointCloud::openTemperatureWriter) until numpy drops it
+py::capsule temperatureWriter(py::handle cloudObject, PointCloud& cloud) {
+    cloud.openTemperatureWriter();
+    auto* owner = new py::object(py::reinterpret_borrow<py::object>(cloudObject));
+    return py::capsule(owner, [](void* pointer) {
+        auto* owner = static_cast<py::object*>(pointer);
+        owner->cast<PointCloud&>().closeTemperatureWriter();
+        delete owner;
+    });
+}
+
+// Adds the points of from_arrays/extend in one batch. The dtypes are checked once for the whole array: xyz and
+// temperature may be any real dtype (converted, copied only if it isn't contiguous float64 already), material must be
+// integer so codes aren't silently truncated. temperature and material may be scalars (a MaterialType too), given to
+// every point
+void extendCloud(PointCloud& cloud, const py::object& xyzArg, const py::object& temperatureArg,
+                 const py::object& materialArg) {
+    py::array xyz = py::array::ensure(xyzArg);
+    py::array temperature = py::array::ensure(temperatureArg);
+    py::object materialCodes = py::isinstance<MaterialType>(materialArg) ? py::int_(materialArg) : materialArg;
+    py::array material = py::array::ensure(materialCodes);
+    if (!xyz || !temperature || !material) {
+        throw py::type_error("PointCloud: xyz, temperature and material must be array-like");
+    }
+    auto real = [](const py::array& values) { return values.dtype().kind() == 'f' || values.dtype().kind() == 'i' ||
+                                                     values.dtype().kind() == 'u'; };
+    if (!real(xyz) || !real(temperature)) {
+        throw py::type_error("PointCloud: xyz and temperature must be real numbers");
+    }
+    if (material.dtype().kind() != 'i' && material.dtype().kind() != 'u') {
+        throw py::type_error("PointCloud: material must be integer MaterialType codes, got dtype " +
+                             py::str(material.dtype()).cast<std::string>());
+    }
+    if (xyz.ndim() != 2 || xyz.shape(1) != 3) {
+        throw py::value_error("PointCloud: xyz must have shape (n, 3)");
+    }
+
+    size_t count = static_cast<size_t>(xyz.shape(0));
+    auto points = py::array_t<double, py::array::c_style | py::array::forcecast>::ensure(xyz);
+    auto temperatures = py::array_t<double, py::array::c_style | py::array::forcecast>::ensure(temperature);
+    auto materials = py::array_t<int32_t, py::array::c_style | py::array::forcecast>::ensure(material);
+    if (temperatures.size() == 1 && temperatures.ndim() == 0) {
+        temperatures = py::array_t<double>(count);
+        std::fill_n(temperatures.mutable_data(), count, temperature.cast<double>());
+    }
+    if (materials.size() == 1 && materials.ndim() == 0) {
+        materials = py::array_t<int32_t>(count);
+        std::fill_n(materials.mutable_data(), count, material.cast<int32_t>());
+    }
+    if (static_cast<size_t>(temperatures.size()) != count || static_cast<size_t>(materials.size()) != count) {
+        throw py::value_error("PointCloud: xyz, temperature and material must describe the same number of points");
+    }
+    cloud.addPoints(points.data(), temperatures.data(), materials.data(), count);
+}
+
+// Deleting a running job or a busy pool waits for native threads, whose callbacks and log messages need the GIL
+struct ReleaseGilDelete {
+    template <class T>
+    void operator()(T* object) const {
+        py::gil_scoped_release release;
+        delete object;
+    }
+};
+
+}  // namespace
+
 PYBIND11_MODULE(heat_transfer, m) {
     m.doc() = "Heat transfer simulation module";
+#ifdef HEAT_TRANSFER_PYTHON_DIR
+    // a package path makes the Python modules next to the bindings submodules: heat_transfer.sweep
+    py::list packagePath;
+    packagePath.append(HEAT_TRANSFER_PYTHON_DIR);
+    m.attr("__path__") = packagePath;
+#endif
     
     // Enums
     py::enum_<MaterialType>(m, "MaterialType")
@@ -19,6 +114,61 @@ PYBIND11_MODULE(heat_transfer, m) {
         .value("CUP_MATERIAL", MaterialType::CUP_MATERIAL) 
         .value("AIR", MaterialType::AIR);
     
+    py::enum_<Integrator>(m, "Integrator")
+        .value("EXPLICIT_EULER", Integrator::EXPLICIT_EULER)
+        .value("BACKWARD_EULER", Integrator::BACKWARD_EULER)
+        .value("CRANK_NICOLSON", Integrator::CRANK_NICOLSON);
+    
+    py::enum_<Backend>(m, "Backend")
+        .value("AUTO", Backend::AUTO)
+        .value("POINT_CLOUD", Backend::POINT_CLOUD)
+        .value("STRUCTURED_GRID", Backend::STRUCTURED_GRID);
+    
+    py::enum_<Precision>(m, "Precision")
+        .value("FLOAT64", Precision::FLOAT64)
+        .value("FLOAT32", Precision::FLOAT32);
+    
+    py::enum_<QueueOverflow>(m, "QueueOverflow")
+        .value("BLOCK", QueueOverflow::BLOCK)
+        .value("DROP", QueueOverflow::DROP);
+    
+    py::enum_<JobState>(m, "JobState")
+        .value("PENDING", JobState::PENDING)
+        .value("QUEUED", JobState::QUEUED)
+        .value("RUNNING", JobState::RUNNING)
+        .value("FINISHED", JobState::FINISHED)
+        .value("CANCELLED", JobState::CANCELLED)
+        .value("FAILED", JobState::FAILED);
+    
+    py::enum_<LogLevel>(m, "LogLevel")
+        .value("TRACE", LogLevel::TRACE)
+        .value("DEBUG", LogLevel::DEBUG)
+        .value("INFO", LogLevel::INFO)
+        .value("WARNING", LogLevel::WARNING)
+        .value("ERROR", LogLevel::ERROR)
+        .value("OFF", LogLevel::OFF);
+    
+    // Logging: solver messages go to the Python "heat_transfer" logger instead of stderr
+    m.def("set_log_level", &Log::setLevel);
+    m.def("get_log_level", &Log::getLevel);
+    {
+        py::object logger = py::module_::import("logging").attr("getLogger")("heat_transfer");
+        // keep the logger alive in the module so the sink never outlives it
+        m.attr("_logger") = logger;
+        PyObject* handle = logger.ptr();
+        Log::setSink([handle](LogLevel level, const std::string& message) {
+            static const int pythonLevels[] = {5, 10, 20, 30, 40, 50};
+            py::gil_scoped_acquire gil;
+            try {
+                py::handle(handle).attr("log")(pythonLevels[static_cast<int>(level)], message);
+            } catch (py::error_already_set& e) {
+                e.discard_as_unraisable(__func__);
+            }
+        });
+        // the interpreter goes away before static destructors run, so fall back to stderr at exit
+        py::module_::import("atexit").attr("register")(py::cpp_function([]() { Log::resetSink(); }));
+    }
+    
     // Position struct
     py::class_<Position>(m, "Position")
         .def(py::init<>())
@@ -42,26 +192,145 @@ PYBIND11_MODULE(heat_transfer, m) {
         .def("get_temperature", &PointCloud::PointRef::getTemperature)
         .def("set_temperature", &PointCloud::PointRef::setTemperature)
         .def("get_material", &PointCloud::PointRef::getMaterial)
-        .def("get_index", &PointCloud::PointRef::getIndex);
+        .def("get_index", &PointCloud::PointRef::getIndex)
+        .def("get_neighbor_indices", &PointCloud::PointRef::getNeighborIndices);
     
     // PointCloud class
     py::class_<PointCloud>(m, "PointCloud")
         .def(py::init<>())
         // For add_point, specify exactly which overload to use
         .def("add_point", static_cast<size_t(PointCloud::*)(double, double, double, double, MaterialType)>(&PointCloud::addPoint))
+        .def("add_point", static_cast<size_t(PointCloud::*)(double, double, double, double, MaterialType, double)>(&PointCloud::addPoint),
+             py::arg("x"), py::arg("y"), py::arg("z"), py::arg("temp"), py::arg("mat"), py::arg("scale"))
         // For get_point, we also need to specify exactly which overload
         .def("get_point", static_cast<PointCloud::PointRef(PointCloud::*)(size_t)>(&PointCloud::getPoint), 
              py::return_value_policy::copy)
+        // Bulk construction from numpy arrays
+        .def_static("from_arrays", [](const py::object& xyz, const py::object& temperature,
+                                      const py::object& material, Precision precision) {
+            PointCloud cloud;
+            cloud.setPrecision(precision);
+            extendCloud(cloud, xyz, temperature, material);
+            return cloud;
+        }, py::arg("xyz"), py::arg("temperature"), py::arg("material"), py::arg("precision") = Precision::FLOAT64)
+        .def("extend", &extendCloud, py::arg("xyz"), py::arg("temperature"), py::arg("material"))
+        .def("reserve", &PointCloud::reserve, py::arg("count"))
         .def("size", &PointCloud::size)
         .def("clear", &PointCloud::clear)
-        .def("save_to_vtk", &PointCloud::saveToVTK)
+        .def("save_to_vtk", &PointCloud::saveToVTK, py::arg("filename"))
+        .def("save_to_vtu", &PointCloud::saveToVTU, py::arg("filename"), py::arg("compress") = false)
         // Add direct access methods in the same class
         .def("get_x", &PointCloud::getX)
         .def("get_y", &PointCloud::getY)
         .def("get_z", &PointCloud::getZ)
         .def("get_temperature", &PointCloud::getTemperature)
         .def("set_temperature", &PointCloud::setTemperature)
-        .def("get_material", &PointCloud::getMaterial);
+        .def("get_material", &PointCloud::getMaterial)
+        .def("get_point_scale", &PointCloud::getPointScale)
+        .def("has_point_scales", &PointCloud::hasPointScales)
+        .def("get_surface_area", &PointCloud::getSurfaceArea)
+        .def("set_surface_area", &PointCloud::setSurfaceArea)
+        .def("has_surface_areas", &PointCloud::hasSurfaceAreas)
+        .def("set_axisymmetric", &PointCloud::setAxisymmetric, py::arg("spacing"))
+        .def("is_axisymmetric", &PointCloud::isAxisymmetric)
+        .def("get_ring_spacing", &PointCloud::getRingSpacing)
+        .def("get_ring_factor", &PointCloud::getRingFactor)
+        .def("get_volume_factor", &PointCloud::getVolumeFactor)
+        .def("revolve", &PointCloud::revolve, py::arg("segments") = 0)
+        // Ranges of points, for partitioned runs
+        .def("find_first_at_or_above_z", &PointCloud::findFirstAtOrAboveZ)
+        .def("get_temperature_range", [](const PointCloud& cloud, size_t begin, size_t end) {
+            if (begin > end || end > cloud.size()) {
+                throw py::index_error("PointCloud: temperature range out of bounds");
+            }
+            py::array_t<double> values(end - begin);
+            cloud.copyTemperatures(begin, end, values.mutable_data());
+            return values;
+        })
+        .def("set_temperature_range", [](PointCloud& cloud, size_t begin,
+                                         py::array_t<double, py::array::c_style | py::array::forcecast> values) {
+            if (begin + values.size() > cloud.size()) {
+                throw py::index_error("PointCloud: temperature range out of bounds");
+            }
+            cloud.assignTemperatures(begin, values.data(), values.size());
+        })
+        .def("sum_temperatures", [](const PointCloud& cloud, size_t begin, size_t end) {
+            if (begin > end || end > cloud.size()) {
+                throw py::index_error("PointCloud: temperature range out of bounds");
+            }
+            return cloud.sumTemperatures(begin, end);
+        })
+        .def("set_material", &PointCloud::setMaterial)
+        .def("get_precision", &PointCloud::getPrecision)
+        .def("set_precision", &PointCloud::setPrecision)
+        // Neighbor lists
+        .def("get_neighbors", &PointCloud::getNeighbors)
+        .def("has_neighbor_lists", &PointCloud::hasNeighborLists)
+        .def("get_neighbor_radius", &PointCloud::getNeighborRadius)
+        .def("clear_neighbors", &PointCloud::clearNeighbors)
+        // Binary checkpoints, load also reads the cloud of a solver checkpoint
+        .def("save_checkpoint", &PointCloud::saveCheckpoint, py::arg("path"))
+        .def("load_checkpoint", &PointCloud::loadCheckpoint, py::arg("path"))
+        // Zero-copy views (see cloudView). Coordinates, materials, scales and areas are read-only, since the
+        // solver's cached operator wouldn't see a change. Temperatures show the committed buffer, which a step swaps
+        // for the other one, so take a fresh view after stepping. They are read-only unless asked for writable,
+        // and active set steps recompute every point while a writable view is alive
+        .def("get_xs", [](py::object self) {
+            const auto& xs = self.cast<const PointCloud&>().getXs();
+            return cloudView(xs.data(), xs.size(), self, false);
+        })
+        .def("get_ys", [](py::object self) {
+            const auto& ys = self.cast<const PointCloud&>().getYs();
+            return cloudView(ys.data(), ys.size(), self, false);
+        })
+        .def("get_zs", [](py::object self) {
+            const auto& zs = self.cast<const PointCloud&>().getZs();
+            return cloudView(zs.data(), zs.size(), self, false);
+        })
+        .def("get_materials", [](py::object self) {
+            // MaterialType is an int sized enum, so its storage reads as int32 codes
+            const auto& materials = self.cast<const PointCloud&>().getMaterials();
+            static_assert(sizeof(MaterialType) == sizeof(int32_t), "MaterialType is viewed as int32");
+            return cloudView(reinterpret_cast<const int32_t*>(materials.data()), materials.size(), self, false);
+        })
+        .def("get_temperatures", [](py::object self, bool writable) -> py::array {
+            auto& cloud = self.cast<PointCloud&>();
+            py::object base = writable ? temperatureWriter(self, cloud) : self;
+            if (cloud.getPrecision() == Precision::FLOAT32) {
+                const auto& temps = cloud.getTemperatures32();
+                return cloudView(temps.data(), temps.size(), base, writable);
+            }
+            const auto& temps = cloud.getTemperatures();
+            return cloudView(temps.data(), temps.size(), base, writable);
+        }, py::arg("writable") = false)
+        .def("get_point_scales", [](py::object self) {
+            const auto& scales = self.cast<const PointCloud&>().getPointScales();
+            return cloudView(scales.data(), scales.size(), self, false);
+        })
+        .def("get_surface_areas", [](py::object self) {
+            const auto& areas = self.cast<const PointCloud&>().getSurfaceAreas();
+            return cloudView(areas.data(), areas.size(), self, false);
+        });
+    
+    // Volume weighted sums of a range of points, indexed by MaterialType
+    py::class_<TemperatureSums>(m, "TemperatureSums")
+        .def_readonly("weighted", &TemperatureSums::weighted)
+        .def_readonly("volume", &TemperatureSums::volume)
+        .def_readonly("max", &TemperatureSums::max)
+        .def_readonly("min", &TemperatureSums::min);
+    
+    // KDTreeIndex class (keeps the indexed cloud alive)
+    py::class_<KDTreeIndex>(m, "KDTreeIndex")
+        .def(py::init<const PointCloud&, size_t>(), py::arg("cloud"), py::arg("leaf_size") = 10,
+             py::keep_alive<1, 2>())
+        .def("radius_search", [](const KDTreeIndex& index, double x, double y, double z, double radius) {
+                 std::vector<size_t> found;
+                 index.radiusSearch(x, y, z, radius, found);
+                 return found;
+             })
+        .def("build_neighbors", &KDTreeIndex::buildNeighbors, py::arg("cloud"), py::arg("radius") = 0.01)
+        .def("size", &KDTreeIndex::size)
+        .def("get_leaf_size", &KDTreeIndex::getLeafSize);
     
     // Material class
     py::class_<Material>(m, "Material")
@@ -72,22 +341,283 @@ PYBIND11_MODULE(heat_transfer, m) {
         .def("get_density", &Material::getDensity)
         .def("get_specific_heat", &Material::getSpecificHeat)
         .def("get_thermal_conductivity", &Material::getThermalConductivity)
-        .def("get_ambient_temperature", &Material::getAmbientTemperature);
+        .def("get_ambient_temperature", &Material::getAmbientTemperature)
+        // picklable so sweeps can hand materials to worker processes
+        .def(py::pickle(
+            [](const Material& material) {
+                return py::make_tuple(material.getDensity(), material.getSpecificHeat(),
+                                      material.getThermalConductivity(), material.getAmbientTemperature());
+            },
+            [](const py::tuple& state) {
+                if (state.size() != 4) {
+                    throw std::runtime_error("Material: invalid pickle state");
+                }
+                return Material(state[0].cast<double>(), state[1].cast<double>(), state[2].cast<double>(),
+                                state[3].cast<double>());
+            }));
+    
+    // ConductanceOperator class, readable as scipy.sparse.csr_matrix((data, indices, indptr), shape=shape)
+    py::class_<ConductanceOperator>(m, "ConductanceOperator")
+        .def_property_readonly("indptr", [](const ConductanceOperator& op) {
+            const auto& v = op.getRowPointers();
+            return py::array_t<int64_t>(v.size(), v.data());
+        })
+        .def_property_readonly("indices", [](const ConductanceOperator& op) {
+            const auto& v = op.getColumnIndices();
+            return py::array_t<int32_t>(v.size(), v.data());
+        })
+        .def_property_readonly("data", [](const ConductanceOperator& op) {
+            const auto& v = op.getWeights();
+            return py::array_t<double>(v.size(), v.data());
+        })
+        .def_property_readonly("shape", [](const ConductanceOperator& op) {
+            return py::make_tuple(op.rows(), op.rows());
+        })
+        .def_property_readonly("nnz", &ConductanceOperator::nonZeros);
     
     // HeatSolver class
-    py::class_<HeatSolver>(m, "HeatSolver")
-        .def(py::init<PointCloud&, const std::vector<Material>&, double>())
-        .def("step", &HeatSolver::step)
-        .def("run", &HeatSolver::run_for_time)
+    py::class_<HeatSolver>(m, "HeatSolver", py::dynamic_attr())
+        .def(py::init<PointCloud&, const std::vector<Material>&, double, Integrator>(),
+             py::arg("point_cloud"), py::arg("materials"), py::arg("time_step"),
+             py::arg("integrator") = Integrator::EXPLICIT_EULER,
+             py::keep_alive<1, 2>())
+        // the native work runs without the GIL, so other Python threads go on meanwhile
+        .def("step", &HeatSolver::step, py::call_guard<py::gil_scoped_release>())
+        .def("run", static_cast<void(HeatSolver::*)(double)>(&HeatSolver::run_for_time), py::arg("duration"),
+             py::call_guard<py::gil_scoped_release>())
+        // the asyncio front end lives in heat_transfer.async_runs; call it from a coroutine
+        .def("run_async", [](py::object solver, double duration, double reportEvery, py::object pool) {
+            return py::module_::import("heat_transfer.async_runs").attr("AsyncRun")(solver, duration, reportEvery,
+                                                                                    pool);
+        }, py::arg("duration"), py::arg("report_every") = 1.0, py::arg("pool") = py::none())
         .def("get_current_time", &HeatSolver::getCurrentTime)
         .def("get_average_temperature", &HeatSolver::getAverageTemperature)
         .def("get_max_temperature", &HeatSolver::getMaxTemperature)
-        .def("get_min_temperature", &HeatSolver::getMinTemperature);
+        .def("get_min_temperature", &HeatSolver::getMinTemperature)
+        .def("get_neighbor_radius", &HeatSolver::getNeighborRadius)
+        .def("set_materials", &HeatSolver::setMaterials)
+        .def("get_materials", &HeatSolver::getMaterials)
+        .def("get_conductance_operator", &HeatSolver::getConductanceOperator,
+             py::return_value_policy::reference_internal)
+        .def("set_num_threads", &HeatSolver::setNumThreads)
+        .def("get_num_threads", &HeatSolver::getNumThreads)
+        .def("set_deterministic", &HeatSolver::setDeterministic)
+        .def("is_deterministic", &HeatSolver::isDeterministic)
+        .def_static("get_max_threads", &HeatSolver::getMaxThreads)
+        .def("get_integrator", &HeatSolver::getIntegrator)
+        .def("set_integrator", &HeatSolver::setIntegrator)
+        .def("set_solver_tolerance", &HeatSolver::setSolverTolerance)
+        .def("set_max_solver_iterations", &HeatSolver::setMaxSolverIterations)
+        .def("get_last_solver_iterations", &HeatSolver::getLastSolverIterations)
+        .def("get_last_solver_error", &HeatSolver::getLastSolverError)
+        .def("set_adaptive_time_step", &HeatSolver::setAdaptiveTimeStep,
+             py::arg("enabled"), py::arg("max_temperature_change") = 0.5)
+        .def("is_adaptive_time_step", &HeatSolver::isAdaptiveTimeStep)
+        .def("set_max_time_step", &HeatSolver::setMaxTimeStep)
+        .def("get_stable_time_step", &HeatSolver::getStableTimeStep)
+        .def("get_time_step", &HeatSolver::getTimeStep)
+        .def("set_progress_interval", &HeatSolver::setProgressInterval)
+        .def("set_backend", &HeatSolver::setBackend)
+        .def("get_backend", &HeatSolver::getBackend)
+        .def("uses_structured_grid", &HeatSolver::usesStructuredGrid)
+        .def("get_grid_dimensions", [](HeatSolver& solver) {
+            const auto& dims = solver.getStructuredGrid().getDimensions();
+            return py::make_tuple(dims[0], dims[1], dims[2]);
+        })
+        .def("get_step_sizes", [](const HeatSolver& solver) {
+            const auto& steps = solver.getStepSizes();
+            return py::array_t<double>(steps.size(), steps.data());
+        })
+        .def("set_active_set_stepping", &HeatSolver::setActiveSetStepping,
+             py::arg("enabled"), py::arg("tolerance") = 1e-6)
+        .def("is_active_set_stepping", &HeatSolver::isActiveSetStepping)
+        .def("reset_active_set", &HeatSolver::resetActiveSet)
+        .def("get_active_count", &HeatSolver::getActiveCount)
+        .def("get_active_counts", [](const HeatSolver& solver) {
+            const auto& counts = solver.getActiveCounts();
+            return py::array_t<size_t>(counts.size(), counts.data());
+        })
+        .def("set_surface_heat_transfer", &HeatSolver::setSurfaceHeatTransfer,
+             py::arg("convection_coefficient"), py::arg("emissivity") = 0.9)
+        .def("get_surface_heat_transfer_coefficient", &HeatSolver::getSurfaceHeatTransferCoefficient)
+        .def("set_ambient_temperature", &HeatSolver::setAmbientTemperature)
+        .def("get_ambient_temperature", &HeatSolver::getAmbientTemperature)
+        // Loading replaces the contents of the cloud the solver was made with
+        .def("save_checkpoint", &HeatSolver::saveCheckpoint, py::arg("path"))
+        .def("load_checkpoint", &HeatSolver::loadCheckpoint, py::arg("path"))
+        // The solver keeps the attached recorder alive through one reference that each call replaces (None
+        // detaches it), so swapping recorders doesn't pin every one ever attached
+        .def("set_frame_recorder", [](py::object solver, py::object recorder, size_t interval) {
+            auto* native = recorder.is_none() ? nullptr : recorder.cast<FrameRecorder*>();
+            solver.cast<HeatSolver&>().setFrameRecorder(native, interval);
+            py::setattr(solver, "_frame_recorder", recorder);
+        }, py::arg("recorder"), py::arg("interval") = 1);
+    
+    py::class_<JobProgress>(m, "JobProgress")
+        .def_readonly("time", &JobProgress::time)
+        .def_readonly("progress", &JobProgress::progress)
+        .def_readonly("steps", &JobProgress::steps)
+        .def_readonly("steps_per_second", &JobProgress::stepsPerSecond)
+        .def_readonly("coffee", &JobProgress::coffee)
+        .def_readonly("cup", &JobProgress::cup)
+        .def_readonly("air", &JobProgress::air)
+        .def_readonly("max", &JobProgress::max)
+        .def_readonly("min", &JobProgress::min)
+        .def_readonly("last", &JobProgress::last);
+    
+    py::class_<JobPool, std::unique_ptr<JobPool, ReleaseGilDelete>>(m, "JobPool")
+        .def(py::init<size_t>(), py::arg("workers"))
+        .def("get_worker_count", &JobPool::getWorkerCount)
+        .def("get_queued_count", &JobPool::getQueuedCount);
+    
+    // A solver run on a native thread: wait and join release the GIL, callbacks run on the job's thread
+    py::class_<SimulationJob, std::unique_ptr<SimulationJob, ReleaseGilDelete>>(m, "SimulationJob")
+        .def(py::init<HeatSolver&, double>(), py::arg("solver"), py::arg("duration"), py::keep_alive<1, 2>())
+        .def("start", [](SimulationJob& job) -> SimulationJob& {
+            job.start();
+            return job;
+        }, py::return_value_policy::reference)
+        // the job keeps its pool alive
+        .def("start", [](SimulationJob& job, JobPool& pool) -> SimulationJob& {
+            job.start(pool);
+            return job;
+        }, py::arg("pool"), py::return_value_policy::reference, py::keep_alive<1, 2>())
+        .def("cancel", &SimulationJob::cancel)
+        .def("wait", &SimulationJob::wait, py::arg("timeout") = -1.0, py::call_guard<py::gil_scoped_release>())
+        .def("join", &SimulationJob::join, py::call_guard<py::gil_scoped_release>())
+        .def("rethrow_error", &SimulationJob::rethrowError)
+        .def("get_state", &SimulationJob::getState)
+        .def("is_done", &SimulationJob::isDone)
+        .def("get_progress", &SimulationJob::getProgress)
+        .def("get_current_time", &SimulationJob::getCurrentTime)
+        .def("get_steps", &SimulationJob::getSteps)
+        .def("get_duration", &SimulationJob::getDuration)
+        // the reports are handed over by value, so Python may keep them after the callback returns
+        .def("set_progress_callback", [](SimulationJob& job, std::function<void(JobProgress)> callback, double interval) {
+            job.setProgressCallback([callback](const JobProgress& progress) { callback(progress); }, interval);
+        }, py::arg("callback"), py::arg("interval") = 1.0)
+        .def("add_done_callback", [](SimulationJob& job, std::function<void()> callback) {
+            job.addDoneCallback([callback]() {
+                try {
+                    callback();
+                } catch (py::error_already_set& e) {
+                    py::gil_scoped_acquire gil;
+                    e.discard_as_unraisable("SimulationJob done callback");
+                }
+            });
+        }, py::arg("callback"));
+    
+    // Frames written on a background thread, and random access to them
+    py::class_<FrameRecorder>(m, "FrameRecorder")
+        .def(py::init<const std::string&, const PointCloud&, size_t, QueueOverflow>(),
+             py::arg("path"), py::arg("point_cloud"), py::arg("queue_capacity") = 8,
+             py::arg("overflow") = QueueOverflow::DROP)
+        // waiting for the writer doesn't need the GIL
+        .def("record", &FrameRecorder::record, py::arg("point_cloud"), py::arg("time"),
+             py::call_guard<py::gil_scoped_release>())
+        .def("flush", &FrameRecorder::flush, py::call_guard<py::gil_scoped_release>())
+        .def("close", &FrameRecorder::close, py::call_guard<py::gil_scoped_release>())
+        .def("is_closed", &FrameRecorder::isClosed)
+        .def("get_written_frames", &FrameRecorder::getWrittenFrames)
+        .def("get_dropped_frames", &FrameRecorder::getDroppedFrames)
+        .def("get_stalls", &FrameRecorder::getStalls)
+        .def("get_path", &FrameRecorder::getPath)
+        .def("__enter__", [](FrameRecorder& recorder) -> FrameRecorder& { return recorder; },
+             py::return_value_policy::reference)
+        .def("__exit__", [](FrameRecorder& recorder, py::args) {
+            py::gil_scoped_release release;
+            recorder.close();
+        });
+    
+    py::class_<FrameReader>(m, "FrameReader")
+        .def(py::init<const std::string&>(), py::arg("path"))
+        .def("get_point_count", &FrameReader::getPointCount)
+        .def("get_precision", &FrameReader::getPrecision)
+        .def("get_frame_count", &FrameReader::getFrameCount)
+        .def("__len__", &FrameReader::getFrameCount)
+        .def("get_time", &FrameReader::getTime, py::arg("frame"))
+        .def("get_temperatures", [](FrameReader& reader, size_t frame) {
+            py::array_t<double> values(reader.getPointCount());
+            reader.readTemperatures(frame, values.mutable_data());
+            return values;
+        }, py::arg("frame"))
+        .def("get_xs", [](const FrameReader& reader) {
+            return py::array_t<double>(reader.getXs().size(), reader.getXs().data());
+        })
+        .def("get_ys", [](const FrameReader& reader) {
+            return py::array_t<double>(reader.getYs().size(), reader.getYs().data());
+        })
+        .def("get_zs", [](const FrameReader& reader) {
+            return py::array_t<double>(reader.getZs().size(), reader.getZs().data());
+        })
+        .def("get_materials", [](const FrameReader& reader) {
+            const auto& materials = reader.getMaterials();
+            py::array_t<int32_t> codes(materials.size());
+            auto* out = codes.mutable_data();
+            for (size_t i = 0; i < materials.size(); ++i) out[i] = static_cast<int32_t>(materials[i]);
+            return codes;
+        });
+    
+    // VTK XML output: .vtu frames and the .pvd index that makes them a time series
+    py::class_<VTKSeries>(m, "VTKSeries")
+        .def(py::init<const std::string&, bool>(), py::arg("path"), py::arg("compress") = false)
+        .def("add_frame", &VTKSeries::addFrame, py::arg("point_cloud"), py::arg("time"))
+        .def("get_frames", &VTKSeries::getFrames)
+        .def("get_path", &VTKSeries::getPath)
+        .def("__len__", [](const VTKSeries& series) { return series.getFrames().size(); });
+    m.def("vtk_compression_available", &VTKWriter::hasCompression);
+    
+    // EnsembleSolver class, series and temperatures come back as 2D arrays with one column per scenario
+    py::class_<EnsembleSolver>(m, "EnsembleSolver")
+        .def(py::init<PointCloud&, const std::vector<Material>&, double>(),
+             py::arg("point_cloud"), py::arg("materials"), py::arg("time_step"),
+             py::keep_alive<1, 2>())
+        .def("add_scenario", &EnsembleSolver::addScenario, py::arg("materials") = std::vector<Material>{})
+        .def("get_scenario_count", &EnsembleSolver::getScenarioCount)
+        .def("get_materials", &EnsembleSolver::getMaterials)
+        .def("set_temperature", &EnsembleSolver::setTemperature,
+             py::arg("scenario"), py::arg("material"), py::arg("temperature"))
+        .def("set_temperatures", &EnsembleSolver::setTemperatures)
+        .def("get_temperatures", [](const EnsembleSolver& solver, size_t scenario) {
+            auto column = solver.getTemperatures(scenario);
+            return py::array_t<double>(column.size(), column.data());
+        })
+        .def("get_temperature_matrix", [](const EnsembleSolver& solver) {
+            const auto& matrix = solver.getTemperatureMatrix();
+            auto count = solver.getScenarioCount();
+            auto rows = count > 0 ? matrix.size() / count : 0;
+            return py::array_t<double>({rows, count}, matrix.data());
+        })
+        .def("step", &EnsembleSolver::step, py::call_guard<py::gil_scoped_release>())
+        .def("run", &EnsembleSolver::run_for_time, py::call_guard<py::gil_scoped_release>())
+        .def("get_current_time", &EnsembleSolver::getCurrentTime)
+        .def("get_time_step", &EnsembleSolver::getTimeStep)
+        .def("get_stable_time_step", &EnsembleSolver::getStableTimeStep)
+        .def("get_average_temperature", &EnsembleSolver::getAverageTemperature,
+             py::arg("scenario"), py::arg("material"))
+        .def("set_record_interval", &EnsembleSolver::setRecordInterval)
+        .def("get_times", [](const EnsembleSolver& solver) {
+            const auto& times = solver.getTimes();
+            return py::array_t<double>(times.size(), times.data());
+        })
+        .def("get_average_temperature_series", [](const EnsembleSolver& solver, MaterialType material) {
+            const auto& series = solver.getAverageTemperatureSeries(material);
+            auto count = solver.getScenarioCount();
+            auto records = count > 0 ? series.size() / count : 0;
+            return py::array_t<double>({records, count}, series.data());
+        })
+        .def("set_surface_heat_transfer", &EnsembleSolver::setSurfaceHeatTransfer,
+             py::arg("convection_coefficient"), py::arg("emissivity") = 0.9)
+        .def("set_ambient_temperature", &EnsembleSolver::setAmbientTemperature)
+        .def("get_ambient_temperature", &EnsembleSolver::getAmbientTemperature)
+        .def("set_num_threads", &EnsembleSolver::setNumThreads)
+        .def("get_num_threads", &EnsembleSolver::getNumThreads);
     
     // CupGenerator class
     py::class_<CupGenerator>(m, "CupGenerator")
         .def(py::init<>())
-        .def("generate", &CupGenerator::generate);
+        .def("generate", &CupGenerator::generate)
+        .def_static("get_layer_count", &CupGenerator::getLayerCount);
     
     // CupGenerator::Parameters class
     py::class_<CupGenerator::Parameters>(m, "CupParameters")
@@ -99,5 +629,52 @@ PYBIND11_MODULE(heat_transfer, m) {
         .def_readwrite("point_spacing", &CupGenerator::Parameters::pointSpacing)
         .def_readwrite("coffee_temp", &CupGenerator::Parameters::coffeeTemp)
         .def_readwrite("cup_temp", &CupGenerator::Parameters::cupTemp)
-        .def_readwrite("air_temp", &CupGenerator::Parameters::airTemp);
+        .def_readwrite("air_temp", &CupGenerator::Parameters::airTemp)
+        .def_readwrite("precision", &CupGenerator::Parameters::precision)
+        .def_readwrite("coarse_spacing", &CupGenerator::Parameters::coarseSpacing)
+        .def_readwrite("refinement_band", &CupGenerator::Parameters::refinementBand)
+        .def_readwrite("include_air", &CupGenerator::Parameters::includeAir)
+        .def_readwrite("axisymmetric", &CupGenerator::Parameters::axisymmetric)
+        .def_readwrite("first_layer", &CupGenerator::Parameters::firstLayer)
+        .def_readwrite("last_layer", &CupGenerator::Parameters::lastLayer)
+        .def(py::pickle(
+            [](const CupGenerator::Parameters& p) {
+                return py::make_tuple(p.innerRadius, p.wallThickness, p.height, p.coffeeHeight, p.pointSpacing,
+                                      p.coffeeTemp, p.cupTemp, p.airTemp, static_cast<int>(p.precision),
+                                      p.coarseSpacing, p.refinementBand, p.includeAir, p.axisymmetric,
+                                      p.firstLayer, p.lastLayer);
+            },
+            [](const py::tuple& state) {
+                if (state.size() != 15) {
+                    throw std::runtime_error("CupParameters: invalid pickle state");
+                }
+                CupGenerator::Parameters p;
+                p.innerRadius = state[0].cast<double>();
+                p.wallThickness = state[1].cast<double>();
+                p.height = state[2].cast<double>();
+                p.coffeeHeight = state[3].cast<double>();
+                p.pointSpacing = state[4].cast<double>();
+                p.coffeeTemp = state[5].cast<double>();
+                p.cupTemp = state[6].cast<double>();
+                p.airTemp = state[7].cast<double>();
+                p.precision = static_cast<Precision>(state[8].cast<int>());
+                p.coarseSpacing = state[9].cast<double>();
+                p.refinementBand = state[10].cast<double>();
+                p.includeAir = state[11].cast<bool>();
+                p.axisymmetric = state[12].cast<bool>();
+                p.firstLayer = state[13].cast<size_t>();
+                p.lastLayer = state[14].cast<size_t>();
+                return p;
+            }));
+    
+    // Single vs double precision comparison
+    py::class_<PrecisionDrift>(m, "PrecisionDrift")
+        .def_readonly("max_difference", &PrecisionDrift::maxDifference)
+        .def_readonly("rms_difference", &PrecisionDrift::rmsDifference)
+        .def_readonly("coffee_difference", &PrecisionDrift::coffeeDifference)
+        .def_readonly("steps", &PrecisionDrift::steps);
+    
+    m.def("measure_precision_drift", &measurePrecisionDrift,
+          py::arg("point_cloud"), py::arg("materials"), py::arg("time_step"), py::arg("duration"),
+          py::arg("integrator") = Integrator::EXPLICIT_EULER);
 }
\ No newline at end of file
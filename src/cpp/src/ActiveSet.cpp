@@ -0,0 +1,168 @@
+#include "ActiveSet.hpp"
+#include "Checkpoint.hpp"
+#include <algorithm>
+#include <cmath>
+
+namespace {
+
+// steps between trims of the sticky set; a trim re-flags every hot row's neighbors, so it costs about one
+// extra pass over the hot rows' columns
+constexpr size_t kTrimInterval = 32;
+
+// Rows that moved by more than the tolerance join the next step and, the first time since the last trim,
+// flag their neighbors too (every writer stores the same 1, so the order doesn't matter). Returns true if
+// any row was newly flagged
+template <class Real>
+bool markHotRows(const int64_t* rowPtr, const int32_t* cols, const int32_t* rows, std::ptrdiff_t count,
+                 const Real* temperatures, const Real* out, double tolerance, uint8_t* marks, uint8_t* expanded,
+                 int numThreads) {
+    bool grew = false;
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) reduction(||:grew) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t r = 0; r < count; ++r) {
+        auto i = rows ? rows[r] : r;
+        if (expanded[i] || std::abs(static_cast<double>(out[i]) - temperatures[i]) <= tolerance) {
+            continue;
+        }
+        expanded[i] = 1;
+        auto flag = [&](int64_t j) {
+            uint8_t flagged;
+#ifdef WITH_OPENMP
+            #pragma omp atomic read
+#endif
+            flagged = marks[j];
+            if (!flagged) {
+#ifdef WITH_OPENMP
+                #pragma omp atomic write
+#endif
+                marks[j] = 1;
+                grew = true;
+            }
+        };
+        flag(i);
+        for (auto k = rowPtr[i]; k < rowPtr[i + 1]; ++k) {
+            flag(cols[k]);
+        }
+    }
+    return grew;
+}
+
+}  // namespace
+
+ActiveSet::ActiveSet() : tolerance_(1e-6), generation_(0), stepsSinceTrim_(0), changed_(false), valid_(false) {}
+
+template <class Real>
+void ActiveSet::step(const ConductanceOperator& op, const Real* temperatures, Real* out, double dt,
+                     int numThreads) {
+    const auto n = op.rows();
+
+    if (!valid_ || generation_ != op.getGeneration() || marks_.size() != n) {
+        // nothing is known about which rows changed, so this step computes them all
+        marks_.assign(n, 1);
+        released_.clear();
+        stepsSinceTrim_ = kTrimInterval;
+        changed_ = true;
+    }
+    for (auto i : released_) {
+        out[i] = temperatures[i];
+    }
+
+    if (changed_) {
+        points_.clear();
+        for (size_t i = 0; i < n; ++i) {
+            if (marks_[i]) {
+                points_.push_back(static_cast<int32_t>(i));
+            }
+        }
+    }
+
+    // a trim starts the next set empty, so only this step's hot rows and their halo carry over
+    bool trim = stepsSinceTrim_ >= kTrimInterval;
+    if (trim) {
+        marks_.assign(n, 0);
+        expanded_.assign(n, 0);
+        stepsSinceTrim_ = 0;
+    }
+    ++stepsSinceTrim_;
+
+    // a full set runs as a plain step, without the row list
+    const int32_t* rows = points_.size() == n ? nullptr : points_.data();
+    const auto count = points_.size();
+    op.applySubset(rows, count, temperatures, out, dt, numThreads);
+    changed_ = markHotRows(op.getRowPointers().data(), op.getColumnIndices().data(), rows,
+                           static_cast<std::ptrdiff_t>(count), temperatures, out, tolerance_, marks_.data(),
+                           expanded_.data(), numThreads);
+
+    // rows computed now but idle next time: out holds their new value, the other buffer doesn't
+    released_.clear();
+    if (trim) {
+        for (auto i : points_) {
+            if (!marks_[i]) {
+                released_.push_back(i);
+            }
+        }
+        changed_ = true;
+    }
+
+    generation_ = op.getGeneration();
+    valid_ = true;
+}
+
+void ActiveSet::writeCheckpoint(CheckpointWriter& writer) const {
+    writer.writeArray(points_);
+    writer.writeArray(released_);
+    writer.writeArray(marks_);
+    writer.writeArray(expanded_);
+    writer.write(tolerance_);
+    writer.write<uint64_t>(stepsSinceTrim_);
+    writer.write<uint8_t>(changed_);
+    writer.write<uint8_t>(valid_);
+}
+
+void ActiveSet::readCheckpoint(CheckpointReader& reader, const ConductanceOperator& op) {
+    auto points = reader.readArray<int32_t>();
+    auto released = reader.readArray<int32_t>();
+    auto marks = reader.readArray<uint8_t>();
+    auto expanded = reader.readArray<uint8_t>();
+    double tolerance = reader.read<double>();
+    auto stepsSinceTrim = reader.read<uint64_t>();
+    bool changed = reader.read<uint8_t>() != 0;
+    bool valid = reader.read<uint8_t>() != 0;
+
+    const auto n = op.rows();
+    auto inRange = [n](const std::vector<int32_t>& rows) {
+        return std::all_of(rows.begin(), rows.end(),
+                           [n](int32_t i) { return i >= 0 && static_cast<size_t>(i) < n; });
+    };
+    if (marks.size() != n || expanded.size() != n || !inRange(points) || !inRange(released)) {
+        reader.fail("active set doesn't match the operator");
+    }
+
+    points_ = std::move(points);
+    released_ = std::move(released);
+    marks_ = std::move(marks);
+    expanded_ = std::move(expanded);
+    tolerance_ = tolerance;
+    stepsSinceTrim_ = stepsSinceTrim;
+    changed_ = changed;
+    valid_ = valid;
+    generation_ = op.getGeneration();
+}
+
+void ActiveSet::restoreFrom(ActiveSet&& loaded, const ConductanceOperator& op) {
+    points_ = std::move(loaded.points_);
+    released_ = std::move(loaded.released_);
+    marks_ = std::move(loaded.marks_);
+    expanded_ = std::move(loaded.expanded_);
+    tolerance_ = loaded.tolerance_;
+    stepsSinceTrim_ = loaded.stepsSinceTrim_;
+    changed_ = loaded.changed_;
+    valid_ = loaded.valid_;
+    generation_ = op.getGeneration();
+}
+
+template void ActiveSet::step<double>(const ConductanceOperator&, const double*, double*, double, int);
+template void ActiveSet::step<float>(const ConductanceOperator&, const float*, float*, double, int);
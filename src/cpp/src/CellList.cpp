@@ -0,0 +1,73 @@
+#include "CellList.hpp"
+#include <algorithm>
+#include <cmath>
+
+CellList::CellList(const PointCloud& cloud, double cellSize)
+    : cloud_(cloud), cellSize_(cellSize), minX_(0.0), minY_(0.0), minZ_(0.0), nx_(1), ny_(1), nz_(1) {
+
+    auto n = cloud.size();
+    if (n == 0) {
+        cellStart_.assign(2, 0);
+        return;
+    }
+
+    auto maxX = cloud.getX(0), maxY = cloud.getY(0), maxZ = cloud.getZ(0);
+    minX_ = maxX; minY_ = maxY; minZ_ = maxZ;
+    for (auto i = size_t{1}; i < n; ++i) {
+        minX_ = std::min(minX_, cloud.getX(i)); maxX = std::max(maxX, cloud.getX(i));
+        minY_ = std::min(minY_, cloud.getY(i)); maxY = std::max(maxY, cloud.getY(i));
+        minZ_ = std::min(minZ_, cloud.getZ(i)); maxZ = std::max(maxZ, cloud.getZ(i));
+    }
+
+    // a very sparse cloud with a tiny cell size would allocate far more cells than points, so grow the
+    // cells until there are at most ~8 per point (queries stay correct, they just see more candidates)
+    auto extentCells = [&](double size) {
+        return (std::floor((maxX - minX_) / size) + 1.0) *
+               (std::floor((maxY - minY_) / size) + 1.0) *
+               (std::floor((maxZ - minZ_) / size) + 1.0);
+    };
+    while (extentCells(cellSize_) > 8.0 * static_cast<double>(n) + 27.0) {
+        cellSize_ *= 2.0;
+    }
+
+    nx_ = static_cast<size_t>(std::floor((maxX - minX_) / cellSize_)) + 1;
+    ny_ = static_cast<size_t>(std::floor((maxY - minY_) / cellSize_)) + 1;
+    nz_ = static_cast<size_t>(std::floor((maxZ - minZ_) / cellSize_)) + 1;
+
+    // counting sort of point indices by cell, stable so each cell lists its points in ascending order
+    std::vector<size_t> cellOf(n);
+    cellStart_.assign(nx_ * ny_ * nz_ + 1, 0);
+    for (auto i = size_t{0}; i < n; ++i) {
+        auto cell = (cellCoord(cloud.getZ(i), minZ_, nz_) * ny_ + cellCoord(cloud.getY(i), minY_, ny_)) * nx_
+                  + cellCoord(cloud.getX(i), minX_, nx_);
+        cellOf[i] = cell;
+        cellStart_[cell + 1]++;
+    }
+    for (auto c = size_t{0}; c + 1 < cellStart_.size(); ++c) {
+        cellStart_[c + 1] += cellStart_[c];
+    }
+
+    cellPoints_.resize(n);
+    auto cursor = std::vector<size_t>(cellStart_.begin(), cellStart_.end() - 1);
+    for (auto i = size_t{0}; i < n; ++i) {
+        cellPoints_[cursor[cellOf[i]]++] = i;
+    }
+}
+
+size_t CellList::cellCoord(double value, double origin, size_t count) const {
+    auto c = std::floor((value - origin) / cellSize_);
+    if (c <= 0.0) return 0;
+    return std::min(static_cast<size_t>(c), count - 1);
+}
+
+void CellList::radiusSearch(double x, double y, double z, double radius, std::vector<size_t>& out) const {
+    out.clear();
+    forEachInRadius(x, y, z, radius, [&](size_t j) { out.push_back(j); });
+    std::sort(out.begin(), out.end());
+}
+
+void CellList::buildNeighbors(PointCloud& cloud, double radius) const {
+    cloud.fillNeighbors(radius, [this](double x, double y, double z, double reach, std::vector<size_t>& out) {
+        radiusSearch(x, y, z, reach, out);
+    });
+}
@@ -0,0 +1,98 @@
+#include "Checkpoint.hpp"
+#include <cstdio>
+#include <cstring>
+#include <stdexcept>
+
+namespace {
+
+constexpr char kMagic[8] = {'H', 'E', 'A', 'T', 'C', 'K', 'P', 'T'};
+constexpr uint32_t kByteOrderMark = 0x01020304;
+
+}  // namespace
+
+CheckpointWriter::CheckpointWriter(const std::string& path, uint32_t sections)
+    : path_(path), temporary_(path + ".tmp"), out_(temporary_, std::ios::binary | std::ios::trunc) {
+    if (!out_) {
+        throw std::runtime_error("Checkpoint: can't open " + temporary_ + " for writing");
+    }
+    writeBytes(kMagic, sizeof(kMagic));
+    write(kCheckpointVersion);
+    write(kByteOrderMark);
+    write(sections);
+}
+
+void CheckpointWriter::writeBytes(const void* data, size_t bytes) {
+    if (bytes > 0) {
+        out_.write(static_cast<const char*>(data), static_cast<std::streamsize>(bytes));
+    }
+}
+
+CheckpointWriter::~CheckpointWriter() {
+    if (out_.is_open()) {
+        // a save that threw half way: the last good checkpoint at path_ stays
+        out_.close();
+        std::remove(temporary_.c_str());
+    }
+}
+
+void CheckpointWriter::close() {
+    out_.flush();
+    if (!out_) {
+        throw std::runtime_error("Checkpoint: writing " + temporary_ + " failed");
+    }
+    out_.close();
+    // written next to the target and renamed over it, like VTKWriter::writeCollection
+    if (!out_ || std::rename(temporary_.c_str(), path_.c_str()) != 0) {
+        std::remove(temporary_.c_str());
+        throw std::runtime_error("Checkpoint: can't replace " + path_);
+    }
+}
+
+CheckpointReader::CheckpointReader(const std::string& path)
+    : path_(path), in_(path, std::ios::binary), size_(0), version_(0), sections_(0) {
+    if (!in_) {
+        throw std::runtime_error("Checkpoint: can't open " + path);
+    }
+    in_.seekg(0, std::ios::end);
+    size_ = static_cast<uint64_t>(in_.tellg());
+    in_.seekg(0, std::ios::beg);
+
+    char magic[sizeof(kMagic)];
+    if (size_ < sizeof(magic)) {
+        fail("not a checkpoint");
+    }
+    readBytes(magic, sizeof(magic));
+    if (std::memcmp(magic, kMagic, sizeof(magic)) != 0) {
+        fail("not a checkpoint");
+    }
+    version_ = read<uint32_t>();
+    if (version_ == 0 || version_ > kCheckpointVersion) {
+        fail("format version " + std::to_string(version_) + " is newer than this build reads (" +
+             std::to_string(kCheckpointVersion) + ")");
+    }
+    if (read<uint32_t>() != kByteOrderMark) {
+        fail("written on a machine with the other byte order");
+    }
+    sections_ = read<uint32_t>();
+    if (!hasSection(CHECKPOINT_CLOUD)) {
+        fail("no point cloud section");
+    }
+}
+
+void CheckpointReader::readBytes(void* data, size_t bytes) {
+    if (bytes == 0) {
+        return;
+    }
+    in_.read(static_cast<char*>(data), static_cast<std::streamsize>(bytes));
+    if (!in_) {
+        fail("file ends early");
+    }
+}
+
+uint64_t CheckpointReader::remaining() {
+    return size_ - static_cast<uint64_t>(in_.tellg());
+}
+
+void CheckpointReader::fail(const std::string& message) const {
+    throw std::runtime_error("Checkpoint: " + path_ + ": " + message);
+}
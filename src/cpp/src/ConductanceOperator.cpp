@@ -0,0 +1,404 @@
+#include "ConductanceOperator.hpp"
+#include "Checkpoint.hpp"
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstddef>
+#include <limits>
+#include <stdexcept>
+
+// the AVX2 kernel is compiled in on x86 GCC/Clang and picked at runtime if the CPU supports it
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+#define HEAT_HAVE_AVX2_KERNEL 1
+#include <immintrin.h>
+#else
+#define HEAT_HAVE_AVX2_KERNEL 0
+#endif
+
+namespace {
+
+// sum of e_x^2 / |e| over the lattice offsets e (in lattice steps) within reach, on a 3D or a 2D lattice. The
+// pair weights go as 1 / |e|, so this is what sets the diffusivity a lattice of neighbor lists ends up with
+double stencilMoment(double reach, int dimensions) {
+    auto steps = static_cast<int>(std::floor(reach * (1.0 + kCutoffTolerance)));
+    auto depth = dimensions == 3 ? steps : 0;
+    double moment = 0.0;
+    for (int a = -steps; a <= steps; ++a) {
+        for (int b = -steps; b <= steps; ++b) {
+            for (int c = -depth; c <= depth; ++c) {
+                double length = std::sqrt(double(a * a + b * b + c * c));
+                if (length > 0.0 && withinCutoff(length, reach)) {
+                    moment += a * a / length;
+                }
+            }
+        }
+    }
+    return moment;
+}
+
+}  // namespace
+
+ConductanceOperator::ConductanceOperator()
+    : ambientTemperature_(0.0), source_(nullptr), revision_(0), generation_(0),
+      stableTimeStep_(std::numeric_limits<double>::infinity()) {}
+
+void ConductanceOperator::assemble(const PointCloud& cloud, const std::vector<Material>& materials,
+                                   const ConductanceTable& conductance, double contactArea, double pointVolume,
+                                   int numThreads, const SurfaceExchange& surface) {
+    auto n = cloud.size();
+
+    rowPointers_.assign(n + 1, 0);
+    for (auto i = size_t{0}; i < n; ++i) {
+        rowPointers_[i + 1] = rowPointers_[i] + static_cast<int64_t>(cloud.getNeighbors(i).size());
+    }
+    columnIndices_.resize(static_cast<size_t>(rowPointers_[n]));
+    weights_.resize(static_cast<size_t>(rowPointers_[n]));
+    capacities_.resize(n);
+
+    // per material constants hoisted out of the pair loop: rho * c * V, and the table row scaled by A / (rho * c * V)
+    std::array<double, 3> capacity{};
+    ConductanceTable scaled{};
+    for (int a = 0; a < 3; ++a) {
+        capacity[a] = materials[a].getDensity() * materials[a].getSpecificHeat() * pointVolume;
+        for (int b = 0; b < 3; ++b) {
+            scaled[a][b] = conductance[a][b] * contactArea / capacity[a];
+        }
+    }
+
+    const double* x = cloud.getXs().data();
+    const double* y = cloud.getYs().data();
+    const double* z = cloud.getZs().data();
+    const MaterialType* mat = cloud.getMaterials().data();
+    const double* scales = cloud.hasPointScales() ? cloud.getPointScales().data() : nullptr;
+
+    // axisymmetric clouds: row i is a ring of getRingFactor(i) reference points, and a pair of rings touches
+    // through the mean of the two. The plane has none of the pairs leaving it, so the weights are also scaled by
+    // how much more a 3D lattice of the same spacing and cutoff conducts than the 2D one, which makes the rings
+    // diffuse like the 3D cloud they replace
+    std::vector<double> rings;
+    double planeCorrection = 1.0;
+    if (cloud.isAxisymmetric()) {
+        rings.resize(n);
+        for (size_t i = 0; i < n; ++i) {
+            rings[i] = cloud.getRingFactor(i);
+        }
+        auto reach = cloud.getNeighborRadius() / cloud.getRingSpacing();
+        if (stencilMoment(reach, 2) > 0.0) {
+            planeCorrection = stencilMoment(reach, 3) / stencilMoment(reach, 2);
+        }
+    }
+
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(dynamic, 256) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t i = 0; i < static_cast<std::ptrdiff_t>(n); ++i) {
+        auto mi = static_cast<int>(mat[i]);
+        capacities_[i] = capacity[mi];
+        const double* row = scaled[mi].data();
+        if (scales) {
+            capacities_[i] *= scales[i] * scales[i] * scales[i];
+        }
+
+        const auto& neighbors = cloud.getNeighbors(i);
+        const auto count = neighbors.size();
+        int32_t* cols = columnIndices_.data() + rowPointers_[i];
+        double* w = weights_.data() + rowPointers_[i];
+        for (size_t k = 0; k < count; ++k) {
+            cols[k] = static_cast<int32_t>(neighbors[k]);
+        }
+
+        // plain indexed loads and no branches, so the compiler can vectorize the distance math
+        double xi = x[i], yi = y[i], zi = z[i];
+        for (size_t k = 0; k < count; ++k) {
+            auto j = cols[k];
+            double dx = x[j] - xi;
+            double dy = y[j] - yi;
+            double dz = z[j] - zi;
+            w[k] = row[static_cast<int>(mat[j])] / std::sqrt(dx*dx + dy*dy + dz*dz);
+        }
+
+        // scaled points: volume s_i^3, and the pair touches through the smaller of the two areas
+        if (scales) {
+            double si = scales[i];
+            for (size_t k = 0; k < count; ++k) {
+                double sa = std::min(si, scales[cols[k]]);
+                w[k] *= sa * sa / (si * si * si);
+            }
+        }
+        if (!rings.empty()) {
+            capacities_[i] *= rings[i];
+            double ri = rings[i];
+            for (size_t k = 0; k < count; ++k) {
+                w[k] *= planeCorrection * (ri + rings[cols[k]]) / (2.0 * ri);
+            }
+        }
+    }
+
+    // exposed points: h * A * a_i over the same capacity as the row
+    sinks_.clear();
+    if (cloud.hasSurfaceAreas() && surface.coefficient > 0.0) {
+        sinks_.resize(n);
+        for (size_t i = 0; i < n; ++i) {
+            sinks_[i] = surface.coefficient * contactArea * cloud.getSurfaceArea(i) / capacities_[i];
+        }
+    }
+    ambientTemperature_ = surface.ambientTemperature;
+
+    double maxRowSum = 0.0;
+    for (size_t i = 0; i < n; ++i) {
+        double rowSum = sinks_.empty() ? 0.0 : sinks_[i];
+        for (auto k = rowPointers_[i]; k < rowPointers_[i + 1]; ++k) {
+            rowSum += weights_[k];
+        }
+        maxRowSum = std::max(maxRowSum, rowSum);
+    }
+    stableTimeStep_ = maxRowSum > 0.0 ? 1.0 / maxRowSum : std::numeric_limits<double>::infinity();
+
+    // FLOAT32 clouds step with a rounded copy of the weights (the double ones still feed the implicit system)
+    if (cloud.getPrecision() == Precision::FLOAT32) {
+        weights32_.assign(weights_.begin(), weights_.end());
+        sinks32_.assign(sinks_.begin(), sinks_.end());
+    } else {
+        weights32_ = std::vector<float>();
+        sinks32_ = std::vector<float>();
+    }
+
+    source_ = &cloud;
+    revision_ = cloud.getRevision();
+    ++generation_;
+}
+
+bool ConductanceOperator::isCurrent(const PointCloud& cloud) const {
+    return source_ == &cloud && revision_ == cloud.getRevision();
+}
+
+void ConductanceOperator::invalidate() {
+    source_ = nullptr;
+}
+
+void ConductanceOperator::writeCheckpoint(CheckpointWriter& writer) const {
+    writer.writeArray(rowPointers_);
+    writer.writeArray(columnIndices_);
+    writer.writeArray(weights_);
+    writer.writeArray(weights32_);
+    writer.writeArray(capacities_);
+    writer.writeArray(sinks_);
+    writer.writeArray(sinks32_);
+    writer.write(ambientTemperature_);
+    writer.write(stableTimeStep_);
+}
+
+void ConductanceOperator::readCheckpoint(CheckpointReader& reader, const PointCloud& cloud) {
+    auto rowPointers = reader.readArray<int64_t>();
+    auto columnIndices = reader.readArray<int32_t>();
+    auto weights = reader.readArray<double>();
+    auto weights32 = reader.readArray<float>();
+    auto capacities = reader.readArray<double>();
+    auto sinks = reader.readArray<double>();
+    auto sinks32 = reader.readArray<float>();
+    double ambientTemperature = reader.read<double>();
+    double stableTimeStep = reader.read<double>();
+
+    const auto n = cloud.size();
+    const auto nonZeros = weights.size();
+    if (rowPointers.size() != n + 1 || rowPointers.front() != 0 ||
+        rowPointers.back() != static_cast<int64_t>(nonZeros) || columnIndices.size() != nonZeros ||
+        (!weights32.empty() && weights32.size() != nonZeros) || capacities.size() != n ||
+        (!sinks.empty() && sinks.size() != n) || (!sinks32.empty() && sinks32.size() != sinks.size())) {
+        reader.fail("operator doesn't match the point cloud");
+    }
+    for (auto j : columnIndices) {
+        if (j < 0 || static_cast<size_t>(j) >= n) reader.fail("operator column out of range");
+    }
+
+    rowPointers_ = std::move(rowPointers);
+    columnIndices_ = std::move(columnIndices);
+    weights_ = std::move(weights);
+    weights32_ = std::move(weights32);
+    capacities_ = std::move(capacities);
+    sinks_ = std::move(sinks);
+    sinks32_ = std::move(sinks32);
+    ambientTemperature_ = ambientTemperature;
+    stableTimeStep_ = stableTimeStep;
+    source_ = &cloud;
+    revision_ = cloud.getRevision();
+    ++generation_;
+}
+
+void ConductanceOperator::restoreFrom(ConductanceOperator&& loaded, const PointCloud& cloud) {
+    rowPointers_ = std::move(loaded.rowPointers_);
+    columnIndices_ = std::move(loaded.columnIndices_);
+    weights_ = std::move(loaded.weights_);
+    weights32_ = std::move(loaded.weights32_);
+    capacities_ = std::move(loaded.capacities_);
+    sinks_ = std::move(loaded.sinks_);
+    sinks32_ = std::move(loaded.sinks32_);
+    ambientTemperature_ = loaded.ambientTemperature_;
+    stableTimeStep_ = loaded.stableTimeStep_;
+    source_ = &cloud;
+    revision_ = cloud.getRevision();
+    ++generation_;
+}
+
+namespace {
+
+// Portable kernel for either storage precision. Each row is summed by a single thread in column order,
+// so any thread count gives the same bits. The kernels step rows[0..n) if given a row list, rows 0..n otherwise.
+template <class Real>
+void applyRows(const int64_t* rowPtr, const int32_t* cols, const Real* w, const Real* sinks, Real ambient,
+               const Real* temperatures, Real* out, Real dt, std::ptrdiff_t n, const int32_t* rows, int numThreads) {
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t r = 0; r < n; ++r) {
+        auto i = rows ? rows[r] : r;
+        Real Ti = temperatures[i];
+        Real rate = 0;
+        for (auto k = rowPtr[i]; k < rowPtr[i + 1]; ++k) {
+            rate += w[k] * (temperatures[cols[k]] - Ti);
+        }
+        if (sinks) {
+            rate += sinks[i] * (ambient - Ti);
+        }
+        out[i] = Ti + rate * dt;
+    }
+}
+
+#if HEAT_HAVE_AVX2_KERNEL
+// Same row sums as the scalar kernel, four neighbors at a time: gather T_j, then fused multiply-add
+// w * (T_j - T_i) into four partial sums. Only the summation order differs from the scalar path.
+__attribute__((target("avx2,fma")))
+void applyAvx2(const int64_t* rowPtr, const int32_t* cols, const double* w, const double* sinks, double ambient,
+               const double* temperatures, double* out, double dt, std::ptrdiff_t n, const int32_t* rows,
+               int numThreads) {
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t r = 0; r < n; ++r) {
+        auto i = rows ? rows[r] : r;
+        double Ti = temperatures[i];
+        __m256d center = _mm256_set1_pd(Ti);
+        __m256d acc = _mm256_setzero_pd();
+
+        auto k = rowPtr[i];
+        auto end = rowPtr[i + 1];
+        for (; k + 4 <= end; k += 4) {
+            __m128i idx = _mm_loadu_si128(reinterpret_cast<const __m128i*>(cols + k));
+            __m256d tj = _mm256_i32gather_pd(temperatures, idx, 8);
+            acc = _mm256_fmadd_pd(_mm256_loadu_pd(w + k), _mm256_sub_pd(tj, center), acc);
+        }
+
+        __m128d pair = _mm_add_pd(_mm256_castpd256_pd128(acc), _mm256_extractf128_pd(acc, 1));
+        double rate = _mm_cvtsd_f64(_mm_add_sd(pair, _mm_unpackhi_pd(pair, pair)));
+        for (; k < end; ++k) {
+            rate += w[k] * (temperatures[cols[k]] - Ti);
+        }
+        if (sinks) {
+            rate += sinks[i] * (ambient - Ti);
+        }
+        out[i] = Ti + rate * dt;
+    }
+}
+
+// Single precision version, eight neighbors per gather
+__attribute__((target("avx2,fma")))
+void applyAvx2(const int64_t* rowPtr, const int32_t* cols, const float* w, const float* sinks, float ambient,
+               const float* temperatures, float* out, float dt, std::ptrdiff_t n, const int32_t* rows,
+               int numThreads) {
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t r = 0; r < n; ++r) {
+        auto i = rows ? rows[r] : r;
+        float Ti = temperatures[i];
+        __m256 center = _mm256_set1_ps(Ti);
+        __m256 acc = _mm256_setzero_ps();
+
+        auto k = rowPtr[i];
+        auto end = rowPtr[i + 1];
+        for (; k + 8 <= end; k += 8) {
+            __m256i idx = _mm256_loadu_si256(reinterpret_cast<const __m256i*>(cols + k));
+            __m256 tj = _mm256_i32gather_ps(temperatures, idx, 4);
+            acc = _mm256_fmadd_ps(_mm256_loadu_ps(w + k), _mm256_sub_ps(tj, center), acc);
+        }
+
+        __m128 quad = _mm_add_ps(_mm256_castps256_ps128(acc), _mm256_extractf128_ps(acc, 1));
+        quad = _mm_add_ps(quad, _mm_movehl_ps(quad, quad));
+        float rate = _mm_cvtss_f32(_mm_add_ss(quad, _mm_movehdup_ps(quad)));
+        for (; k < end; ++k) {
+            rate += w[k] * (temperatures[cols[k]] - Ti);
+        }
+        if (sinks) {
+            rate += sinks[i] * (ambient - Ti);
+        }
+        out[i] = Ti + rate * dt;
+    }
+}
+#endif
+
+}  // namespace
+
+bool ConductanceOperator::hasSimdKernel() {
+#if HEAT_HAVE_AVX2_KERNEL
+    static const bool supported = __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma");
+    return supported;
+#else
+    return false;
+#endif
+}
+
+void ConductanceOperator::apply(const double* temperatures, double* out, double dt, int numThreads) const {
+    applySubset(nullptr, rows(), temperatures, out, dt, numThreads);
+}
+
+void ConductanceOperator::applyScalar(const double* temperatures, double* out, double dt, int numThreads) const {
+    applyRows(rowPointers_.data(), columnIndices_.data(), weights_.data(), sinks_.empty() ? nullptr : sinks_.data(),
+              ambientTemperature_, temperatures, out, dt, static_cast<std::ptrdiff_t>(rows()), nullptr, numThreads);
+}
+
+void ConductanceOperator::apply(const float* temperatures, float* out, double dt, int numThreads) const {
+    applySubset(nullptr, rows(), temperatures, out, dt, numThreads);
+}
+
+void ConductanceOperator::applySubset(const int32_t* rowList, size_t count, const double* temperatures, double* out,
+                                      double dt, int numThreads) const {
+    const auto n = static_cast<std::ptrdiff_t>(count);
+    const double* sinks = sinks_.empty() ? nullptr : sinks_.data();
+#if HEAT_HAVE_AVX2_KERNEL
+    if (hasSimdKernel()) {
+        applyAvx2(rowPointers_.data(), columnIndices_.data(), weights_.data(), sinks, ambientTemperature_,
+                  temperatures, out, dt, n, rowList, numThreads);
+        return;
+    }
+#endif
+    applyRows(rowPointers_.data(), columnIndices_.data(), weights_.data(), sinks, ambientTemperature_,
+              temperatures, out, dt, n, rowList, numThreads);
+}
+
+void ConductanceOperator::applySubset(const int32_t* rowList, size_t count, const float* temperatures, float* out,
+                                      double dt, int numThreads) const {
+    if (weights32_.size() != weights_.size()) {
+        throw std::logic_error("ConductanceOperator: single precision apply needs an operator assembled "
+                               "from a FLOAT32 cloud");
+    }
+    const auto n = static_cast<std::ptrdiff_t>(count);
+    const float* sinks = sinks32_.empty() ? nullptr : sinks32_.data();
+    const auto ambient = static_cast<float>(ambientTemperature_);
+#if HEAT_HAVE_AVX2_KERNEL
+    if (hasSimdKernel()) {
+        applyAvx2(rowPointers_.data(), columnIndices_.data(), weights32_.data(), sinks, ambient, temperatures, out,
+                  static_cast<float>(dt), n, rowList, numThreads);
+        return;
+    }
+#endif
+    applyRows(rowPointers_.data(), columnIndices_.data(), weights32_.data(), sinks, ambient, temperatures, out,
+              static_cast<float>(dt), n, rowList, numThreads);
+}
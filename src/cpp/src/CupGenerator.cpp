@@ -1,14 +1,100 @@
 #include "CupGenerator.hpp"
+#include <algorithm>
 #include <cmath>
+#include <cstdint>
+#include <stdexcept>
+#include <vector>
+
+namespace {
+
+auto constexpr kBoxHeight = double{.15};
+auto constexpr kBoxWidth = double{.2};
+
+// which part of the scene (x, y, z) falls in
+MaterialType classify(double x, double y, double z, const CupGenerator::Parameters& params) {
+    auto max_radius = double{log(z*50.0 + 1.0)/50.0 + .05};
+    auto min_radius = double{log(z*50.0 + 1.0)/50.0 + .04};
+
+    auto radius = double{sqrt(pow(x, 2) + pow(y, 2))};
+
+    if ((radius <= max_radius && radius >= min_radius && z <= params.coffeeHeight) || (radius <= max_radius && z <= 0.01)) {
+        return MaterialType::CUP_MATERIAL;
+    } else if (radius <= min_radius && z <= params.coffeeHeight - .01 && z >= 0.01) {
+        return MaterialType::COFFEE;
+    }
+    return MaterialType::AIR;
+}
+
+double initialTemperature(MaterialType material, const CupGenerator::Parameters& params) {
+    switch (material) {
+        case MaterialType::COFFEE: return params.coffeeTemp;
+        case MaterialType::CUP_MATERIAL: return params.cupTemp;
+        default: return params.airTemp;
+    }
+}
+
+// number of values the generator loops visit from start to end (inclusive) with accumulated steps
+size_t latticeCount(double start, double end, double spacing) {
+    size_t count = 0;
+    for (auto v = start; v <= end; v += spacing) {
+        ++count;
+    }
+    return count;
+}
+
+bool inLayers(size_t k, const CupGenerator::Parameters& params) {
+    return k >= params.firstLayer && k < params.lastLayer;
+}
+
+// 3D prefix counts of one material over the lattice, so any box of lattice points can be tested in O(1)
+class MaterialCounts {
+public:
+    MaterialCounts(const std::vector<MaterialType>& materials, MaterialType material, size_t nx, size_t ny, size_t nz)
+        : nx_(nx + 1), ny_(ny + 1), sums_((nx + 1) * (ny + 1) * (nz + 1), 0) {
+        for (size_t k = 1; k <= nz; ++k) {
+            for (size_t i = 1; i <= nx; ++i) {
+                for (size_t j = 1; j <= ny; ++j) {
+                    auto hit = materials[((k - 1) * nx + (i - 1)) * ny + (j - 1)] == material ? 1 : 0;
+                    at(i, j, k) = hit + at(i - 1, j, k) + at(i, j - 1, k) + at(i, j, k - 1)
+                                - at(i - 1, j - 1, k) - at(i - 1, j, k - 1) - at(i, j - 1, k - 1)
+                                + at(i - 1, j - 1, k - 1);
+                }
+            }
+        }
+    }
+
+    // points of the material in the half open box [i0, i1) x [j0, j1) x [k0, k1)
+    int64_t count(size_t i0, size_t i1, size_t j0, size_t j1, size_t k0, size_t k1) const {
+        return get(i1, j1, k1) - get(i0, j1, k1) - get(i1, j0, k1) - get(i1, j1, k0)
+             + get(i0, j0, k1) + get(i0, j1, k0) + get(i1, j0, k0) - get(i0, j0, k0);
+    }
+
+private:
+    int64_t& at(size_t i, size_t j, size_t k) { return sums_[(k * nx_ + i) * ny_ + j]; }
+    int64_t get(size_t i, size_t j, size_t k) const { return sums_[(k * nx_ + i) * ny_ + j]; }
+
+    size_t nx_, ny_;
+    std::vector<int64_t> sums_;
+};
+
+}  // namespace
 
 CupGenerator::CupGenerator() = default;
 
 PointCloud CupGenerator::generate(const Parameters& params) {
+    if (params.axisymmetric) {
+        return generateAxisymmetric(params);
+    }
+    if (params.coarseSpacing > params.pointSpacing || !params.includeAir) {
+        return generateOctree(params);
+    }
+
     PointCloud cloud;
+    cloud.setPrecision(params.precision);
     
     auto spacing = double{params.pointSpacing};
-    auto boxHeight = double{.15};
-    auto boxWidth = double{.2};
+    auto boxHeight = kBoxHeight;
+    auto boxWidth = kBoxWidth;
 
     //coffee cup will be .08 meters so a little less than half the 
 
@@ -18,25 +104,17 @@ PointCloud CupGenerator::generate(const Parameters& params) {
     
     // I think we should generate points in batches or by cube, and assign them based on their location with mathematical formulas
 
-    for (auto z = double{0.0}; z <= boxHeight; z += spacing) //go layer by later creating points
+    auto layer = size_t{0};
+    for (auto z = double{0.0}; z <= boxHeight; z += spacing, ++layer) //go layer by later creating points
     {
+        if (!inLayers(layer, params)) continue;
         for (auto x = double{-boxWidth/2}; x <= boxWidth/2; x += spacing) 
         {
             for (auto y = double{-boxWidth/2}; y <= boxWidth/2; y += spacing)
             {
-                auto max_radius = double{log(z*50.0 + 1.0)/50.0 + .05};
-                auto min_radius = double{log(z*50.0 + 1.0)/50.0 + .04};
-
-                auto radius = double{sqrt(pow(x, 2) + pow(y, 2))};
-
                 //in later runs maybe we can add slight nonhomogeny with temperature or  xyz with normal distribution engines
-                if ((radius <= max_radius && radius >= min_radius && z <= params.coffeeHeight) || (radius <= max_radius && z <= 0.01)) {
-                    cloud.addPoint(Point(x, y, z, params.cupTemp, MaterialType::CUP_MATERIAL, cloud.size()));
-                } else if (radius <= min_radius && z <= params.coffeeHeight - .01 && z >= 0.01) {
-                    cloud.addPoint(Point(x, y, z, params.coffeeTemp, MaterialType::COFFEE, cloud.size()));
-                } else {
-                    cloud.addPoint(Point(x, y, z, params.airTemp, MaterialType::AIR, cloud.size()));
-                }
+                auto material = classify(x, y, z, params);
+                cloud.addPoint(Point(x, y, z, initialTemperature(material, params), material, cloud.size()));
             }
         }
     }
@@ -45,3 +123,177 @@ PointCloud CupGenerator::generate(const Parameters& params) {
 
     return cloud;
 }
+
+size_t CupGenerator::getLayerCount(const Parameters& params) {
+    return latticeCount(0.0, kBoxHeight, params.pointSpacing);
+}
+
+PointCloud CupGenerator::generateOctree(const Parameters& params) {
+    if (params.coarseSpacing > params.pointSpacing &&
+        (params.firstLayer > 0 || params.lastLayer < getLayerCount(params))) {
+        throw std::invalid_argument("CupGenerator: a layer range can't be generated for a graded cloud");
+    }
+
+    PointCloud cloud;
+    cloud.setPrecision(params.precision);
+
+    // the fine lattice is the one generate() would produce at pointSpacing
+    auto h = params.pointSpacing;
+    auto nx = latticeCount(-kBoxWidth/2, kBoxWidth/2, h);
+    auto ny = nx;
+    auto nz = latticeCount(0.0, kBoxHeight, h);
+
+    std::vector<MaterialType> materials(nx * ny * nz);
+    for (size_t k = 0; k < nz; ++k) {
+        for (size_t i = 0; i < nx; ++i) {
+            for (size_t j = 0; j < ny; ++j) {
+                materials[(k * nx + i) * ny + j] = classify(-kBoxWidth/2 + i * h, -kBoxWidth/2 + j * h, k * h, params);
+            }
+        }
+    }
+    MaterialCounts coffee(materials, MaterialType::COFFEE, nx, ny, nz);
+    MaterialCounts cup(materials, MaterialType::CUP_MATERIAL, nx, ny, nz);
+
+    // without grading every cube is a single lattice point
+    auto levels = 0;
+    while (h * (size_t{1} << (levels + 1)) <= params.coarseSpacing * (1.0 + 1e-9)) {
+        ++levels;
+    }
+    auto band = static_cast<size_t>(std::ceil(params.refinementBand / h - 1e-9));
+
+    auto isAir = [&](int64_t i, int64_t j, int64_t k) {
+        return materials[(k * nx + i) * ny + j] == MaterialType::AIR;
+    };
+    // lattice faces on the cube's boundary that look out of the box or onto air
+    auto exposedFaces = [&](size_t i, size_t j, size_t k, size_t size) {
+        auto open = [&](int64_t a, int64_t b, int64_t c) {
+            if (a < 0 || b < 0 || c < 0 || a >= static_cast<int64_t>(nx) || b >= static_cast<int64_t>(ny) ||
+                c >= static_cast<int64_t>(nz)) {
+                return true;
+            }
+            return isAir(a, b, c);
+        };
+        auto lo = [](size_t v) { return static_cast<int64_t>(v) - 1; };
+        auto hi = [size](size_t v) { return static_cast<int64_t>(v + size); };
+        size_t count = 0;
+        for (size_t u = 0; u < size; ++u) {
+            for (size_t v = 0; v < size; ++v) {
+                count += open(lo(i), j + u, k + v) + open(hi(i), j + u, k + v);
+                count += open(i + u, lo(j), k + v) + open(i + u, hi(j), k + v);
+                count += open(i + u, j + v, lo(k)) + open(i + u, j + v, hi(k));
+            }
+        }
+        return count;
+    };
+    auto emitPoint = [&](size_t i, size_t j, size_t k, size_t size, MaterialType material) {
+        if (material == MaterialType::AIR && !params.includeAir) {
+            return;
+        }
+        auto center = (size - 1) / 2.0;
+        auto index = cloud.addPoint(-kBoxWidth/2 + (i + center) * h, -kBoxWidth/2 + (j + center) * h,
+                                    (k + center) * h, initialTemperature(material, params), material,
+                                    static_cast<double>(size));
+        if (!params.includeAir) {
+            // one reference contact area per open lattice face, whatever the point's scale
+            cloud.setSurfaceArea(index, static_cast<double>(exposedFaces(i, j, k, size)));
+        }
+    };
+
+    // a cube of size^3 lattice points starting at (i, j, k) becomes one point if it lies inside the lattice and
+    // it and its surroundings are one material, otherwise it splits into eight. The surroundings grow with the
+    // cube, which keeps neighboring levels from jumping by more than about a factor of two
+    auto emit = [&](auto& self, size_t i, size_t j, size_t k, size_t size) -> void {
+        if (i >= nx || j >= ny || k >= nz) return;
+
+        auto inside = i + size <= nx && j + size <= ny && k + size <= nz;
+        if (size > 1 && inside) {
+            auto margin = band + size / 2;
+            auto i0 = i > margin ? i - margin : 0, i1 = std::min(nx, i + size + margin);
+            auto j0 = j > margin ? j - margin : 0, j1 = std::min(ny, j + size + margin);
+            auto k0 = k > margin ? k - margin : 0, k1 = std::min(nz, k + size + margin);
+            auto total = static_cast<int64_t>((i1 - i0) * (j1 - j0) * (k1 - k0));
+            auto coffeeCount = coffee.count(i0, i1, j0, j1, k0, k1);
+            auto cupCount = cup.count(i0, i1, j0, j1, k0, k1);
+            if (coffeeCount == total || cupCount == total || coffeeCount + cupCount == 0) {
+                auto material = coffeeCount == total ? MaterialType::COFFEE
+                              : cupCount == total ? MaterialType::CUP_MATERIAL : MaterialType::AIR;
+                emitPoint(i, j, k, size, material);
+                return;
+            }
+        }
+        if (size == 1) {
+            emitPoint(i, j, k, 1, materials[(k * nx + i) * ny + j]);
+            return;
+        }
+
+        auto half = size / 2;
+        for (auto dk : {size_t{0}, half}) {
+            for (auto di : {size_t{0}, half}) {
+                for (auto dj : {size_t{0}, half}) {
+                    self(self, i + di, j + dj, k + dk, half);
+                }
+            }
+        }
+    };
+
+    auto root = size_t{1} << levels;
+    for (size_t k = 0; k < nz; k += root) {
+        if (!inLayers(k, params)) continue;
+        for (size_t i = 0; i < nx; i += root) {
+            for (size_t j = 0; j < ny; j += root) {
+                emit(emit, i, j, k, root);
+            }
+        }
+    }
+
+    return cloud;
+}
+
+PointCloud CupGenerator::generateAxisymmetric(const Parameters& params) {
+    PointCloud cloud;
+    cloud.setPrecision(params.precision);
+
+    // same radii and heights as the 3D lattice's points on the positive x axis
+    auto h = params.pointSpacing;
+    auto nr = latticeCount(0.0, kBoxWidth/2, h);
+    auto nz = latticeCount(0.0, kBoxHeight, h);
+
+    std::vector<MaterialType> materials(nr * nz);
+    for (size_t k = 0; k < nz; ++k) {
+        for (size_t i = 0; i < nr; ++i) {
+            materials[k * nr + i] = classify(i * h, 0.0, k * h, params);
+        }
+    }
+
+    auto open = [&](int64_t i, int64_t k) {
+        if (i >= static_cast<int64_t>(nr) || k < 0 || k >= static_cast<int64_t>(nz)) {
+            return true;
+        }
+        return materials[k * nr + i] == MaterialType::AIR;
+    };
+
+    cloud.setAxisymmetric(h);
+    for (size_t k = 0; k < nz; ++k) {
+        if (!inLayers(k, params)) continue;
+        for (size_t i = 0; i < nr; ++i) {
+            auto material = materials[k * nr + i];
+            if (material == MaterialType::AIR && !params.includeAir) {
+                continue;
+            }
+            auto index = cloud.addPoint(i * h, 0.0, k * h, initialTemperature(material, params), material);
+            if (!params.includeAir) {
+                // the ring's open faces in reference contact areas: the cylinders at r -+ h/2 are 2 pi (r -+ h/2) / h
+                // lattice faces around, the annuli above and below one ring factor (the axis has no inner face)
+                auto r = i * h;
+                auto ii = static_cast<int64_t>(i), kk = static_cast<int64_t>(k);
+                double area = 0.0;
+                if (i > 0 && open(ii - 1, kk)) area += 2.0 * kPi * (r - h / 2.0) / h;
+                if (open(ii + 1, kk)) area += 2.0 * kPi * (r + h / 2.0) / h;
+                area += (open(ii, kk - 1) + open(ii, kk + 1)) * cloud.getRingFactor(index);
+                cloud.setSurfaceArea(index, area);
+            }
+        }
+    }
+
+    return cloud;
+}
@@ -0,0 +1,374 @@
+#include "EnsembleSolver.hpp"
+#include "Log.hpp"
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+
+#ifdef WITH_OPENMP
+#include <omp.h>
+#endif
+
+// the scenario loops get an AVX2 build on x86 GCC/Clang, picked at runtime like ConductanceOperator's kernel
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+#define HEAT_HAVE_AVX2_KERNEL 1
+#else
+#define HEAT_HAVE_AVX2_KERNEL 0
+#endif
+
+namespace {
+
+// density, heat capacity and conductivity of 1 keep only the geometry in the operator weights, the ambient
+// temperatures are kept for the surface exchange
+std::vector<Material> unitMaterials(const std::vector<Material>& materials) {
+    std::vector<Material> unit;
+    for (const auto& material : materials) {
+        unit.emplace_back(1.0, 1.0, 1.0, material.getAmbientTemperature());
+    }
+    return unit;
+}
+
+// what a step of the ensemble reads, shared by the kernels
+struct EnsembleRows {
+    const int64_t* rowPtr;
+    const int32_t* cols;
+    const double* g;            // geometric weights
+    const uint8_t* codes;       // pair codes 3 * m_i + m_j
+    const double* sinks;        // geometric sinks, nullptr if none
+    double ambient;
+    const MaterialType* mat;
+    const double* pairTables;   // 9 x count
+    const double* sinkTables;   // 3 x count
+    size_t count;               // scenarios, the row stride of the temperature matrix
+};
+
+// scenarios are stepped kBlock at a time so the partial sums of a row stay in registers while its neighbors
+// stream by, and the scenario loops have a fixed trip count the compiler can vectorize
+constexpr size_t kBlock = 8;
+
+// Scenarios [s0, s0 + width) of row i. Every scenario is summed in column order, so the result doesn't depend on
+// the thread count. Inlined into the kernels below, which compile it for their target
+template <size_t Width>
+__attribute__((always_inline)) inline void stepBlock(const EnsembleRows& e, const double* __restrict T,
+                                                     double* __restrict out, double dt, std::ptrdiff_t i,
+                                                     size_t s0, size_t width) {
+    const auto count = e.count;
+    const auto lanes = Width ? Width : width;
+    const double* Ti = T + i * count + s0;
+    double rate[kBlock] = {};
+    for (auto k = e.rowPtr[i]; k < e.rowPtr[i + 1]; ++k) {
+        const double* Tj = T + static_cast<size_t>(e.cols[k]) * count + s0;
+        const double* K = e.pairTables + e.codes[k] * count + s0;
+        const double gk = e.g[k];
+        for (size_t s = 0; s < lanes; ++s) {
+            rate[s] += gk * K[s] * (Tj[s] - Ti[s]);
+        }
+    }
+    if (e.sinks && e.sinks[i] != 0.0) {
+        const double* C = e.sinkTables + static_cast<int>(e.mat[i]) * count + s0;
+        for (size_t s = 0; s < lanes; ++s) {
+            rate[s] += e.sinks[i] * C[s] * (e.ambient - Ti[s]);
+        }
+    }
+    double* Oi = out + i * count + s0;
+    for (size_t s = 0; s < lanes; ++s) {
+        Oi[s] = Ti[s] + dt * rate[s];
+    }
+}
+
+__attribute__((always_inline)) inline void stepRows(const EnsembleRows& e, const double* T, double* out, double dt,
+                                                    std::ptrdiff_t n, int numThreads) {
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t i = 0; i < n; ++i) {
+        size_t s0 = 0;
+        for (; s0 + kBlock <= e.count; s0 += kBlock) {
+            stepBlock<kBlock>(e, T, out, dt, i, s0, kBlock);
+        }
+        if (s0 < e.count) {
+            stepBlock<0>(e, T, out, dt, i, s0, e.count - s0);
+        }
+    }
+}
+
+void stepRowsPortable(const EnsembleRows& e, const double* T, double* out, double dt, std::ptrdiff_t n,
+                      int numThreads) {
+    stepRows(e, T, out, dt, n, numThreads);
+}
+
+#if HEAT_HAVE_AVX2_KERNEL
+// the same loops with 4 scenarios per instruction, may differ from the portable kernel in the last bits (fused
+// multiply-adds)
+__attribute__((target("avx2,fma")))
+void stepRowsAvx2(const EnsembleRows& e, const double* T, double* out, double dt, std::ptrdiff_t n, int numThreads) {
+    stepRows(e, T, out, dt, n, numThreads);
+}
+#endif
+
+}  // namespace
+
+EnsembleSolver::EnsembleSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep)
+    : pointCloud_(pointCloud), materials_(materials), geometry_(pointCloud, unitMaterials(materials), timeStep),
+      timeStep_(timeStep), currentTime_(0.0), generation_(0), tablesCurrent_(false), recordInterval_(1) {}
+
+size_t EnsembleSolver::addScenario(const std::vector<Material>& materials) {
+    if (!materials.empty() && materials.size() < 3) {
+        throw std::invalid_argument("EnsembleSolver: a scenario needs a material for coffee, cup and air");
+    }
+    const auto n = pointCloud_.size();
+    const auto count = scenarios_.size();
+    if (temperatures_.size() != n * count) {
+        throw std::logic_error("EnsembleSolver: the point cloud changed size since the scenarios were added");
+    }
+
+    // widen the matrix by one column holding the cloud's temperatures
+    std::vector<double> widened(n * (count + 1));
+    for (size_t i = 0; i < n; ++i) {
+        std::copy_n(temperatures_.begin() + i * count, count, widened.begin() + i * (count + 1));
+        widened[i * (count + 1) + count] = pointCloud_.getTemperature(i);
+    }
+    temperatures_.swap(widened);
+    nextTemperatures_.assign(temperatures_.size(), 0.0);
+
+    scenarios_.push_back(Scenario{materials.empty() ? materials_ : materials});
+    tablesCurrent_ = false;
+    return count;
+}
+
+const std::vector<Material>& EnsembleSolver::getMaterials(size_t scenario) const {
+    return scenarios_.at(scenario).materials;
+}
+
+void EnsembleSolver::setTemperature(size_t scenario, MaterialType material, double temperature) {
+    const auto count = scenarios_.size();
+    if (scenario >= count) {
+        throw std::out_of_range("EnsembleSolver: no scenario " + std::to_string(scenario));
+    }
+    for (size_t i = 0; i < pointCloud_.size(); ++i) {
+        if (pointCloud_.getMaterial(i) == material) {
+            temperatures_[i * count + scenario] = temperature;
+        }
+    }
+}
+
+void EnsembleSolver::setTemperatures(size_t scenario, const std::vector<double>& temperatures) {
+    const auto count = scenarios_.size();
+    if (scenario >= count) {
+        throw std::out_of_range("EnsembleSolver: no scenario " + std::to_string(scenario));
+    }
+    if (temperatures.size() != pointCloud_.size()) {
+        throw std::invalid_argument("EnsembleSolver: expected one temperature per point");
+    }
+    for (size_t i = 0; i < temperatures.size(); ++i) {
+        temperatures_[i * count + scenario] = temperatures[i];
+    }
+}
+
+std::vector<double> EnsembleSolver::getTemperatures(size_t scenario) const {
+    const auto count = scenarios_.size();
+    if (scenario >= count) {
+        throw std::out_of_range("EnsembleSolver: no scenario " + std::to_string(scenario));
+    }
+    std::vector<double> column(pointCloud_.size());
+    for (size_t i = 0; i < column.size(); ++i) {
+        column[i] = temperatures_[i * count + scenario];
+    }
+    return column;
+}
+
+void EnsembleSolver::ensureGeometry() {
+    const auto& op = geometry_.getConductanceOperator();
+    if (temperatures_.size() != op.rows() * scenarios_.size()) {
+        throw std::logic_error("EnsembleSolver: the point cloud changed size since the scenarios were added");
+    }
+    if (generation_ == op.getGeneration()) {
+        return;
+    }
+
+    const auto& rowPointers = op.getRowPointers();
+    const auto& columns = op.getColumnIndices();
+    const auto& materials = pointCloud_.getMaterials();
+    pairCodes_.resize(columns.size());
+    for (size_t i = 0; i < op.rows(); ++i) {
+        auto mi = static_cast<int>(materials[i]);
+        for (auto k = rowPointers[i]; k < rowPointers[i + 1]; ++k) {
+            pairCodes_[k] = static_cast<uint8_t>(3 * mi + static_cast<int>(materials[columns[k]]));
+        }
+    }
+    generation_ = op.getGeneration();
+}
+
+void EnsembleSolver::ensureTables() {
+    if (tablesCurrent_) {
+        return;
+    }
+    const auto count = scenarios_.size();
+    pairTables_.assign(9 * count, 0.0);
+    sinkTables_.assign(3 * count, 0.0);
+    for (size_t s = 0; s < count; ++s) {
+        const auto& materials = scenarios_[s].materials;
+        // the same pair law the single solver assembles its operator with
+        const auto conductance = HeatSolver::conductanceTable(materials);
+        for (int a = 0; a < 3; ++a) {
+            double capacity = materials[a].getDensity() * materials[a].getSpecificHeat();
+            sinkTables_[a * count + s] = 1.0 / capacity;
+            for (int b = 0; b < 3; ++b) {
+                pairTables_[(3 * a + b) * count + s] = conductance[a][b] / capacity;
+            }
+        }
+    }
+    tablesCurrent_ = true;
+}
+
+void EnsembleSolver::step() {
+    ensureGeometry();
+    ensureTables();
+
+    const auto& op = geometry_.getConductanceOperator();
+    EnsembleRows rows{op.getRowPointers().data(), op.getColumnIndices().data(), op.getWeights().data(),
+                      pairCodes_.data(), op.getSinks().empty() ? nullptr : op.getSinks().data(),
+                      op.getAmbientTemperature(), pointCloud_.getMaterials().data(), pairTables_.data(),
+                      sinkTables_.data(), scenarios_.size()};
+    const auto n = static_cast<std::ptrdiff_t>(op.rows());
+    int numThreads = 1;
+#ifdef WITH_OPENMP
+    numThreads = getNumThreads() > 0 ? getNumThreads() : omp_get_max_threads();
+#endif
+#if HEAT_HAVE_AVX2_KERNEL
+    if (ConductanceOperator::hasSimdKernel()) {
+        stepRowsAvx2(rows, temperatures_.data(), nextTemperatures_.data(), timeStep_, n, numThreads);
+    } else
+#endif
+    {
+        stepRowsPortable(rows, temperatures_.data(), nextTemperatures_.data(), timeStep_, n, numThreads);
+    }
+
+    temperatures_.swap(nextTemperatures_);
+    currentTime_ += timeStep_;
+}
+
+void EnsembleSolver::run_for_time(double duration) {
+    double endTime = currentTime_ + duration;
+    times_.clear();
+    for (auto& series : series_) {
+        series.clear();
+    }
+
+    double limit = getStableTimeStep();
+    if (timeStep_ > limit) {
+        HEAT_LOG(LogLevel::WARNING, "time step " << timeStep_ << " s exceeds the explicit stability limit of "
+                                    << limit << " s of the ensemble, the run will diverge");
+    }
+
+    record();
+    size_t steps = 0;
+    while (currentTime_ < endTime) {
+        step();
+        if (++steps % recordInterval_ == 0 || currentTime_ >= endTime) {
+            record();
+        }
+    }
+}
+
+double EnsembleSolver::getStableTimeStep() {
+    ensureGeometry();
+    ensureTables();
+
+    // the largest row sum of any scenario, as in ConductanceOperator::getStableTimeStep
+    const auto& op = geometry_.getConductanceOperator();
+    const auto count = scenarios_.size();
+    const auto& rowPointers = op.getRowPointers();
+    const auto& g = op.getWeights();
+    const auto& sinks = op.getSinks();
+    const auto& materials = pointCloud_.getMaterials();
+    std::vector<double> rowSum(count);
+    double maxRowSum = 0.0;
+    for (size_t i = 0; i < op.rows(); ++i) {
+        std::fill(rowSum.begin(), rowSum.end(), 0.0);
+        for (auto k = rowPointers[i]; k < rowPointers[i + 1]; ++k) {
+            for (size_t s = 0; s < count; ++s) {
+                rowSum[s] += g[k] * pairTables_[pairCodes_[k] * count + s];
+            }
+        }
+        for (size_t s = 0; s < count; ++s) {
+            if (!sinks.empty()) {
+                rowSum[s] += sinks[i] * sinkTables_[static_cast<int>(materials[i]) * count + s];
+            }
+            maxRowSum = std::max(maxRowSum, rowSum[s]);
+        }
+    }
+    return maxRowSum > 0.0 ? 1.0 / maxRowSum : std::numeric_limits<double>::infinity();
+}
+
+double EnsembleSolver::getAverageTemperature(size_t scenario, MaterialType material) const {
+    const auto count = scenarios_.size();
+    if (scenario >= count) {
+        throw std::out_of_range("EnsembleSolver: no scenario " + std::to_string(scenario));
+    }
+    double sum = 0.0;
+    double weight = 0.0;
+    for (size_t i = 0; i < pointCloud_.size(); ++i) {
+        if (pointCloud_.getMaterial(i) == material) {
+            auto v = pointCloud_.getVolumeFactor(i);
+            sum += v * temperatures_[i * count + scenario];
+            weight += v;
+        }
+    }
+    return weight > 0.0 ? sum / weight : 0.0;
+}
+
+void EnsembleSolver::record() {
+    // one pass over the points for every material and scenario
+    const auto count = scenarios_.size();
+    std::array<std::vector<double>, 3> sums;
+    std::array<double, 3> weights{};
+    for (auto& sum : sums) {
+        sum.assign(count, 0.0);
+    }
+    for (size_t i = 0; i < pointCloud_.size(); ++i) {
+        auto m = static_cast<int>(pointCloud_.getMaterial(i));
+        auto v = pointCloud_.getVolumeFactor(i);
+        const double* Ti = temperatures_.data() + i * count;
+        for (size_t s = 0; s < count; ++s) {
+            sums[m][s] += v * Ti[s];
+        }
+        weights[m] += v;
+    }
+    for (int m = 0; m < 3; ++m) {
+        for (size_t s = 0; s < count; ++s) {
+            series_[m].push_back(weights[m] > 0.0 ? sums[m][s] / weights[m] : 0.0);
+        }
+    }
+    times_.push_back(currentTime_);
+}
+
+void EnsembleSolver::setRecordInterval(size_t steps) {
+    recordInterval_ = std::max<size_t>(steps, 1);
+}
+
+const std::vector<double>& EnsembleSolver::getAverageTemperatureSeries(MaterialType material) const {
+    return series_[static_cast<int>(material)];
+}
+
+void EnsembleSolver::setSurfaceHeatTransfer(double convectionCoefficient, double emissivity) {
+    geometry_.setSurfaceHeatTransfer(convectionCoefficient, emissivity);
+}
+
+void EnsembleSolver::setAmbientTemperature(double temperature) {
+    geometry_.setAmbientTemperature(temperature);
+}
+
+double EnsembleSolver::getAmbientTemperature() const {
+    return geometry_.getAmbientTemperature();
+}
+
+void EnsembleSolver::setNumThreads(int numThreads) {
+    geometry_.setNumThreads(numThreads);
+}
+
+int EnsembleSolver::getNumThreads() const {
+    return geometry_.getNumThreads();
+}
@@ -0,0 +1,310 @@
+#include "FrameRecorder.hpp"
+#include <algorithm>
+#include <cstring>
+#include <stdexcept>
+
+namespace {
+
+constexpr char kMagic[8] = {'H', 'E', 'A', 'T', 'F', 'R', 'M', 'S'};
+constexpr uint32_t kFrameFileVersion = 1;
+constexpr uint32_t kByteOrderMark = 0x01020304;
+
+template <class T>
+void writeRaw(std::ofstream& file, const T* values, size_t count) {
+    file.write(reinterpret_cast<const char*>(values), static_cast<std::streamsize>(count * sizeof(T)));
+}
+
+template <class T>
+void readRaw(std::ifstream& file, T* values, size_t count) {
+    file.read(reinterpret_cast<char*>(values), static_cast<std::streamsize>(count * sizeof(T)));
+}
+
+}  // namespace
+
+FrameRecorder::FrameRecorder(const std::string& path, const PointCloud& cloud, size_t queueCapacity,
+                             QueueOverflow overflow)
+    : path_(path), file_(path, std::ios::binary | std::ios::trunc), points_(cloud.size()),
+      precision_(cloud.getPrecision()), overflow_(overflow), writing_(false), closing_(false), stopped_(false), closed_(false), written_(0),
+      dropped_(0), stalls_(0) {
+    if (!file_) {
+        throw std::runtime_error("FrameRecorder: can't open " + path + " for writing");
+    }
+    if (queueCapacity == 0) {
+        throw std::invalid_argument("FrameRecorder: the queue needs room for at least one frame");
+    }
+
+    file_.write(kMagic, sizeof(kMagic));
+    uint32_t header[3] = {kFrameFileVersion, kByteOrderMark, static_cast<uint32_t>(precision_)};
+    writeRaw(file_, header, 3);
+    uint64_t points = points_;
+    writeRaw(file_, &points, 1);
+    writeRaw(file_, cloud.getXs().data(), points_);
+    writeRaw(file_, cloud.getYs().data(), points_);
+    writeRaw(file_, cloud.getZs().data(), points_);
+    std::vector<uint8_t> materials(points_);
+    for (size_t i = 0; i < points_; ++i) {
+        materials[i] = static_cast<uint8_t>(cloud.getMaterial(i));
+    }
+    writeRaw(file_, materials.data(), points_);
+    file_.flush();
+    if (!file_) {
+        throw std::runtime_error("FrameRecorder: writing " + path + " failed");
+    }
+
+    frames_.resize(queueCapacity);
+    for (size_t b = 0; b < queueCapacity; ++b) {
+        if (precision_ == Precision::FLOAT32) {
+            frames_[b].values32.resize(points_);
+        } else {
+            frames_[b].values.resize(points_);
+        }
+        free_.push_back(b);
+    }
+    writer_ = std::thread(&FrameRecorder::writeLoop, this);
+}
+
+FrameRecorder::~FrameRecorder() {
+    try {
+        close();
+    } catch (...) {
+        // a destructor can't report the writer's error; close() explicitly to see it
+    }
+}
+
+bool FrameRecorder::record(const PointCloud& cloud, double time) {
+    if (cloud.size() != points_ || cloud.getPrecision() != precision_) {
+        throw std::invalid_argument("FrameRecorder: the cloud doesn't match the recorded geometry");
+    }
+
+    size_t buffer;
+    {
+        std::unique_lock<std::mutex> lock(mutex_);
+        // a run may outlive its recorder's file; its steps must not fail for that after committing
+        if (closing_) {
+            return false;
+        }
+        rethrow();
+        if (free_.empty()) {
+            if (overflow_ == QueueOverflow::DROP) {
+                ++dropped_;
+                return false;
+            }
+            ++stalls_;
+            bufferFreed_.wait(lock, [this] { return !free_.empty() || error_ || closing_; });
+            if (closing_) {
+                return false;
+            }
+            rethrow();
+        }
+        buffer = free_.front();
+        free_.pop_front();
+    }
+
+    // the copy runs outside the lock, so the writer keeps going meanwhile
+    auto& frame = frames_[buffer];
+    frame.time = time;
+    if (precision_ == Precision::FLOAT32) {
+        std::copy(cloud.getTemperatures32().begin(), cloud.getTemperatures32().end(), frame.values32.begin());
+    } else {
+        std::copy(cloud.getTemperatures().begin(), cloud.getTemperatures().end(), frame.values.begin());
+    }
+
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        queued_.push_back(buffer);
+    }
+    frameQueued_.notify_one();
+    return true;
+}
+
+void FrameRecorder::writeLoop() {
+    std::unique_lock<std::mutex> lock(mutex_);
+    while (true) {
+        frameQueued_.wait(lock, [this] { return !queued_.empty() || closing_; });
+        if (queued_.empty()) {
+            stopped_ = true;  // closing and drained
+            bufferFreed_.notify_all();
+            break;
+        }
+        size_t buffer = queued_.front();
+        queued_.pop_front();
+        writing_ = true;
+        lock.unlock();
+
+        const auto& frame = frames_[buffer];
+        bool failed = false;
+        if (!error_) {
+            writeRaw(file_, &frame.time, 1);
+            if (precision_ == Precision::FLOAT32) {
+                writeRaw(file_, frame.values32.data(), points_);
+            } else {
+                writeRaw(file_, frame.values.data(), points_);
+            }
+            // readers of a live file see whole frames as they land
+            file_.flush();
+            failed = !file_;
+        }
+
+        lock.lock();
+        writing_ = false;
+        if (failed && !error_) {
+            error_ = std::make_exception_ptr(std::runtime_error("FrameRecorder: writing " + path_ + " failed"));
+        } else if (!failed && !error_) {
+            ++written_;
+        }
+        free_.push_back(buffer);
+        bufferFreed_.notify_all();
+    }
+}
+
+void FrameRecorder::flush() {
+    std::unique_lock<std::mutex> lock(mutex_);
+    bufferFreed_.wait(lock, [this] { return (queued_.empty() && !writing_) || stopped_; });
+    rethrow();
+}
+
+void FrameRecorder::close() {
+    {
+        std::unique_lock<std::mutex> lock(mutex_);
+        if (closing_) {
+            // another call is joining the writer, or did already
+            bufferFreed_.wait(lock, [this] { return closed_; });
+            rethrow();
+            return;
+        }
+        closing_ = true;
+    }
+    frameQueued_.notify_one();
+    bufferFreed_.notify_all();  // a record waiting for a buffer gives up
+    writer_.join();
+    file_.close();
+    std::lock_guard<std::mutex> lock(mutex_);
+    closed_ = true;
+    bufferFreed_.notify_all();
+    rethrow();
+}
+
+bool FrameRecorder::isClosed() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return closing_;
+}
+
+void FrameRecorder::rethrow() {
+    if (error_) {
+        std::rethrow_exception(error_);
+    }
+}
+
+size_t FrameRecorder::getWrittenFrames() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return written_;
+}
+
+size_t FrameRecorder::getDroppedFrames() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return dropped_;
+}
+
+size_t FrameRecorder::getStalls() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return stalls_;
+}
+
+FrameReader::FrameReader(const std::string& path)
+    : path_(path), file_(path, std::ios::binary), points_(0), precision_(Precision::FLOAT64), dataStart_(0),
+      frameBytes_(0) {
+    if (!file_) {
+        throw std::runtime_error("FrameReader: can't open " + path);
+    }
+    char magic[sizeof(kMagic)];
+    uint32_t header[3] = {0, 0, 0};
+    uint64_t points = 0;
+    file_.read(magic, sizeof(magic));
+    readRaw(file_, header, 3);
+    readRaw(file_, &points, 1);
+    if (!file_ || std::memcmp(magic, kMagic, sizeof(magic)) != 0) {
+        throw std::runtime_error("FrameReader: " + path + " is not a frame file");
+    }
+    if (header[0] == 0 || header[0] > kFrameFileVersion) {
+        throw std::runtime_error("FrameReader: " + path + " has format version " + std::to_string(header[0]) +
+                                 ", newer than this build reads");
+    }
+    if (header[1] != kByteOrderMark) {
+        throw std::runtime_error("FrameReader: " + path + " was written on a machine with the other byte order");
+    }
+    if (header[2] > static_cast<uint32_t>(Precision::FLOAT32)) {
+        throw std::runtime_error("FrameReader: " + path + " has an unknown precision");
+    }
+
+    // the geometry can't be larger than the file, checked before allocating for it
+    file_.seekg(0, std::ios::end);
+    uint64_t size = static_cast<uint64_t>(file_.tellg());
+    uint64_t geometryStart = sizeof(kMagic) + sizeof(header) + sizeof(points);
+    if (points > (size - geometryStart) / (3 * sizeof(double) + 1)) {
+        throw std::runtime_error("FrameReader: " + path + " ends inside its geometry");
+    }
+    file_.seekg(static_cast<std::streamoff>(geometryStart));
+
+    points_ = points;
+    precision_ = static_cast<Precision>(header[2]);
+    x_.resize(points_);
+    y_.resize(points_);
+    z_.resize(points_);
+    readRaw(file_, x_.data(), points_);
+    readRaw(file_, y_.data(), points_);
+    readRaw(file_, z_.data(), points_);
+    std::vector<uint8_t> materials(points_);
+    readRaw(file_, materials.data(), points_);
+    materials_.resize(points_);
+    for (size_t i = 0; i < points_; ++i) {
+        if (materials[i] > static_cast<uint8_t>(MaterialType::AIR)) {
+            throw std::runtime_error("FrameReader: " + path + " has an unknown material");
+        }
+        materials_[i] = static_cast<MaterialType>(materials[i]);
+    }
+    dataStart_ = geometryStart + points_ * (3 * sizeof(double) + 1);
+    frameBytes_ = sizeof(double) + points_ * (precision_ == Precision::FLOAT32 ? sizeof(float) : sizeof(double));
+}
+
+size_t FrameReader::getFrameCount() {
+    // the writer may have appended since the last call
+    file_.clear();
+    file_.seekg(0, std::ios::end);
+    uint64_t size = static_cast<uint64_t>(file_.tellg());
+    return size < dataStart_ ? 0 : static_cast<size_t>((size - dataStart_) / frameBytes_);
+}
+
+void FrameReader::seekFrame(size_t frame) {
+    if (frame >= getFrameCount()) {
+        throw std::out_of_range("FrameReader: frame " + std::to_string(frame) + " is not in " + path_);
+    }
+    file_.seekg(static_cast<std::streamoff>(dataStart_ + frame * frameBytes_));
+}
+
+double FrameReader::getTime(size_t frame) {
+    seekFrame(frame);
+    double time = 0.0;
+    readRaw(file_, &time, 1);
+    return time;
+}
+
+void FrameReader::readTemperatures(size_t frame, double* out) {
+    seekFrame(frame);
+    file_.seekg(sizeof(double), std::ios::cur);
+    if (precision_ == Precision::FLOAT32) {
+        scratch32_.resize(points_);
+        readRaw(file_, scratch32_.data(), points_);
+        std::copy(scratch32_.begin(), scratch32_.end(), out);
+    } else {
+        readRaw(file_, out, points_);
+    }
+    if (!file_) {
+        throw std::runtime_error("FrameReader: reading frame " + std::to_string(frame) + " of " + path_ + " failed");
+    }
+}
+
+std::vector<double> FrameReader::getTemperatures(size_t frame) {
+    std::vector<double> values(points_);
+    readTemperatures(frame, values.data());
+    return values;
+}
@@ -1,14 +1,49 @@
 #include "HeatSolver.hpp"
+#include "CellList.hpp"
+#include "Checkpoint.hpp"
+#include "Log.hpp"
 #include <algorithm>
-#include <iostream>
 #include <cmath>
+#include <limits>
+#include <stdexcept>
 
+#ifdef WITH_OPENMP
+#include <omp.h>
+#endif
 
-HeatSolver::HeatSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep)
-    : pointCloud_(pointCloud), materials_(materials), timeStep_(timeStep), currentTime_(0.0) {
+namespace {
+
+// every point stands for the same small parcel of material
+constexpr double kContactArea = 1e-6;  // 1mm² contact area
+constexpr double kPointVolume = 1e-9;  // 1mm³ volume per point
+
+// deterministic reductions sum fixed size blocks and then add the block sums in order,
+// so the rounding doesn't depend on how many threads split the loop
+constexpr size_t kReductionBlock = 4096;
+
+// adaptive runs stay this fraction under the explicit stability limit
+constexpr double kStabilitySafety = 0.9;
+// rejected adaptive steps never shrink below this
+constexpr double kMinAdaptiveStep = 1e-9;
+
+constexpr double kStefanBoltzmann = 5.670374419e-8;  // W/(m^2 K^4)
+
+}  // namespace
+
+HeatSolver::HeatSolver(PointCloud& pointCloud, const std::vector<Material>& materials, double timeStep,
+                       Integrator integrator)
+    : pointCloud_(pointCloud), materials_(materials), timeStep_(timeStep), currentTime_(0.0),
+      neighborRadius_(0.01), numThreads_(0), deterministic_(false),
+      integrator_(integrator), implicitGeneration_(0), implicitTimeStep_(0.0), implicitTheta_(0.0),
+      solverTolerance_(1e-10), maxSolverIterations_(1000), lastSolverIterations_(0), lastSolverError_(0.0),
+      adaptive_(false), maxTemperatureChange_(0.5), maxTimeStep_(std::numeric_limits<double>::infinity()),
+      adaptiveTimeStep_(0.0), stabilityChecked_(false), progressInterval_(1.0), backend_(Backend::AUTO),
+      activeSetStepping_(false), activeCount_(0), convectionCoefficient_(10.0), emissivity_(0.9),
+      ambientTemperature_(0.0), ambientOverride_(false), recorder_(nullptr), recordInterval_(1),
+      stepsSinceRecord_(0), temperatureRevision_(0), control_(nullptr) {
         // Verify material properties
         if (materials_.size() < 3) {
-            std::cerr << "ERROR: Not enough materials provided. Expected at least 3." << std::endl;
+            HEAT_LOG(LogLevel::ERROR, "Not enough materials provided. Expected at least 3.");
             return;
         }
         
@@ -16,19 +51,22 @@ HeatSolver::HeatSolver(PointCloud& pointCloud, const std::vector<Material>& mate
         for (size_t i = 0; i < materials_.size(); i++) {
             double k = materials_[i].getThermalConductivity();
             if (k < 0.001) {
-                std::cerr << "WARNING: Material " << i << " has very low thermal conductivity: " 
-                        << k << std::endl;
+                HEAT_LOG(LogLevel::WARNING, "Material " << i << " has very low thermal conductivity: " << k);
             } else {
-                std::cout << "Material " << i << " thermal conductivity: " << k << std::endl;
+                HEAT_LOG(LogLevel::DEBUG, "Material " << i << " thermal conductivity: " << k);
             }
         }
     }
 
 
 double HeatSolver::calculate_K(MaterialType mat1, MaterialType mat2) {
+    return calculate_K(materials_, mat1, mat2);
+}
+
+double HeatSolver::calculate_K(const std::vector<Material>& materials, MaterialType mat1, MaterialType mat2) {
     // Access thermal conductivity from materials vector using MaterialType as index
-    double k1 = materials_[static_cast<int>(mat1)].getThermalConductivity();
-    double k2 = materials_[static_cast<int>(mat2)].getThermalConductivity();
+    double k1 = materials[static_cast<int>(mat1)].getThermalConductivity();
+    double k2 = materials[static_cast<int>(mat2)].getThermalConductivity();
     
     if (mat1 == mat2) {
         return k1;  // same material
@@ -42,12 +80,119 @@ double HeatSolver::calculate_K(MaterialType mat1, MaterialType mat2) {
     Array of Structures, where you reference a single point, this is really an interface with the Structure of Arrays
     architecture in PointCloud. In the future I will change this to fully utilize the switch but for now this works
 
-    I also want to change the way neighbors are calculated. Its currently n^2, with kd tree it can be nlogn, but with 
-    this particular grid setup I think something O(1) is possible. But for future scaling with imperfect spacing then its
-    better to use kd tree.
+    Neighbors are no longer found with an n^2 scan every step. The first step (or the first step after the cloud
+    changes) buckets the points into a uniform cell list with 1 cm cells and stores, for every point, the indices
+    of all points within the cutoff. Each step then only walks those lists, so its cost is linear in point count.
+
+    On top of the neighbor lists the solver assembles a ConductanceOperator (CSR rows of precomputed pair weights),
+    so the distances, harmonic means and contact areas are computed once per geometry instead of once per step.
+    The operator is rebuilt whenever the cloud's revision or the material table changes.
+
+    Clouds that are a complete box lattice (everything CupGenerator makes) skip both: explicit steps run on a
+    StructuredGrid, where a neighbor is a fixed index offset away and each stencil offset is a unit stride sweep.
+
+    With active set stepping on, explicit steps stay on the operator and only walk the rows of an ActiveSet, so
+    air that heat hasn't reached yet costs nothing per step.
 
 */
 
+void HeatSolver::ensureNeighbors() {
+    if (pointCloud_.hasNeighborLists() && pointCloud_.getNeighborRadius() == neighborRadius_) {
+        return;
+    }
+
+    CellList cells(pointCloud_, neighborRadius_);
+    cells.buildNeighbors(pointCloud_, neighborRadius_);
+}
+
+ConductanceTable HeatSolver::conductanceTable() {
+    return conductanceTable(materials_);
+}
+
+ConductanceTable HeatSolver::conductanceTable(const std::vector<Material>& materials) {
+    ConductanceTable table;
+    for (int a = 0; a < 3; ++a) {
+        for (int b = 0; b < 3; ++b) {
+            table[a][b] = calculate_K(materials, static_cast<MaterialType>(a), static_cast<MaterialType>(b));
+        }
+    }
+    return table;
+}
+
+void HeatSolver::ensureOperator() {
+    ensureNeighbors();
+    if (conductance_.isCurrent(pointCloud_)) {
+        return;
+    }
+    conductance_.assemble(pointCloud_, materials_, conductanceTable(), kContactArea, kPointVolume, threadCount(),
+                          SurfaceExchange{getSurfaceHeatTransferCoefficient(), getAmbientTemperature()});
+}
+
+bool HeatSolver::ensureStructuredGrid() {
+    // the implicit modes solve with the assembled matrix, so only explicit steps can run matrix free, and
+    // active set steps need the operator rows
+    if (backend_ == Backend::POINT_CLOUD || integrator_ != Integrator::EXPLICIT_EULER ||
+        (activeSetStepping_ && backend_ == Backend::AUTO)) {
+        return false;
+    }
+    if (!structuredGrid_.isCurrent(pointCloud_)) {
+        structuredGrid_.build(pointCloud_, materials_, conductanceTable(), kContactArea, kPointVolume,
+                              neighborRadius_,
+                              SurfaceExchange{getSurfaceHeatTransferCoefficient(), getAmbientTemperature()},
+                              threadCount());
+        if (structuredGrid_.isLattice()) {
+            HEAT_LOG(LogLevel::DEBUG, "lattice detected, stepping with a " << structuredGrid_.getStencilSize()
+                                      << " neighbor stencil");
+        }
+    }
+    if (!structuredGrid_.isLattice() && backend_ == Backend::STRUCTURED_GRID) {
+        throw std::invalid_argument("HeatSolver: the structured grid backend needs a complete, uniformly spaced "
+                                    "box lattice");
+    }
+    return structuredGrid_.isLattice();
+}
+
+double HeatSolver::currentStableTimeStep() {
+    if (ensureStructuredGrid()) {
+        return structuredGrid_.getStableTimeStep();
+    }
+    ensureOperator();
+    return conductance_.getStableTimeStep();
+}
+
+void HeatSolver::setBackend(Backend backend) {
+    backend_ = backend;
+}
+
+Backend HeatSolver::getBackend() const {
+    return backend_;
+}
+
+bool HeatSolver::usesStructuredGrid() {
+    return ensureStructuredGrid();
+}
+
+const StructuredGrid& HeatSolver::getStructuredGrid() {
+    ensureStructuredGrid();
+    return structuredGrid_;
+}
+
+void HeatSolver::setMaterials(const std::vector<Material>& materials) {
+    materials_ = materials;
+    // the ambient may come from the air material
+    conductance_.invalidate();
+    structuredGrid_.invalidate();
+}
+
+const std::vector<Material>& HeatSolver::getMaterials() const {
+    return materials_;
+}
+
+const ConductanceOperator& HeatSolver::getConductanceOperator() {
+    ensureOperator();
+    return conductance_;
+}
+
 void HeatSolver::step() {
 
     /*
@@ -69,89 +214,416 @@ void HeatSolver::step() {
     then set newTemperatures[i]
 
     */
+
+    computeStep(timeStep_);
+    pointCloud_.swapTemperatures();
     
-    std::cout << "Materials vector size: " << materials_.size() << std::endl;
-    for (size_t i = 0; i < materials_.size(); i++) {
-        std::cout << "Material " << i << " thermal conductivity: " 
-                  << materials_[i].getThermalConductivity() << std::endl;
+    currentTime_ += timeStep_;
+    activeCounts_.push_back(activeCount_);
+    stepCommitted();
+    
+    HEAT_LOG(LogLevel::TRACE, "Step completed, time: " << currentTime_);
+}
+
+void HeatSolver::computeStep(double dt) {
+    bool grid = ensureStructuredGrid();
+    if (!grid) {
+        ensureOperator();
+    }
+
+    if (!stabilityChecked_ && integrator_ == Integrator::EXPLICIT_EULER && !adaptive_) {
+        stabilityChecked_ = true;
+        double limit = currentStableTimeStep();
+        if (dt > limit) {
+            HEAT_LOG(LogLevel::WARNING, "time step " << dt << " s exceeds the explicit stability limit of "
+                                        << limit << " s, the run will diverge");
+        }
+    }
+
+    bool single = pointCloud_.getPrecision() == Precision::FLOAT32;
+    bool active = activeSetStepping_ && !grid && integrator_ == Integrator::EXPLICIT_EULER;
+    if (!active) {
+        // every point moves, so the set has to be rebuilt from scratch if active steps resume
+        activeSet_.reset();
+        activeCount_ = pointCloud_.size();
+    }
+    // an idle row is never recomputed, so temperatures edited since the last step (or a writable view that may
+    // have edited them) send the set back to computing every row
+    if (pointCloud_.getTemperatureRevision() != temperatureRevision_ || pointCloud_.hasTemperatureWriters()) {
+        temperatureRevision_ = pointCloud_.getTemperatureRevision();
+        activeSet_.reset();
+    }
+
+    if (active) {
+        if (single) {
+            activeStep(pointCloud_.getTemperatures32(), pointCloud_.getNextTemperatures32(), dt);
+        } else {
+            activeStep(pointCloud_.getTemperatures(), pointCloud_.getNextTemperatures(), dt);
+        }
+    } else if (grid) {
+        // lattice input: fixed stencil over the dense arrays, no neighbor lists or stored weights
+        if (single) {
+            structuredGrid_.apply(pointCloud_.getTemperatures32().data(),
+                                  pointCloud_.getNextTemperatures32().data(), dt, threadCount());
+        } else {
+            structuredGrid_.apply(pointCloud_.getTemperatures().data(), pointCloud_.getNextTemperatures().data(),
+                                  dt, threadCount());
+        }
+    } else if (integrator_ == Integrator::EXPLICIT_EULER) {
+        // every pair's k_eff * A / (d * rho * c * V) is precomputed, so the step is one sparse pass
+        // (rows are independent, so the result doesn't depend on the thread count)
+        if (single) {
+            conductance_.apply(pointCloud_.getTemperatures32().data(), pointCloud_.getNextTemperatures32().data(),
+                               dt, threadCount());
+        } else {
+            conductance_.apply(pointCloud_.getTemperatures().data(), pointCloud_.getNextTemperatures().data(),
+                               dt, threadCount());
+        }
+    } else if (single) {
+        // CG runs in double either way; widen the committed temperatures and round the solution back
+        const auto& temps = pointCloud_.getTemperatures32();
+        implicitInput_.assign(temps.begin(), temps.end());
+        implicitOutput_.resize(temps.size());
+        implicitStep(dt, implicitInput_, implicitOutput_);
+        auto& next = pointCloud_.getNextTemperatures32();
+        std::copy(implicitOutput_.begin(), implicitOutput_.end(), next.begin());
+    } else {
+        implicitStep(dt, pointCloud_.getTemperatures(), pointCloud_.getNextTemperatures());
     }
+}
 
-    std::vector<double> newTemperatures(pointCloud_.size());
+template <class Real>
+void HeatSolver::activeStep(const std::vector<Real>& temps, std::vector<Real>& next, double dt) {
+    activeSet_.step(conductance_, temps.data(), next.data(), dt, threadCount());
+    activeCount_ = activeSet_.size();
+    HEAT_LOG(LogLevel::TRACE, "active set " << activeCount_ << " of " << temps.size() << " points");
+}
 
-    for (size_t i = 0; i < pointCloud_.size(); ++i) {
+template <class Real>
+double HeatSolver::maxTemperatureChange(const std::vector<Real>& temps, const std::vector<Real>& next) const {
+    double change = 0.0;
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) reduction(max:change) num_threads(threadCount())
+#endif
+    for (std::ptrdiff_t i = 0; i < static_cast<std::ptrdiff_t>(temps.size()); ++i) {
+        change = std::max(change, static_cast<double>(std::abs(next[i] - temps[i])));
+    }
+    return change;
+}
 
-        auto focal_point = pointCloud_.getPoint(i);
+double HeatSolver::maxTemperatureChange() {
+    if (pointCloud_.getPrecision() == Precision::FLOAT32) {
+        return maxTemperatureChange(pointCloud_.getTemperatures32(), pointCloud_.getNextTemperatures32());
+    }
+    return maxTemperatureChange(pointCloud_.getTemperatures(), pointCloud_.getNextTemperatures());
+}
 
-        //std::cout << focal_point.getIndex() << std::endl;
-        
-        double currentTemp = focal_point.getTemperature();
+/*
+    Implicit modes. Multiplying dT/dt = L T through by the point heat capacities C gives C dT/dt = (G - D) T, where
+    G_ij = k_eff * A / d is symmetric and D is its row sum, so the theta-scheme system
 
-        //std::cout << currentTemp << std::endl;
+        (C + theta*dt*(D - G)) T' = C T + (1 - theta)*dt*(G - D) T
 
-        double totalHeatTransfer = 0.0;
-        
-        // brute force neighbor search, WILL BE IMPROVED LATER
-        for (size_t j = 0; j < pointCloud_.size(); ++j) {
-            if (i == j) continue;
-            
-            auto neighbor = pointCloud_.getPoint(j);
-            Position currentPos = focal_point.getPosition();
-            Position neighborPos = neighbor.getPosition();
-            
-            // CALCULATE DISTANCE
-            double dx = neighborPos.x - currentPos.x;
-            double dy = neighborPos.y - currentPos.y;
-            double dz = neighborPos.z - currentPos.z;
-            double distance = std::sqrt(dx*dx + dy*dy + dz*dz);
-            
-            if (distance > 0.01) continue; // 1cm cutoff
-            
-            // Calculate heat transfer rate between the two points
-            double tempDiff = neighbor.getTemperature() - currentTemp;
-            double k_eff = calculate_K(focal_point.getMaterial(), 
-                                      neighbor.getMaterial());
-                                      
-            // Simple heat transfer: Q = k * A * dT/dx
-            // using constant area and volume
-            double area = 1e-6; // 1mm² contact area
-            double heatTransferRate = k_eff * area * tempDiff / distance;
-            totalHeatTransfer += heatTransferRate;
-
-            std::cout << "Distance: " << distance << " k_eff: " << k_eff << "tempDiff:" << tempDiff <<std::endl;
-
-        }
-        // temperature change: dT = Q * dt / (rho * c * V)
-        MaterialType material = focal_point.getMaterial();
-        const Material& mat = materials_[static_cast<int>(material)];
-        double rho = mat.getDensity();
-        double c = mat.getSpecificHeat();
-        double V = 1e-9; // 1mm³ volume per point
-
-        double tempChange = totalHeatTransfer * timeStep_ / (rho * c * V);
-        //std::cout << "Point " << i << " temp change: " << tempChange << "K" << std::endl;
-
-        newTemperatures[i] = currentTemp + tempChange;
-                
+    is symmetric positive definite for any dt. theta = 1 is backward Euler, theta = 1/2 is Crank-Nicolson.
+    The matrix is assembled once per operator and step size, and each step runs conjugate gradient warm
+    started from the current temperatures. The surface loss of exposed points, C g (T_amb - T), splits the same
+    way: theta*dt*C*g joins the diagonal and dt*C*g*T_amb ends up on the right hand side.
+*/
+
+void HeatSolver::ensureImplicitSystem(double dt, double theta) {
+    if (implicitGeneration_ == conductance_.getGeneration() && implicitTimeStep_ == dt &&
+        implicitTheta_ == theta) {
+        return;
     }
-    
-    // Apply all temperature changes at once
-    for (size_t i = 0; i < pointCloud_.size(); ++i) {
 
-        auto point = pointCloud_.getPoint(i);
-        point.setTemperature(newTemperatures[i]);
+    const auto n = conductance_.rows();
+    const auto& rowPtr = conductance_.getRowPointers();
+    const auto& cols = conductance_.getColumnIndices();
+    const auto& weights = conductance_.getWeights();
+    const auto& capacities = conductance_.getCapacities();
+    const auto& sinks = conductance_.getSinks();
+
+    std::vector<Eigen::Triplet<double>> triplets;
+    triplets.reserve(conductance_.nonZeros() + n);
+    for (size_t i = 0; i < n; ++i) {
+        double diagonal = capacities[i];
+        for (auto k = rowPtr[i]; k < rowPtr[i + 1]; ++k) {
+            double g = weights[k] * capacities[i];
+            diagonal += theta * dt * g;
+            triplets.emplace_back(static_cast<int>(i), cols[k], -theta * dt * g);
+        }
+        if (!sinks.empty()) {
+            diagonal += theta * dt * sinks[i] * capacities[i];
+        }
+        triplets.emplace_back(static_cast<int>(i), static_cast<int>(i), diagonal);
     }
-    
-    currentTime_ += timeStep_;
-    
-    std::cout << "Step completed, time: " << currentTime_ << std::endl;
+
+    implicitMatrix_.resize(static_cast<Eigen::Index>(n), static_cast<Eigen::Index>(n));
+    implicitMatrix_.setFromTriplets(triplets.begin(), triplets.end());
+    conjugateGradient_.compute(implicitMatrix_);
+
+    implicitGeneration_ = conductance_.getGeneration();
+    implicitTimeStep_ = dt;
+    implicitTheta_ = theta;
+}
+
+void HeatSolver::implicitStep(double dt, const std::vector<double>& temps, std::vector<double>& newTemperatures) {
+    double theta = (integrator_ == Integrator::BACKWARD_EULER) ? 1.0 : 0.5;
+    ensureImplicitSystem(dt, theta);
+
+    const auto& capacities = conductance_.getCapacities();
+    const auto n = static_cast<Eigen::Index>(temps.size());
+
+    // explicit half of the scheme (a plain copy of T for backward Euler), scaled by C
+    conductance_.apply(temps.data(), newTemperatures.data(), (1.0 - theta) * dt, threadCount());
+    Eigen::VectorXd rhs(n);
+    for (Eigen::Index i = 0; i < n; ++i) {
+        rhs[i] = capacities[i] * newTemperatures[i];
+    }
+    // the implicit half of the surface loss toward the ambient
+    const auto& sinks = conductance_.getSinks();
+    if (!sinks.empty()) {
+        double ambient = conductance_.getAmbientTemperature();
+        for (Eigen::Index i = 0; i < n; ++i) {
+            rhs[i] += theta * dt * capacities[i] * sinks[i] * ambient;
+        }
+    }
+
+    Eigen::setNbThreads(threadCount());
+    conjugateGradient_.setTolerance(solverTolerance_);
+    conjugateGradient_.setMaxIterations(maxSolverIterations_);
+
+    Eigen::Map<const Eigen::VectorXd> guess(temps.data(), n);
+    Eigen::Map<Eigen::VectorXd> solution(newTemperatures.data(), n);
+    solution = conjugateGradient_.solveWithGuess(rhs, guess);
+
+    lastSolverIterations_ = static_cast<int>(conjugateGradient_.iterations());
+    lastSolverError_ = conjugateGradient_.error();
+    if (conjugateGradient_.info() != Eigen::Success) {
+        HEAT_LOG(LogLevel::WARNING, "implicit solve did not converge after " << lastSolverIterations_
+                                    << " iterations (relative residual " << lastSolverError_ << ")");
+    }
+}
+
+Integrator HeatSolver::getIntegrator() const {
+    return integrator_;
+}
+
+void HeatSolver::setIntegrator(Integrator integrator) {
+    integrator_ = integrator;
+}
+
+void HeatSolver::setSolverTolerance(double tolerance) {
+    solverTolerance_ = tolerance;
+}
+
+void HeatSolver::setMaxSolverIterations(int iterations) {
+    maxSolverIterations_ = iterations;
+}
+
+int HeatSolver::getLastSolverIterations() const {
+    return lastSolverIterations_;
+}
+
+double HeatSolver::getLastSolverError() const {
+    return lastSolverError_;
 }
 
 void HeatSolver::run_for_time(double duration) {
     double endTime = currentTime_ + duration;
+    activeCounts_.clear();
+    
+    if (adaptive_) {
+        runAdaptive(endTime);
+        return;
+    }
     
-    while (currentTime_ < endTime) {
+    ProgressReporter progress(progressInterval_);
+    while (currentTime_ < endTime && !stopRequested()) {
         step();
+        reportProgress(progress, endTime);
+    }
+}
+
+bool HeatSolver::run_for_time(double duration, RunControl& control) {
+    double endTime = currentTime_ + duration;
+    control.time.store(currentTime_);
+    control_ = &control;
+    try {
+        run_for_time(duration);
+    } catch (...) {
+        control_ = nullptr;
+        throw;
+    }
+    control_ = nullptr;
+    return currentTime_ >= endTime;
+}
+
+void HeatSolver::reportProgress(ProgressReporter& progress, double endTime) const {
+    // the statistics cost a pass over the cloud, so only gather them when the message will be written
+    if (!Log::enabled(LogLevel::INFO) || !progress.due()) {
+        return;
+    }
+    HEAT_LOG(LogLevel::INFO, "t = " << currentTime_ << " / " << endTime << " s, coffee "
+                             << getAverageTemperature(MaterialType::COFFEE) << " K, cup "
+                             << getAverageTemperature(MaterialType::CUP_MATERIAL) << " K, "
+                             << activeCount_ << " of " << pointCloud_.size() << " points active");
+}
+
+void HeatSolver::setFrameRecorder(FrameRecorder* recorder, size_t interval) {
+    recorder_ = recorder;
+    recordInterval_ = std::max<size_t>(1, interval);
+    stepsSinceRecord_ = 0;
+}
+
+void HeatSolver::stepCommitted() {
+    if (recorder_ && ++stepsSinceRecord_ >= recordInterval_) {
+        stepsSinceRecord_ = 0;
+        recorder_->record(pointCloud_, currentTime_);
+    }
+    if (control_) {
+        control_->time.store(currentTime_);
+        control_->steps.fetch_add(1);
+        if (control_->onStep) {
+            control_->onStep();
+        }
+    }
+}
+
+void HeatSolver::setProgressInterval(double seconds) {
+    progressInterval_ = seconds;
+}
+
+void HeatSolver::setActiveSetStepping(bool enabled, double tolerance) {
+    activeSetStepping_ = enabled;
+    activeSet_.setTolerance(tolerance);
+    activeSet_.reset();
+}
+
+bool HeatSolver::isActiveSetStepping() const {
+    return activeSetStepping_;
+}
+
+void HeatSolver::resetActiveSet() {
+    activeSet_.reset();
+}
+
+size_t HeatSolver::getActiveCount() const {
+    return activeCount_;
+}
+
+const std::vector<size_t>& HeatSolver::getActiveCounts() const {
+    return activeCounts_;
+}
+
+void HeatSolver::setSurfaceHeatTransfer(double convectionCoefficient, double emissivity) {
+    convectionCoefficient_ = convectionCoefficient;
+    emissivity_ = emissivity;
+    conductance_.invalidate();
+    structuredGrid_.invalidate();
+}
+
+double HeatSolver::getSurfaceHeatTransferCoefficient() const {
+    double ambient = getAmbientTemperature();
+    return convectionCoefficient_ + 4.0 * emissivity_ * kStefanBoltzmann * ambient * ambient * ambient;
+}
+
+void HeatSolver::setAmbientTemperature(double temperature) {
+    ambientTemperature_ = temperature;
+    ambientOverride_ = true;
+    conductance_.invalidate();
+    structuredGrid_.invalidate();
+}
+
+double HeatSolver::getAmbientTemperature() const {
+    if (ambientOverride_ || materials_.size() < 3) {
+        return ambientTemperature_;
     }
+    return materials_[static_cast<int>(MaterialType::AIR)].getAmbientTemperature();
+}
+
+/*
+    Adaptive stepping. The explicit scheme is stable while dt * max_i sum_j w_ij <= 1 (Gershgorin bound on the
+    operator's spectrum), and sum_j w_ij only depends on the material diffusivities and neighbor distances, so the
+    limit is known as soon as the operator is assembled. Within that limit (no limit for the implicit modes) the
+    step is sized so the largest temperature change per step stays near maxTemperatureChange_: steep early
+    gradients get small steps and the step grows, at most doubling each time, as the gradients decay. A step that
+    overshoots the target by more than 2x is thrown away and retried smaller. The last step is trimmed so the run
+    ends exactly on the requested time.
+*/
+
+void HeatSolver::runAdaptive(double endTime) {
+    stepSizes_.clear();
+
+    ProgressReporter progress(progressInterval_);
+    if (adaptiveTimeStep_ <= 0.0) {
+        adaptiveTimeStep_ = timeStep_;
+    }
+
+    while (currentTime_ < endTime && !stopRequested()) {
+        double limit = maxTimeStep_;
+        if (integrator_ == Integrator::EXPLICIT_EULER) {
+            limit = std::min(limit, kStabilitySafety * currentStableTimeStep());
+        }
+        double dt = std::min(adaptiveTimeStep_, limit);
+
+        bool lastStep = currentTime_ + dt >= endTime;
+        double taken = lastStep ? endTime - currentTime_ : dt;
+
+        // a rejected step just leaves its result in the back buffer, the committed temperatures are untouched
+        computeStep(taken);
+        double change = maxTemperatureChange();
+
+        if (change > 2.0 * maxTemperatureChange_ && taken > kMinAdaptiveStep) {
+            adaptiveTimeStep_ = std::max(kMinAdaptiveStep, taken * 0.5 * maxTemperatureChange_ / change);
+            // the active set already moved on to the rejected result
+            activeSet_.reset();
+            continue;
+        }
+
+        pointCloud_.swapTemperatures();
+        currentTime_ = lastStep ? endTime : currentTime_ + taken;
+        stepSizes_.push_back(taken);
+        activeCounts_.push_back(activeCount_);
+        stepCommitted();
+        HEAT_LOG(LogLevel::TRACE, "adaptive step " << taken << " s, max change " << change << " K");
+        reportProgress(progress, endTime);
+
+        // a trimmed final step says nothing about the size the next run should start with
+        if (!lastStep) {
+            double growth = change > 0.0 ? maxTemperatureChange_ / change : 2.0;
+            adaptiveTimeStep_ = dt * std::clamp(growth, 0.5, 2.0);
+        }
+    }
+}
+
+void HeatSolver::setAdaptiveTimeStep(bool enabled, double maxTemperatureChange) {
+    adaptive_ = enabled;
+    maxTemperatureChange_ = maxTemperatureChange;
+}
+
+bool HeatSolver::isAdaptiveTimeStep() const {
+    return adaptive_;
+}
+
+void HeatSolver::setMaxTimeStep(double maxTimeStep) {
+    maxTimeStep_ = maxTimeStep;
+}
+
+double HeatSolver::getStableTimeStep() {
+    return currentStableTimeStep();
+}
+
+double HeatSolver::getTimeStep() const {
+    return timeStep_;
+}
+
+const std::vector<double>& HeatSolver::getStepSizes() const {
+    return stepSizes_;
+}
+
+double HeatSolver::getNeighborRadius() const {
+    return neighborRadius_;
 }
 
 double HeatSolver::getCurrentTime() const {
@@ -159,34 +631,310 @@ double HeatSolver::getCurrentTime() const {
 }
 
 double HeatSolver::getAverageTemperature(MaterialType material) const {
+    if (pointCloud_.getPrecision() == Precision::FLOAT32) {
+        return averageTemperature(pointCloud_.getTemperatures32(), material);
+    }
+    return averageTemperature(pointCloud_.getTemperatures(), material);
+}
+
+// sums are accumulated in double for either storage precision
+template <class Real>
+double HeatSolver::averageTemperature(const std::vector<Real>& temps, MaterialType material) const {
+    const auto n = pointCloud_.size();
+    // scaled points and rings stand for more than one reference volume, so the average is volume weighted
+    const double* scales = pointCloud_.hasPointScales() ? pointCloud_.getPointScales().data() : nullptr;
+    const bool rings = pointCloud_.isAxisymmetric();
+    auto volume = [this, scales, rings](size_t i) {
+        if (rings) return pointCloud_.getVolumeFactor(i);
+        return scales ? scales[i] * scales[i] * scales[i] : 1.0;
+    };
     double sum = 0.0;
-    size_t count = 0;
+    double weight = 0.0;
     
-    for (size_t i = 0; i < pointCloud_.size(); ++i) {
-        const auto point = pointCloud_.getPoint(i);
-        if (point.getMaterial() == material) {
-            sum += point.getTemperature();
-            count++;
+    if (deterministic_) {
+        auto blocks = (n + kReductionBlock - 1) / kReductionBlock;
+        std::vector<double> blockSums(blocks, 0.0);
+        std::vector<double> blockWeights(blocks, 0.0);
+#ifdef WITH_OPENMP
+        #pragma omp parallel for schedule(static) num_threads(threadCount())
+#endif
+        for (std::ptrdiff_t b = 0; b < static_cast<std::ptrdiff_t>(blocks); ++b) {
+            auto end = std::min(n, (b + 1) * kReductionBlock);
+            for (auto i = b * kReductionBlock; i < end; ++i) {
+                if (pointCloud_.getMaterial(i) == material) {
+                    auto v = volume(i);
+                    blockSums[b] += v * temps[i];
+                    blockWeights[b] += v;
+                }
+            }
+        }
+        for (size_t b = 0; b < blocks; ++b) {
+            sum += blockSums[b];
+            weight += blockWeights[b];
+        }
+    } else {
+#ifdef WITH_OPENMP
+        #pragma omp parallel for schedule(static) reduction(+:sum, weight) num_threads(threadCount())
+#endif
+        for (std::ptrdiff_t i = 0; i < static_cast<std::ptrdiff_t>(n); ++i) {
+            if (pointCloud_.getMaterial(i) == material) {
+                auto v = volume(i);
+                sum += v * temps[i];
+                weight += v;
+            }
         }
     }
     
-    return count > 0 ? sum / count : 0.0;
+    return weight > 0.0 ? sum / weight : 0.0;
 }
 
+// max and min are exact whatever the order, so they need no deterministic variant
 double HeatSolver::getMaxTemperature() const {
-    double maxTemp = 0.0;
-    for (size_t i = 0; i < pointCloud_.size(); ++i) {
-        maxTemp = std::max(maxTemp, pointCloud_.getPoint(i).getTemperature());
+    if (pointCloud_.getPrecision() == Precision::FLOAT32) {
+        return maxTemperature(pointCloud_.getTemperatures32());
     }
-    return maxTemp;
+    return maxTemperature(pointCloud_.getTemperatures());
 }
 
 double HeatSolver::getMinTemperature() const {
     if (pointCloud_.size() == 0) return 0.0;
-    
-    auto minTemp = double{pointCloud_.getPoint(0).getTemperature()};
-    for (auto i = size_t{1}; i < pointCloud_.size(); ++i) {
-        minTemp = std::min(minTemp, pointCloud_.getPoint(i).getTemperature());
+    if (pointCloud_.getPrecision() == Precision::FLOAT32) {
+        return minTemperature(pointCloud_.getTemperatures32());
+    }
+    return minTemperature(pointCloud_.getTemperatures());
+}
+
+template <class Real>
+double HeatSolver::maxTemperature(const std::vector<Real>& temps) const {
+    double maxTemp = 0.0;
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) reduction(max:maxTemp) num_threads(threadCount())
+#endif
+    for (std::ptrdiff_t i = 0; i < static_cast<std::ptrdiff_t>(temps.size()); ++i) {
+        maxTemp = std::max(maxTemp, static_cast<double>(temps[i]));
+    }
+    return maxTemp;
+}
+
+template <class Real>
+double HeatSolver::minTemperature(const std::vector<Real>& temps) const {
+    auto minTemp = double{temps[0]};
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) reduction(min:minTemp) num_threads(threadCount())
+#endif
+    for (std::ptrdiff_t i = 1; i < static_cast<std::ptrdiff_t>(temps.size()); ++i) {
+        minTemp = std::min(minTemp, static_cast<double>(temps[i]));
     }
     return minTemp;
-}
\ No newline at end of file
+}
+
+void HeatSolver::setNumThreads(int numThreads) {
+    numThreads_ = std::max(0, numThreads);
+}
+
+int HeatSolver::getNumThreads() const {
+    return threadCount();
+}
+
+void HeatSolver::setDeterministic(bool deterministic) {
+    deterministic_ = deterministic;
+}
+
+bool HeatSolver::isDeterministic() const {
+    return deterministic_;
+}
+
+int HeatSolver::threadCount() const {
+#ifdef WITH_OPENMP
+    return numThreads_ > 0 ? numThreads_ : omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+int HeatSolver::getMaxThreads() {
+#ifdef WITH_OPENMP
+    return omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+PrecisionDrift measurePrecisionDrift(const PointCloud& cloud, const std::vector<Material>& materials,
+                                     double timeStep, double duration, Integrator integrator) {
+    PointCloud reference = cloud;
+    PointCloud single = cloud;
+    reference.setPrecision(Precision::FLOAT64);
+    single.setPrecision(Precision::FLOAT32);
+
+    HeatSolver referenceSolver(reference, materials, timeStep, integrator);
+    HeatSolver singleSolver(single, materials, timeStep, integrator);
+    referenceSolver.run_for_time(duration);
+    singleSolver.run_for_time(duration);
+
+    PrecisionDrift drift;
+    double sumSquares = 0.0;
+    for (size_t i = 0; i < cloud.size(); ++i) {
+        double difference = single.getTemperature(i) - reference.getTemperature(i);
+        drift.maxDifference = std::max(drift.maxDifference, std::abs(difference));
+        sumSquares += difference * difference;
+    }
+    drift.rmsDifference = cloud.size() > 0 ? std::sqrt(sumSquares / cloud.size()) : 0.0;
+    drift.coffeeDifference = singleSolver.getAverageTemperature(MaterialType::COFFEE) -
+                             referenceSolver.getAverageTemperature(MaterialType::COFFEE);
+    drift.steps = static_cast<size_t>(std::llround(referenceSolver.getCurrentTime() / timeStep));
+    return drift;
+}
+
+void HeatSolver::saveCheckpoint(const std::string& path) const {
+    bool haveOperator = conductance_.isCurrent(pointCloud_);
+    // the active set's idle rows live in the back buffer, so both go in or neither does
+    bool haveActiveSet = haveOperator && activeSetStepping_ && activeSet_.isValid();
+
+    uint32_t sections = CHECKPOINT_CLOUD | CHECKPOINT_SOLVER;
+    if (haveOperator) {
+        sections |= CHECKPOINT_OPERATOR;
+    }
+    if (haveActiveSet) {
+        sections |= CHECKPOINT_ACTIVE_SET;
+    }
+    CheckpointWriter writer(path, sections);
+    pointCloud_.writeCheckpoint(writer, haveActiveSet);
+
+    writer.write(currentTime_);
+    writer.write(timeStep_);
+    writer.write(neighborRadius_);
+    writer.write<uint64_t>(materials_.size());
+    for (const auto& material : materials_) {
+        writer.write(material.getDensity());
+        writer.write(material.getSpecificHeat());
+        writer.write(material.getThermalConductivity());
+        writer.write(material.getAmbientTemperature());
+    }
+    writer.write<uint8_t>(static_cast<uint8_t>(integrator_));
+    writer.write<uint8_t>(static_cast<uint8_t>(backend_));
+    writer.write<uint8_t>(deterministic_);
+    writer.write(solverTolerance_);
+    writer.write<int32_t>(maxSolverIterations_);
+    writer.write<uint8_t>(adaptive_);
+    writer.write(maxTemperatureChange_);
+    writer.write(maxTimeStep_);
+    writer.write(adaptiveTimeStep_);
+    writer.write<uint8_t>(stabilityChecked_);
+    writer.write<uint8_t>(activeSetStepping_);
+    writer.write(activeSet_.getTolerance());
+    writer.write(convectionCoefficient_);
+    writer.write(emissivity_);
+    writer.write(ambientTemperature_);
+    writer.write<uint8_t>(ambientOverride_);
+
+    if (haveOperator) {
+        conductance_.writeCheckpoint(writer);
+    }
+    if (haveActiveSet) {
+        activeSet_.writeCheckpoint(writer);
+    }
+    writer.close();
+}
+
+void HeatSolver::loadCheckpoint(const std::string& path) {
+    CheckpointReader reader(path);
+    if (!reader.hasSection(CHECKPOINT_SOLVER)) {
+        reader.fail("holds a point cloud but no solver state");
+    }
+    if (reader.hasSection(CHECKPOINT_ACTIVE_SET) && !reader.hasSection(CHECKPOINT_OPERATOR)) {
+        reader.fail("active set without its operator");
+    }
+    // every section is read into scratch first, so a file that fails anywhere leaves the solver and its cloud
+    // exactly as they were
+    PointCloud cloud;
+    cloud.readCheckpoint(reader);
+
+    double currentTime = reader.read<double>();
+    double timeStep = reader.read<double>();
+    double neighborRadius = reader.read<double>();
+    auto materialCount = reader.read<uint64_t>();
+    if (materialCount > 256) {
+        reader.fail("implausible material count " + std::to_string(materialCount));
+    }
+    std::vector<Material> materials;
+    for (uint64_t m = 0; m < materialCount; ++m) {
+        double density = reader.read<double>();
+        double specificHeat = reader.read<double>();
+        double conductivity = reader.read<double>();
+        double ambient = reader.read<double>();
+        materials.emplace_back(density, specificHeat, conductivity, ambient);
+    }
+    auto integrator = reader.read<uint8_t>();
+    auto backend = reader.read<uint8_t>();
+    if (integrator > static_cast<uint8_t>(Integrator::CRANK_NICOLSON) ||
+        backend > static_cast<uint8_t>(Backend::STRUCTURED_GRID)) {
+        reader.fail("unknown integrator or backend");
+    }
+    bool deterministic = reader.read<uint8_t>() != 0;
+    double solverTolerance = reader.read<double>();
+    int32_t maxSolverIterations = reader.read<int32_t>();
+    bool adaptive = reader.read<uint8_t>() != 0;
+    double maxTemperatureChange = reader.read<double>();
+    double maxTimeStep = reader.read<double>();
+    double adaptiveTimeStep = reader.read<double>();
+    bool stabilityChecked = reader.read<uint8_t>() != 0;
+    bool activeSetStepping = reader.read<uint8_t>() != 0;
+    double activeSetTolerance = reader.read<double>();
+    double convectionCoefficient = reader.read<double>();
+    double emissivity = reader.read<double>();
+    double ambientTemperature = reader.read<double>();
+    bool ambientOverride = reader.read<uint8_t>() != 0;
+
+    ConductanceOperator conductance;
+    if (reader.hasSection(CHECKPOINT_OPERATOR)) {
+        conductance.readCheckpoint(reader, cloud);
+    }
+    ActiveSet activeSet;
+    if (reader.hasSection(CHECKPOINT_ACTIVE_SET)) {
+        activeSet.readCheckpoint(reader, conductance);
+    }
+
+    // all of it parsed, nothing below throws
+    pointCloud_.restoreFrom(std::move(cloud));
+    currentTime_ = currentTime;
+    timeStep_ = timeStep;
+    neighborRadius_ = neighborRadius;
+    materials_ = std::move(materials);
+    integrator_ = static_cast<Integrator>(integrator);
+    backend_ = static_cast<Backend>(backend);
+    deterministic_ = deterministic;
+    solverTolerance_ = solverTolerance;
+    maxSolverIterations_ = maxSolverIterations;
+    adaptive_ = adaptive;
+    maxTemperatureChange_ = maxTemperatureChange;
+    maxTimeStep_ = maxTimeStep;
+    adaptiveTimeStep_ = adaptiveTimeStep;
+    stabilityChecked_ = stabilityChecked;
+    activeSetStepping_ = activeSetStepping;
+    convectionCoefficient_ = convectionCoefficient;
+    emissivity_ = emissivity;
+    ambientTemperature_ = ambientTemperature;
+    ambientOverride_ = ambientOverride;
+
+    // whatever was cached belongs to the old state
+    conductance_.invalidate();
+    structuredGrid_.invalidate();
+    activeSet_.reset();
+    activeSet_.setTolerance(activeSetTolerance);
+    implicitGeneration_ = 0;
+    stepSizes_.clear();
+    activeCounts_.clear();
+    activeCount_ = 0;
+
+    if (reader.hasSection(CHECKPOINT_OPERATOR)) {
+        conductance_.restoreFrom(std::move(conductance), pointCloud_);
+    }
+    if (reader.hasSection(CHECKPOINT_ACTIVE_SET)) {
+        activeSet_.restoreFrom(std::move(activeSet), conductance_);
+    }
+    // the restored set goes with the restored temperatures
+    temperatureRevision_ = pointCloud_.getTemperatureRevision();
+    HEAT_LOG(LogLevel::INFO, "restored " << pointCloud_.size() << " points at t = " << currentTime_
+                             << " s from " << path);
+}
@@ -0,0 +1,61 @@
+#include "KDTreeIndex.hpp"
+#include <algorithm>
+#include <cmath>
+#include <stdexcept>
+#include <string>
+#include <utility>
+
+KDTreeIndex::KDTreeIndex(const PointCloud& cloud, size_t leafSize)
+    : cloud_(cloud), pointCount_(cloud.size()), leafSize_(leafSize) {
+    tree_ = std::make_unique<Tree>(3, cloud_, nanoflann::KDTreeSingleIndexAdaptorParams(leafSize_));
+#if NANOFLANN_VERSION < 0x140
+    // older nanoflann releases don't build the tree in the constructor
+    tree_->buildIndex();
+#endif
+}
+
+void KDTreeIndex::radiusSearch(double x, double y, double z, double radius, std::vector<size_t>& out) const {
+    if (cloud_.size() != pointCount_) {
+        throw std::logic_error("KDTreeIndex: the point cloud changed size since the index was built");
+    }
+
+    out.clear();
+    if (pointCount_ == 0) return;
+
+    const double query[3] = {x, y, z};
+
+    // nanoflann compares squared distances; search a hair wider and then apply the same sqrt cutoff test
+    // as CellList so both indexes produce exactly the same neighbor sets
+    auto searchRadius = radius * radius * (1.0 + 4.0 * kCutoffTolerance);
+#if NANOFLANN_VERSION >= 0x150
+    std::vector<nanoflann::ResultItem<size_t, double>> matches;
+    nanoflann::SearchParameters params;
+#else
+    std::vector<std::pair<size_t, double>> matches;
+    nanoflann::SearchParams params;
+#endif
+    params.sorted = false;
+    tree_->radiusSearch(query, searchRadius, matches, params);
+
+    for (const auto& match : matches) {
+        auto j = match.first;
+        double dx = cloud_.getX(j) - x;
+        double dy = cloud_.getY(j) - y;
+        double dz = cloud_.getZ(j) - z;
+        if (withinCutoff(std::sqrt(dx*dx + dy*dy + dz*dz), radius)) {
+            out.push_back(j);
+        }
+    }
+    std::sort(out.begin(), out.end());
+}
+
+void KDTreeIndex::buildNeighbors(PointCloud& cloud, double radius) const {
+    if (cloud.size() != pointCount_) {
+        throw std::invalid_argument("KDTreeIndex: cloud has " + std::to_string(cloud.size()) +
+                                    " points but the index was built over " + std::to_string(pointCount_));
+    }
+
+    cloud.fillNeighbors(radius, [this](double x, double y, double z, double reach, std::vector<size_t>& out) {
+        radiusSearch(x, y, z, reach, out);
+    });
+}
@@ -0,0 +1,73 @@
+#include "Log.hpp"
+#include <iostream>
+#include <memory>
+#include <mutex>
+
+namespace Log {
+
+std::atomic<int> currentLevel{static_cast<int>(LogLevel::WARNING)};
+
+namespace {
+
+const char* levelName(LogLevel level) {
+    switch (level) {
+        case LogLevel::TRACE: return "TRACE";
+        case LogLevel::DEBUG: return "DEBUG";
+        case LogLevel::INFO: return "INFO";
+        case LogLevel::WARNING: return "WARNING";
+        case LogLevel::ERROR: return "ERROR";
+        default: return "";
+    }
+}
+
+void writeToStderr(LogLevel level, const std::string& message) {
+    std::cerr << levelName(level) << ": " << message << std::endl;
+}
+
+std::mutex sinkMutex;
+std::shared_ptr<Sink> sink = std::make_shared<Sink>(writeToStderr);
+
+}  // namespace
+
+void setLevel(LogLevel level) {
+    currentLevel = static_cast<int>(level);
+}
+
+LogLevel getLevel() {
+    return static_cast<LogLevel>(currentLevel.load());
+}
+
+void setSink(Sink newSink) {
+    std::lock_guard<std::mutex> lock(sinkMutex);
+    sink = std::make_shared<Sink>(std::move(newSink));
+}
+
+void resetSink() {
+    setSink(writeToStderr);
+}
+
+void write(LogLevel level, const std::string& message) {
+    // take a reference and call it unlocked, a sink that needs the Python GIL must not hold our mutex meanwhile
+    std::shared_ptr<Sink> current;
+    {
+        std::lock_guard<std::mutex> lock(sinkMutex);
+        current = sink;
+    }
+    (*current)(level, message);
+}
+
+}  // namespace Log
+
+ProgressReporter::ProgressReporter(double intervalSeconds)
+    : interval_(std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+          std::chrono::duration<double>(intervalSeconds))),
+      last_(std::chrono::steady_clock::now()) {}
+
+bool ProgressReporter::due() {
+    auto now = std::chrono::steady_clock::now();
+    if (now - last_ < interval_) {
+        return false;
+    }
+    last_ = now;
+    return true;
+}
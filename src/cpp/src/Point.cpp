@@ -54,8 +54,7 @@ void Point::setMaterial(MaterialType material) {
     if (isStandalone_) {
         material_ = material;
     } else {
-        // Assuming PointCloud has a setMaterial method
-        // cloud_->setMaterial(index_, material);
+        cloud_->setMaterial(index_, material);
     }
 }
 
@@ -1,5 +1,9 @@
 #include "PointCloud.hpp"
-#include <fstream>
+#include "Checkpoint.hpp"
+#include "VTKWriter.hpp"
+#include <cmath>
+#include <stdexcept>
+#include <string>
 
 PointCloud::PointCloud() = default;
 
@@ -9,9 +13,21 @@ void PointCloud::addPoint(const Point& point) {
     x_.push_back(pos.x);
     y_.push_back(pos.y);
     z_.push_back(pos.z);
-    temperatures_.push_back(point.getTemperature());
+    if (precision_ == Precision::FLOAT32) {
+        temperatures32_.push_back(static_cast<float>(point.getTemperature()));
+    } else {
+        temperatures_.push_back(point.getTemperature());
+    }
     materials_.push_back(point.getMaterial());
+    if (!scales_.empty()) {
+        scales_.push_back(1.0);
+    }
+    if (!surfaceAreas_.empty()) {
+        surfaceAreas_.push_back(0.0);
+    }
     neighbors_.emplace_back();  // Empty neighbor list
+    neighborRadius_ = 0.0;
+    ++revision_;
 }
 
 // Clear all data
@@ -20,39 +36,342 @@ void PointCloud::clear() {
     y_.clear();
     z_.clear();
     temperatures_.clear();
+    nextTemperatures_.clear();
+    temperatures32_.clear();
+    nextTemperatures32_.clear();
     materials_.clear();
+    scales_.clear();
+    surfaceAreas_.clear();
     neighbors_.clear();
+    neighborRadius_ = 0.0;
+    ringSpacing_ = 0.0;
+    ++revision_;
 }
 
-// Save to VTK format
-void PointCloud::saveToVTK(const std::string& filename) const {
-    std::ofstream file(filename);
-    file << "# vtk DataFile Version 3.0\n";
-    file << "Heat Transfer Simulation\n";
-    file << "ASCII\n";
-    file << "DATASET UNSTRUCTURED_GRID\n";
-    file << "POINTS " << size() << " double\n";
-    
-    // Write all points
-    for (size_t i = 0; i < size(); ++i) {
-        file << x_[i] << " " << y_[i] << " " << z_[i] << "\n";
-    }
-    
-    file << "POINT_DATA " << size() << "\n";
-    file << "SCALARS temperature double\n";
-    file << "LOOKUP_TABLE default\n";
-    
-    // Write all temperatures
-    for (size_t i = 0; i < size(); ++i) {
-        file << temperatures_[i] << "\n";
-    }
-    
-    // Add material as a second scalar
-    file << "SCALARS material int\n";
-    file << "LOOKUP_TABLE default\n";
-    
-    // Write all materials as integers
+void PointCloud::setPrecision(Precision precision) {
+    if (precision == precision_) {
+        return;
+    }
+    if (precision == Precision::FLOAT32) {
+        temperatures32_.assign(temperatures_.begin(), temperatures_.end());
+        temperatures_ = std::vector<double>();
+    } else {
+        temperatures_.assign(temperatures32_.begin(), temperatures32_.end());
+        temperatures32_ = std::vector<float>();
+    }
+    nextTemperatures_ = std::vector<double>();
+    nextTemperatures32_ = std::vector<float>();
+    precision_ = precision;
+    ++revision_;
+}
+
+size_t PointCloud::addPoint(double x, double y, double z, double temp, MaterialType mat, double scale) {
+    if (scales_.empty() && scale != 1.0) {
+        scales_.assign(x_.size(), 1.0);  // points added so far are reference size
+    }
+    auto index = addPoint(x, y, z, temp, mat);
+    if (!scales_.empty()) {
+        scales_[index] = scale;
+    }
+    return index;
+}
+
+void PointCloud::addPoints(const double* xyz, const double* temperatures, const int32_t* materials, size_t count) {
+    for (size_t i = 0; i < count; ++i) {
+        if (materials[i] < static_cast<int32_t>(MaterialType::COFFEE) ||
+            materials[i] > static_cast<int32_t>(MaterialType::AIR)) {
+            throw std::invalid_argument("PointCloud: unknown material " + std::to_string(materials[i]) +
+                                        " at point " + std::to_string(i));
+        }
+    }
+    reserve(x_.size() + count);
+
+    for (size_t i = 0; i < count; ++i) {
+        x_.push_back(xyz[3 * i]);
+        y_.push_back(xyz[3 * i + 1]);
+        z_.push_back(xyz[3 * i + 2]);
+        materials_.push_back(static_cast<MaterialType>(materials[i]));
+    }
+    if (precision_ == Precision::FLOAT32) {
+        temperatures32_.insert(temperatures32_.end(), temperatures, temperatures + count);  // narrowed per value
+    } else {
+        temperatures_.insert(temperatures_.end(), temperatures, temperatures + count);
+    }
+    if (!scales_.empty()) {
+        scales_.resize(x_.size(), 1.0);
+    }
+    if (!surfaceAreas_.empty()) {
+        surfaceAreas_.resize(x_.size(), 0.0);
+    }
+    neighbors_.resize(x_.size());
+    neighborRadius_ = 0.0;
+    ++revision_;
+}
+
+void PointCloud::reserve(size_t count) {
+    x_.reserve(count);
+    y_.reserve(count);
+    z_.reserve(count);
+    if (precision_ == Precision::FLOAT32) {
+        temperatures32_.reserve(count);
+    } else {
+        temperatures_.reserve(count);
+    }
+    materials_.reserve(count);
+    if (!scales_.empty()) {
+        scales_.reserve(count);
+    }
+    if (!surfaceAreas_.empty()) {
+        surfaceAreas_.reserve(count);
+    }
+    neighbors_.reserve(count);
+}
+
+void PointCloud::setSurfaceArea(size_t i, double area) {
+    if (surfaceAreas_.empty()) {
+        if (area == 0.0) return;
+        surfaceAreas_.assign(x_.size(), 0.0);
+    }
+    surfaceAreas_[i] = area;
+    ++revision_;
+}
+
+void PointCloud::setAxisymmetric(double spacing) {
+    ringSpacing_ = spacing;
+    ++revision_;
+}
+
+PointCloud PointCloud::revolve(size_t segments) const {
+    if (!isAxisymmetric()) {
+        return *this;
+    }
+
+    PointCloud swept;
+    swept.setPrecision(precision_);
     for (size_t i = 0; i < size(); ++i) {
-        file << static_cast<int>(materials_[i]) << "\n";
+        auto r = x_[i];
+        auto count = segments;
+        if (count == 0) {
+            count = static_cast<size_t>(std::max(1.0, std::round(2.0 * kPi * r / ringSpacing_)));
+        }
+        if (r == 0.0) {
+            count = 1;  // the axis is a single point
+        }
+        for (size_t k = 0; k < count; ++k) {
+            double angle = 2.0 * kPi * k / count;
+            swept.addPoint(r * std::cos(angle), r * std::sin(angle), z_[i], getTemperature(i), materials_[i],
+                           getPointScale(i));
+        }
+    }
+    return swept;
+}
+
+void PointCloud::copyTemperatures(size_t begin, size_t end, double* out) const {
+    if (precision_ == Precision::FLOAT32) {
+        std::copy(temperatures32_.begin() + begin, temperatures32_.begin() + end, out);
+    } else {
+        std::copy(temperatures_.begin() + begin, temperatures_.begin() + end, out);
+    }
+}
+
+void PointCloud::assignTemperatures(size_t begin, const double* values, size_t count) {
+    if (precision_ == Precision::FLOAT32) {
+        std::transform(values, values + count, temperatures32_.begin() + begin,
+                       [](double value) { return static_cast<float>(value); });
+    } else {
+        std::copy(values, values + count, temperatures_.begin() + begin);
+    }
+    ++temperatureRevision_;
+}
+
+TemperatureSums PointCloud::sumTemperatures(size_t begin, size_t end) const {
+    TemperatureSums sums;
+    for (size_t i = begin; i < end; ++i) {
+        auto m = static_cast<int>(materials_[i]);
+        auto v = getVolumeFactor(i);
+        auto t = getTemperature(i);
+        sums.weighted[m] += v * t;
+        sums.volume[m] += v;
+        sums.max = std::max(sums.max, t);
+        sums.min = std::min(sums.min, t);
+    }
+    return sums;
+}
+
+void PointCloud::clearNeighbors() {
+    for (auto& list : neighbors_) {
+        list.clear();
+    }
+    neighborRadius_ = 0.0;
+    ++revision_;
+}
+
+void PointCloud::saveCheckpoint(const std::string& path) const {
+    CheckpointWriter writer(path, CHECKPOINT_CLOUD);
+    writeCheckpoint(writer);
+    writer.close();
+}
+
+void PointCloud::loadCheckpoint(const std::string& path) {
+    CheckpointReader reader(path);
+    readCheckpoint(reader);
+}
+
+void PointCloud::writeCheckpoint(CheckpointWriter& writer, bool backBuffer) const {
+    writer.write<uint64_t>(size());
+    writer.write<uint8_t>(static_cast<uint8_t>(precision_));
+    writer.write(ringSpacing_);
+    writer.writeArray(x_);
+    writer.writeArray(y_);
+    writer.writeArray(z_);
+
+    // only the buffers of the current precision, the other pair is empty
+    bool single = precision_ == Precision::FLOAT32;
+    backBuffer = backBuffer && (single ? nextTemperatures32_.size() == size() : nextTemperatures_.size() == size());
+    writer.write<uint8_t>(backBuffer);
+    if (single) {
+        writer.writeArray(temperatures32_);
+        if (backBuffer) writer.writeArray(nextTemperatures32_);
+    } else {
+        writer.writeArray(temperatures_);
+        if (backBuffer) writer.writeArray(nextTemperatures_);
     }
-}
\ No newline at end of file
+
+    std::vector<uint8_t> materials(materials_.size());
+    for (size_t i = 0; i < materials.size(); ++i) {
+        materials[i] = static_cast<uint8_t>(materials_[i]);
+    }
+    writer.writeArray(materials);
+    writer.writeArray(scales_);
+    writer.writeArray(surfaceAreas_);
+
+    // neighbor lists as CSR offsets and 32 bit indices, half the size of the size_t lists
+    writer.write(neighborRadius_);
+    if (neighborRadius_ > 0.0) {
+        std::vector<uint64_t> offsets(size() + 1, 0);
+        for (size_t i = 0; i < size(); ++i) {
+            offsets[i + 1] = offsets[i] + neighbors_[i].size();
+        }
+        std::vector<uint32_t> indices;
+        indices.reserve(offsets.back());
+        for (const auto& list : neighbors_) {
+            for (auto j : list) {
+                indices.push_back(static_cast<uint32_t>(j));
+            }
+        }
+        writer.writeArray(offsets);
+        writer.writeArray(indices);
+    }
+}
+
+void PointCloud::readCheckpoint(CheckpointReader& reader) {
+    auto n = reader.read<uint64_t>();
+    auto precision = reader.read<uint8_t>();
+    if (precision > static_cast<uint8_t>(Precision::FLOAT32)) {
+        reader.fail("unknown precision " + std::to_string(precision));
+    }
+    double ringSpacing = reader.read<double>();
+    auto x = reader.readArray<double>();
+    auto y = reader.readArray<double>();
+    auto z = reader.readArray<double>();
+
+    std::vector<double> temperatures, nextTemperatures;
+    std::vector<float> temperatures32, nextTemperatures32;
+    bool backBuffer = reader.read<uint8_t>() != 0;
+    size_t temperatureCount;
+    if (static_cast<Precision>(precision) == Precision::FLOAT32) {
+        temperatures32 = reader.readArray<float>();
+        if (backBuffer) nextTemperatures32 = reader.readArray<float>();
+        temperatureCount = temperatures32.size();
+    } else {
+        temperatures = reader.readArray<double>();
+        if (backBuffer) nextTemperatures = reader.readArray<double>();
+        temperatureCount = temperatures.size();
+    }
+
+    auto materialCodes = reader.readArray<uint8_t>();
+    auto scales = reader.readArray<double>();
+    auto surfaceAreas = reader.readArray<double>();
+    if (x.size() != n || y.size() != n || z.size() != n || temperatureCount != n || materialCodes.size() != n ||
+        (!scales.empty() && scales.size() != n) || (!surfaceAreas.empty() && surfaceAreas.size() != n) ||
+        (backBuffer && nextTemperatures.size() + nextTemperatures32.size() != n)) {
+        reader.fail("point arrays of different lengths");
+    }
+    std::vector<MaterialType> materials(n);
+    for (size_t i = 0; i < n; ++i) {
+        if (materialCodes[i] > static_cast<uint8_t>(MaterialType::AIR)) {
+            reader.fail("unknown material " + std::to_string(materialCodes[i]));
+        }
+        materials[i] = static_cast<MaterialType>(materialCodes[i]);
+    }
+
+    double neighborRadius = reader.read<double>();
+    std::vector<std::vector<size_t>> neighbors(n);
+    if (neighborRadius > 0.0) {
+        auto offsets = reader.readArray<uint64_t>();
+        auto indices = reader.readArray<uint32_t>();
+        if (offsets.size() != n + 1 || offsets.front() != 0 || offsets.back() != indices.size()) {
+            reader.fail("neighbor lists don't match the point count");
+        }
+        for (size_t i = 0; i < n; ++i) {
+            if (offsets[i] > offsets[i + 1]) {
+                reader.fail("neighbor offsets aren't ascending");
+            }
+            neighbors[i].assign(indices.begin() + offsets[i], indices.begin() + offsets[i + 1]);
+            for (auto j : neighbors[i]) {
+                if (j >= n) reader.fail("neighbor index out of range");
+            }
+        }
+    }
+
+    // everything checked out, so the cloud is only replaced by a complete section
+    x_ = std::move(x);
+    y_ = std::move(y);
+    z_ = std::move(z);
+    precision_ = static_cast<Precision>(precision);
+    temperatures_ = std::move(temperatures);
+    nextTemperatures_ = std::move(nextTemperatures);
+    temperatures32_ = std::move(temperatures32);
+    nextTemperatures32_ = std::move(nextTemperatures32);
+    materials_ = std::move(materials);
+    scales_ = std::move(scales);
+    surfaceAreas_ = std::move(surfaceAreas);
+    ringSpacing_ = ringSpacing;
+    neighbors_ = std::move(neighbors);
+    neighborRadius_ = neighborRadius;
+    ++revision_;
+    ++temperatureRevision_;
+}
+
+void PointCloud::restoreFrom(PointCloud&& loaded) {
+    x_ = std::move(loaded.x_);
+    y_ = std::move(loaded.y_);
+    z_ = std::move(loaded.z_);
+    precision_ = loaded.precision_;
+    temperatures_ = std::move(loaded.temperatures_);
+    nextTemperatures_ = std::move(loaded.nextTemperatures_);
+    temperatures32_ = std::move(loaded.temperatures32_);
+    nextTemperatures32_ = std::move(loaded.nextTemperatures32_);
+    materials_ = std::move(loaded.materials_);
+    scales_ = std::move(loaded.scales_);
+    surfaceAreas_ = std::move(loaded.surfaceAreas_);
+    ringSpacing_ = loaded.ringSpacing_;
+    neighbors_ = std::move(loaded.neighbors_);
+    neighborRadius_ = loaded.neighborRadius_;
+    // this cloud's own counters keep counting up, so nothing cached against it mistakes the new points for old
+    ++revision_;
+    ++temperatureRevision_;
+}
+
+void PointCloud::saveToVTK(const std::string& filename) const {
+    auto vtu = filename.size() >= 4 && filename.compare(filename.size() - 4, 4, ".vtu") == 0;
+    if (vtu) {
+        VTKWriter::writeVTU(*this, filename);
+    } else {
+        VTKWriter::writeLegacy(*this, filename);
+    }
+}
+
+void PointCloud::saveToVTU(const std::string& filename, bool compress) const {
+    VTKWriter::writeVTU(*this, filename, compress);
+}
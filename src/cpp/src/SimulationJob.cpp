@@ -0,0 +1,275 @@
+#include "SimulationJob.hpp"
+#include <algorithm>
+#include <stdexcept>
+
+JobPool::JobPool(size_t workers) : stopping_(false) {
+    if (workers == 0) {
+        throw std::invalid_argument("JobPool: a pool needs at least one worker");
+    }
+    for (size_t w = 0; w < workers; ++w) {
+        workers_.emplace_back(&JobPool::workLoop, this);
+    }
+}
+
+JobPool::~JobPool() {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        stopping_ = true;
+    }
+    jobQueued_.notify_all();
+    for (auto& worker : workers_) {
+        worker.join();
+    }
+}
+
+size_t JobPool::getQueuedCount() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return queue_.size();
+}
+
+void JobPool::submit(SimulationJob* job) {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        queue_.push_back(job);
+    }
+    jobQueued_.notify_one();
+}
+
+bool JobPool::withdraw(SimulationJob* job) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    auto it = std::find(queue_.begin(), queue_.end(), job);
+    if (it == queue_.end()) {
+        return false;
+    }
+    queue_.erase(it);
+    return true;
+}
+
+void JobPool::workLoop() {
+    std::unique_lock<std::mutex> lock(mutex_);
+    while (true) {
+        jobQueued_.wait(lock, [this] { return !queue_.empty() || stopping_; });
+        if (queue_.empty()) {
+            break;  // stopping and drained
+        }
+        SimulationJob* job = queue_.front();
+        queue_.pop_front();
+        lock.unlock();
+        job->runLoop();
+        lock.lock();
+    }
+}
+
+SimulationJob::SimulationJob(HeatSolver& solver, double duration)
+    : solver_(solver), duration_(duration), startTime_(solver.getCurrentTime()), pool_(nullptr),
+      progressInterval_(1.0), reporter_(1.0), state_(JobState::PENDING), finished_(false) {
+    if (!(duration >= 0.0)) {
+        throw std::invalid_argument("SimulationJob: the duration must not be negative");
+    }
+    control_.time.store(startTime_);
+}
+
+SimulationJob::~SimulationJob() {
+    cancel();
+    if (thread_.joinable()) {
+        // the last reference to the job may go with its done callbacks, on its own thread, which can't join itself;
+        // finish has published the end by then and touches nothing of the job any more
+        if (thread_.get_id() == std::this_thread::get_id()) {
+            thread_.detach();
+        } else {
+            thread_.join();
+        }
+    } else if (pool_) {
+        // a pool worker may still be running it (cancel already took it out of the queue if it was waiting); once
+        // finished_ is set the worker doesn't touch the job again
+        wait();
+    }
+}
+
+void SimulationJob::start() {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (state_ != JobState::PENDING) {
+        throw std::logic_error("SimulationJob: the job was started already");
+    }
+    startTime_ = solver_.getCurrentTime();
+    control_.time.store(startTime_);
+    state_ = JobState::RUNNING;
+    thread_ = std::thread(&SimulationJob::runLoop, this);
+}
+
+void SimulationJob::start(JobPool& pool) {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (state_ != JobState::PENDING) {
+            throw std::logic_error("SimulationJob: the job was started already");
+        }
+        startTime_ = solver_.getCurrentTime();
+        control_.time.store(startTime_);
+        state_ = JobState::QUEUED;
+        pool_ = &pool;
+    }
+    pool.submit(this);
+}
+
+void SimulationJob::setProgressCallback(std::function<void(const JobProgress&)> callback, double intervalSeconds) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (state_ != JobState::PENDING) {
+        throw std::logic_error("SimulationJob: set the progress callback before starting the job");
+    }
+    progressCallback_ = std::move(callback);
+    progressInterval_ = intervalSeconds;
+}
+
+void SimulationJob::runLoop() {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        state_ = JobState::RUNNING;
+    }
+    runStart_ = std::chrono::steady_clock::now();
+    reporter_ = ProgressReporter(progressInterval_);
+    if (progressCallback_) {
+        control_.onStep = [this] {
+            if (reporter_.due()) {
+                report(false);
+            }
+        };
+    }
+
+    JobState state = JobState::FINISHED;
+    std::exception_ptr error;
+    try {
+        if (!solver_.run_for_time(duration_, control_)) {
+            state = JobState::CANCELLED;
+        }
+        if (progressCallback_) {
+            report(true);
+        }
+    } catch (...) {
+        state = JobState::FAILED;
+        error = std::current_exception();
+    }
+    finish(state, error);
+}
+
+void SimulationJob::report(bool last) {
+    JobProgress progress;
+    progress.time = solver_.getCurrentTime();
+    progress.progress = duration_ > 0.0 ? std::clamp((progress.time - startTime_) / duration_, 0.0, 1.0) : 1.0;
+    progress.steps = control_.steps.load();
+    double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - runStart_).count();
+    progress.stepsPerSecond = elapsed > 0.0 ? static_cast<double>(progress.steps) / elapsed : 0.0;
+    progress.coffee = solver_.getAverageTemperature(MaterialType::COFFEE);
+    progress.cup = solver_.getAverageTemperature(MaterialType::CUP_MATERIAL);
+    progress.air = solver_.getAverageTemperature(MaterialType::AIR);
+    progress.max = solver_.getMaxTemperature();
+    progress.min = solver_.getMinTemperature();
+    progress.last = last;
+    progressCallback_(progress);
+}
+
+void SimulationJob::finish(JobState state, std::exception_ptr error) {
+    // the callbacks may hold the last reference to whatever owns the job, so they leave the job now and are
+    // destroyed only on the way out, after the last access to it
+    std::function<void()> onStep = std::move(control_.onStep);
+    std::function<void(const JobProgress&)> progressCallback = std::move(progressCallback_);
+    control_.onStep = nullptr;
+    progressCallback_ = nullptr;
+    std::vector<std::function<void()>> callbacks;
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        state_ = state;
+        error_ = error;
+        callbacks.swap(callbacks_);
+    }
+    for (auto& callback : callbacks) {
+        try {
+            callback();
+        } catch (...) {
+            // nobody on this thread to report it to
+        }
+    }
+    {
+        // set and notified under the lock: a waiter may destroy the job as soon as it gets the mutex back
+        std::lock_guard<std::mutex> lock(mutex_);
+        finished_ = true;
+        done_.notify_all();
+    }
+    // the job may be gone from here on
+}
+
+void SimulationJob::cancel() {
+    control_.cancel.store(true);
+    bool queued;
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        queued = state_ == JobState::QUEUED;
+    }
+    // a job no worker picked up yet never runs; one a worker just took stops before its first step
+    if (queued && pool_->withdraw(this)) {
+        finish(JobState::CANCELLED, nullptr);
+    }
+}
+
+bool SimulationJob::wait(double timeoutSeconds) {
+    std::unique_lock<std::mutex> lock(mutex_);
+    if (state_ == JobState::PENDING) {
+        throw std::logic_error("SimulationJob: wait on a job that wasn't started");
+    }
+    auto finished = [this] { return finished_; };
+    if (timeoutSeconds < 0.0) {
+        done_.wait(lock, finished);
+        return true;
+    }
+    return done_.wait_for(lock, std::chrono::duration<double>(timeoutSeconds), finished);
+}
+
+void SimulationJob::join() {
+    wait();
+    if (thread_.joinable() && thread_.get_id() != std::this_thread::get_id()) {
+        thread_.join();
+    }
+    rethrowError();
+}
+
+void SimulationJob::rethrowError() const {
+    std::exception_ptr error;
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        error = error_;
+    }
+    if (error) {
+        std::rethrow_exception(error);
+    }
+}
+
+JobState SimulationJob::getState() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return state_;
+}
+
+bool SimulationJob::isDone() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return finished_;
+}
+
+double SimulationJob::getProgress() const {
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (state_ == JobState::FINISHED) {
+        return 1.0;
+    }
+    if (state_ == JobState::PENDING || duration_ <= 0.0) {
+        return 0.0;
+    }
+    return std::clamp((control_.time.load() - startTime_) / duration_, 0.0, 1.0);
+}
+
+void SimulationJob::addDoneCallback(std::function<void()> callback) {
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (!done()) {
+            callbacks_.push_back(std::move(callback));
+            return;
+        }
+    }
+    callback();
+}
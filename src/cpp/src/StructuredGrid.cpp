@@ -0,0 +1,310 @@
+#include "StructuredGrid.hpp"
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+
+// same switch as the CSR kernels: AVX2 variants on x86 GCC/Clang, used if the CPU supports them
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+#define HEAT_HAVE_AVX2_KERNEL 1
+#else
+#define HEAT_HAVE_AVX2_KERNEL 0
+#endif
+
+namespace {
+
+// coordinates may carry rounding from accumulating the spacing, so lattice positions match to this
+// fraction of the spacing
+constexpr double kLatticeTolerance = 1e-6;
+
+// Sorted distinct values of one coordinate, merging values closer than eps
+std::vector<double> distinctValues(const std::vector<double>& values, double eps) {
+    std::vector<double> sorted(values);
+    std::sort(sorted.begin(), sorted.end());
+    std::vector<double> distinct;
+    for (double v : sorted) {
+        if (distinct.empty() || v - distinct.back() > eps) {
+            distinct.push_back(v);
+        }
+    }
+    return distinct;
+}
+
+}  // namespace
+
+StructuredGrid::StructuredGrid()
+    : dims_{0, 0, 0}, spacing_{0.0, 0.0, 0.0}, origin_{0.0, 0.0, 0.0}, strides_{0, 0, 0},
+      source_(nullptr), revision_(0), lattice_(false), stableTimeStep_(std::numeric_limits<double>::infinity()) {}
+
+bool StructuredGrid::detect(const PointCloud& cloud) {
+    const auto n = cloud.size();
+    if (n < 2 || cloud.hasPointScales() || cloud.isAxisymmetric()) return false;
+
+    const std::vector<double>* coords[3] = {&cloud.getXs(), &cloud.getYs(), &cloud.getZs()};
+    size_t total = 1;
+    for (int a = 0; a < 3; ++a) {
+        auto [lo, hi] = std::minmax_element(coords[a]->begin(), coords[a]->end());
+        double extent = *hi - *lo;
+        auto distinct = distinctValues(*coords[a], extent * 1e-12);
+        dims_[a] = distinct.size();
+        origin_[a] = *lo;
+        spacing_[a] = dims_[a] > 1 ? extent / (dims_[a] - 1) : 1.0;
+        total *= dims_[a];
+    }
+    if (total != n) return false;
+
+    // lattice index of every point, rejecting points off the lattice
+    std::vector<std::array<int64_t, 3>> index(n);
+    for (size_t i = 0; i < n; ++i) {
+        for (int a = 0; a < 3; ++a) {
+            double position = ((*coords[a])[i] - origin_[a]) / spacing_[a];
+            double rounded = std::round(position);
+            if (std::abs(position - rounded) > kLatticeTolerance) return false;
+            index[i][a] = static_cast<int64_t>(rounded);
+        }
+    }
+
+    // the point order has to be a fixed nesting of the three axes; try each of the six
+    static const std::array<std::array<int, 3>, 6> orders = {{
+        {2, 0, 1}, {2, 1, 0}, {0, 1, 2}, {0, 2, 1}, {1, 0, 2}, {1, 2, 0}}};  // CupGenerator's z, x, y first
+    for (const auto& order : orders) {
+        std::array<int64_t, 3> strides;
+        strides[order[2]] = 1;
+        strides[order[1]] = static_cast<int64_t>(dims_[order[2]]);
+        strides[order[0]] = static_cast<int64_t>(dims_[order[2]] * dims_[order[1]]);
+
+        bool matches = true;
+        for (size_t i = 0; i < n && matches; ++i) {
+            matches = index[i][0] * strides[0] + index[i][1] * strides[1] + index[i][2] * strides[2] ==
+                      static_cast<int64_t>(i);
+        }
+        if (matches) {
+            strides_ = strides;
+            return true;
+        }
+    }
+    return false;
+}
+
+bool StructuredGrid::build(const PointCloud& cloud, const std::vector<Material>& materials,
+                           const ConductanceTable& conductance, double contactArea, double pointVolume,
+                           double radius, const SurfaceExchange& surface, int numThreads) {
+    source_ = &cloud;
+    revision_ = cloud.getRevision();
+    offsets_.clear();
+    conductances_ = std::vector<double>();
+    conductances32_ = std::vector<float>();
+    inverseCapacities_ = std::vector<double>();
+    inverseCapacities32_ = std::vector<float>();
+    sinks_ = std::vector<double>();
+    sinks32_ = std::vector<float>();
+    ambientTemperature_ = surface.ambientTemperature;
+    lattice_ = detect(cloud);
+    if (!lattice_) {
+        return false;
+    }
+
+    // the forward half of every lattice offset within the radius (the backward half reuses the same pairs)
+    std::array<int, 3> reach;
+    for (int a = 0; a < 3; ++a) {
+        reach[a] = dims_[a] > 1 ? static_cast<int>(std::floor(radius * (1.0 + kCutoffTolerance) / spacing_[a])) : 0;
+    }
+    for (int dx = -reach[0]; dx <= reach[0]; ++dx) {
+        for (int dy = -reach[1]; dy <= reach[1]; ++dy) {
+            for (int dz = -reach[2]; dz <= reach[2]; ++dz) {
+                int64_t stride = dx * strides_[0] + dy * strides_[1] + dz * strides_[2];
+                if (stride <= 0) continue;
+                double ex = dx * spacing_[0], ey = dy * spacing_[1], ez = dz * spacing_[2];
+                double distance = std::sqrt(ex*ex + ey*ey + ez*ez);
+                if (!withinCutoff(distance, radius)) continue;
+                offsets_.push_back({{dx, dy, dz}, stride, distance});
+            }
+        }
+    }
+    std::sort(offsets_.begin(), offsets_.end(),
+              [](const Offset& a, const Offset& b) { return a.stride < b.stride; });
+
+    const auto n = cloud.size();
+    const auto& cloudMaterials = cloud.getMaterials();
+    std::array<double, 3> inverseCapacity;
+    for (int a = 0; a < 3; ++a) {
+        inverseCapacity[a] = 1.0 / (materials[a].getDensity() * materials[a].getSpecificHeat() * pointVolume);
+    }
+    inverseCapacities_.resize(n);
+    for (size_t i = 0; i < n; ++i) {
+        inverseCapacities_[i] = inverseCapacity[static_cast<int>(cloudMaterials[i])];
+    }
+
+    // pair conductance k_eff * A / d from point i to i + stride, zero where the neighbor falls off the lattice
+    conductances_.assign(offsets_.size() * n, 0.0);
+#ifdef WITH_OPENMP
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    for (std::ptrdiff_t i = 0; i < static_cast<std::ptrdiff_t>(n); ++i) {
+        std::array<int64_t, 3> at;
+        for (int a = 0; a < 3; ++a) {
+            at[a] = (i / strides_[a]) % static_cast<int64_t>(dims_[a]);
+        }
+        auto mi = static_cast<int>(cloudMaterials[i]);
+        for (size_t o = 0; o < offsets_.size(); ++o) {
+            const auto& offset = offsets_[o];
+            bool inside = true;
+            for (int a = 0; a < 3; ++a) {
+                auto moved = at[a] + offset.delta[a];
+                inside = inside && moved >= 0 && moved < static_cast<int64_t>(dims_[a]);
+            }
+            if (inside) {
+                auto mj = static_cast<int>(cloudMaterials[i + offset.stride]);
+                conductances_[o * n + i] = conductance[mi][mj] * contactArea / offset.distance;
+            }
+        }
+    }
+
+    // exposed points: h * A * a_i to the ambient, the operator's sink times the capacity
+    if (cloud.hasSurfaceAreas() && surface.coefficient > 0.0) {
+        sinks_.resize(n);
+        for (size_t i = 0; i < n; ++i) {
+            sinks_[i] = surface.coefficient * contactArea * cloud.getSurfaceArea(i);
+        }
+    }
+
+    // Gershgorin bound, as for the CSR operator: 1 / max_i (sum of both directions' conductances) / C_i
+    std::vector<double> rowSums = sinks_.empty() ? std::vector<double>(n, 0.0) : sinks_;
+    for (size_t o = 0; o < offsets_.size(); ++o) {
+        const double* g = conductances_.data() + o * n;
+        const auto stride = static_cast<size_t>(offsets_[o].stride);
+        for (size_t i = 0; i + stride < n; ++i) {
+            rowSums[i] += g[i];
+            rowSums[i + stride] += g[i];
+        }
+    }
+    double maxRowSum = 0.0;
+    for (size_t i = 0; i < n; ++i) {
+        maxRowSum = std::max(maxRowSum, rowSums[i] * inverseCapacities_[i]);
+    }
+    stableTimeStep_ = maxRowSum > 0.0 ? 1.0 / maxRowSum : std::numeric_limits<double>::infinity();
+
+    if (cloud.getPrecision() == Precision::FLOAT32) {
+        conductances32_.assign(conductances_.begin(), conductances_.end());
+        inverseCapacities32_.assign(inverseCapacities_.begin(), inverseCapacities_.end());
+        sinks32_.assign(sinks_.begin(), sinks_.end());
+    }
+    return true;
+}
+
+bool StructuredGrid::isCurrent(const PointCloud& cloud) const {
+    return source_ == &cloud && revision_ == cloud.getRevision();
+}
+
+void StructuredGrid::invalidate() {
+    source_ = nullptr;
+}
+
+namespace {
+
+// Sweeps one block of the lattice: every offset is a unit stride pass over the block, first the backward
+// neighbors (i - stride, farthest first) then the forward ones (nearest first), so each point adds its
+// neighbors in ascending index order like a CSR row. Pairs off the lattice have zero conductance, which
+// is what lets the passes run without bounds checks.
+template <class Real>
+inline void sweepBlock(const Real* __restrict temperatures, Real* __restrict out, Real* __restrict rate,
+                       const Real* conductances, const Real* inverseCapacities, const Real* sinks, Real ambient,
+                       const int64_t* strides, size_t offsetCount, int64_t n, int64_t lo, int64_t hi, Real dt) {
+    for (int64_t i = lo; i < hi; ++i) {
+        rate[i - lo] = 0;
+    }
+    for (size_t o = offsetCount; o-- > 0;) {
+        const int64_t s = strides[o];
+        const Real* g = conductances + o * n;
+        for (int64_t i = std::max(lo, s); i < hi; ++i) {
+            rate[i - lo] += g[i - s] * (temperatures[i - s] - temperatures[i]);
+        }
+    }
+    for (size_t o = 0; o < offsetCount; ++o) {
+        const int64_t s = strides[o];
+        const Real* g = conductances + o * n;
+        for (int64_t i = lo; i < std::min(hi, n - s); ++i) {
+            rate[i - lo] += g[i] * (temperatures[i + s] - temperatures[i]);
+        }
+    }
+    if (sinks) {
+        for (int64_t i = lo; i < hi; ++i) {
+            rate[i - lo] += sinks[i] * (ambient - temperatures[i]);
+        }
+    }
+    for (int64_t i = lo; i < hi; ++i) {
+        out[i] = temperatures[i] + dt * inverseCapacities[i] * rate[i - lo];
+    }
+}
+
+#if HEAT_HAVE_AVX2_KERNEL
+template <class Real>
+__attribute__((target("avx2,fma")))
+void sweepBlockAvx2(const Real* temperatures, Real* out, Real* rate, const Real* conductances,
+                    const Real* inverseCapacities, const Real* sinks, Real ambient, const int64_t* strides,
+                    size_t offsetCount, int64_t n, int64_t lo, int64_t hi, Real dt) {
+    sweepBlock(temperatures, out, rate, conductances, inverseCapacities, sinks, ambient, strides, offsetCount, n,
+               lo, hi, dt);
+}
+#endif
+
+// points per block, small enough that the block's slice of every array stays in cache across the passes
+constexpr int64_t kSweepBlock = 2048;
+
+}  // namespace
+
+template <class Real>
+void StructuredGrid::applyStencil(const Real* temperatures, Real* out, const Real* conductances,
+                                  const Real* inverseCapacities, const Real* sinks, double dt,
+                                  int numThreads) const {
+    const auto n = static_cast<int64_t>(inverseCapacities_.size());
+    const auto blocks = static_cast<std::ptrdiff_t>((n + kSweepBlock - 1) / kSweepBlock);
+    std::vector<int64_t> strides(offsets_.size());
+    for (size_t o = 0; o < offsets_.size(); ++o) {
+        strides[o] = offsets_[o].stride;
+    }
+    const bool simd = ConductanceOperator::hasSimdKernel();
+    const Real step = static_cast<Real>(dt);
+    const Real ambient = static_cast<Real>(ambientTemperature_);
+
+#ifdef WITH_OPENMP
+    #pragma omp parallel num_threads(numThreads)
+#else
+    (void)numThreads;
+#endif
+    {
+        std::vector<Real> rate(kSweepBlock);
+#ifdef WITH_OPENMP
+        #pragma omp for schedule(static)
+#endif
+        for (std::ptrdiff_t b = 0; b < blocks; ++b) {
+            const int64_t lo = b * kSweepBlock;
+            const int64_t hi = std::min(n, lo + kSweepBlock);
+#if HEAT_HAVE_AVX2_KERNEL
+            if (simd) {
+                sweepBlockAvx2(temperatures, out, rate.data(), conductances, inverseCapacities, sinks, ambient,
+                               strides.data(), strides.size(), n, lo, hi, step);
+                continue;
+            }
+#endif
+            sweepBlock(temperatures, out, rate.data(), conductances, inverseCapacities, sinks, ambient,
+                       strides.data(), strides.size(), n, lo, hi, step);
+        }
+    }
+    (void)simd;
+}
+
+void StructuredGrid::apply(const double* temperatures, double* out, double dt, int numThreads) const {
+    applyStencil(temperatures, out, conductances_.data(), inverseCapacities_.data(),
+                 sinks_.empty() ? nullptr : sinks_.data(), dt, numThreads);
+}
+
+void StructuredGrid::apply(const float* temperatures, float* out, double dt, int numThreads) const {
+    if (conductances32_.size() != conductances_.size()) {
+        throw std::logic_error("StructuredGrid: single precision apply needs a grid built from a FLOAT32 cloud");
+    }
+    applyStencil(temperatures, out, conductances32_.data(), inverseCapacities32_.data(),
+                 sinks32_.empty() ? nullptr : sinks32_.data(), dt, numThreads);
+}
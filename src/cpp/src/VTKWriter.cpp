@@ -0,0 +1,285 @@
+#include "VTKWriter.hpp"
+#include <algorithm>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <fstream>
+#include <iomanip>
+#include <sstream>
+#include <stdexcept>
+
+#ifdef WITH_ZLIB
+#include <zlib.h>
+#endif
+
+namespace {
+
+// uncompressed bytes per zlib block; bigger blocks deflate a little better, VTK reads any size
+constexpr size_t kCompressionBlock = 1 << 18;
+
+// One appended array: the bytes as they sit in memory and how the XML describes them
+struct DataArray {
+    const char* type;
+    std::string name;
+    int components;
+    const void* data;
+    size_t bytes;
+};
+
+// Compressed appended block of an array: the zlib header (blocks, block size, last block size, compressed size of
+// each block) followed by the deflated blocks
+std::vector<char> compressArray(const DataArray& array) {
+#ifdef WITH_ZLIB
+    const auto* input = static_cast<const Bytef*>(array.data);
+    uint64_t blocks = (array.bytes + kCompressionBlock - 1) / kCompressionBlock;
+    uint64_t last = array.bytes - (blocks > 0 ? (blocks - 1) * kCompressionBlock : 0);
+    std::vector<uint64_t> header = {blocks, kCompressionBlock, blocks > 0 ? last : 0};
+    std::vector<char> body;
+    body.reserve(compressBound(array.bytes));
+    std::vector<Bytef> scratch(compressBound(kCompressionBlock));
+    for (uint64_t b = 0; b < blocks; ++b) {
+        uLong size = b + 1 == blocks ? last : kCompressionBlock;
+        uLongf compressed = scratch.size();
+        // level 1: frames are written every few steps, so speed matters more than the last few percent of size
+        if (compress2(scratch.data(), &compressed, input + b * kCompressionBlock, size, 1) != Z_OK) {
+            throw std::runtime_error("VTKWriter: zlib failed on array " + array.name);
+        }
+        header.push_back(compressed);
+        body.insert(body.end(), scratch.begin(), scratch.begin() + compressed);
+    }
+    std::vector<char> out(header.size() * sizeof(uint64_t));
+    std::memcpy(out.data(), header.data(), out.size());
+    out.insert(out.end(), body.begin(), body.end());
+    return out;
+#else
+    (void)array;
+    throw std::runtime_error("VTKWriter: built without zlib, compression isn't available");
+#endif
+}
+
+// Legacy files are big endian; values are swapped a chunk at a time so the write stays in bulk
+template <class T>
+void writeBigEndian(std::ofstream& file, const T* values, size_t count) {
+    static_assert(sizeof(T) == 8 || sizeof(T) == 4, "64 or 32 bit values");
+    constexpr size_t kChunk = 1 << 14;
+    std::vector<T> swapped(std::min(count, kChunk));
+    for (size_t begin = 0; begin < count; begin += kChunk) {
+        size_t end = std::min(count, begin + kChunk);
+        for (size_t i = begin; i < end; ++i) {
+            if constexpr (sizeof(T) == 8) {
+                uint64_t bits;
+                std::memcpy(&bits, &values[i], 8);
+                bits = __builtin_bswap64(bits);
+                std::memcpy(&swapped[i - begin], &bits, 8);
+            } else {
+                uint32_t bits;
+                std::memcpy(&bits, &values[i], 4);
+                bits = __builtin_bswap32(bits);
+                std::memcpy(&swapped[i - begin], &bits, 4);
+            }
+        }
+        file.write(reinterpret_cast<const char*>(swapped.data()),
+                   static_cast<std::streamsize>((end - begin) * sizeof(T)));
+    }
+}
+
+std::string directoryOf(const std::string& path) {
+    auto slash = path.find_last_of('/');
+    return slash == std::string::npos ? std::string() : path.substr(0, slash + 1);
+}
+
+}  // namespace
+
+bool VTKWriter::hasCompression() {
+#ifdef WITH_ZLIB
+    return true;
+#else
+    return false;
+#endif
+}
+
+void VTKWriter::writeVTU(const PointCloud& cloud, const std::string& path, bool compress) {
+    if (compress && !hasCompression()) {
+        throw std::runtime_error("VTKWriter: built without zlib, compression isn't available");
+    }
+    const size_t n = cloud.size();
+    if (n > static_cast<size_t>(INT32_MAX)) {
+        throw std::invalid_argument("VTKWriter: too many points for Int32 connectivity");
+    }
+
+    // VTK wants interleaved xyz, everything else goes out straight from the SoA arrays
+    std::vector<double> points(3 * n);
+    const auto& xs = cloud.getXs();
+    const auto& ys = cloud.getYs();
+    const auto& zs = cloud.getZs();
+    for (size_t i = 0; i < n; ++i) {
+        points[3 * i] = xs[i];
+        points[3 * i + 1] = ys[i];
+        points[3 * i + 2] = zs[i];
+    }
+    static_assert(sizeof(MaterialType) == sizeof(int32_t), "materials are written as Int32");
+    std::vector<int32_t> connectivity(n);
+    for (size_t i = 0; i < n; ++i) {
+        connectivity[i] = static_cast<int32_t>(i);
+    }
+    // one poly-vertex holding every point, so ParaView draws them without a cell per point
+    size_t cells = n > 0 ? 1 : 0;
+    int32_t offsets = static_cast<int32_t>(n);
+    uint8_t cellType = 2;  // VTK_POLY_VERTEX
+
+    std::vector<DataArray> pointData;
+    if (cloud.getPrecision() == Precision::FLOAT32) {
+        pointData.push_back({"Float32", "temperature", 1, cloud.getTemperatures32().data(), n * sizeof(float)});
+    } else {
+        pointData.push_back({"Float64", "temperature", 1, cloud.getTemperatures().data(), n * sizeof(double)});
+    }
+    pointData.push_back({"Int32", "material", 1, cloud.getMaterials().data(), n * sizeof(MaterialType)});
+    if (cloud.hasPointScales()) {
+        pointData.push_back({"Float64", "scale", 1, cloud.getPointScales().data(), n * sizeof(double)});
+    }
+    if (cloud.hasSurfaceAreas()) {
+        pointData.push_back({"Float64", "surface_area", 1, cloud.getSurfaceAreas().data(), n * sizeof(double)});
+    }
+    DataArray pointArray{"Float64", "Points", 3, points.data(), points.size() * sizeof(double)};
+    std::vector<DataArray> cellArrays = {
+        {"Int32", "connectivity", 1, connectivity.data(), n * sizeof(int32_t)},
+        {"Int32", "offsets", 1, &offsets, cells * sizeof(int32_t)},
+        {"UInt8", "types", 1, &cellType, cells * sizeof(uint8_t)},
+    };
+
+    // raw blocks are written straight from the arrays, compressed ones have to be deflated first to know their size
+    std::vector<const DataArray*> order;
+    for (const auto& array : pointData) order.push_back(&array);
+    order.push_back(&pointArray);
+    for (const auto& array : cellArrays) order.push_back(&array);
+    std::vector<std::vector<char>> compressed;
+    std::vector<uint64_t> offsetsInBlock;
+    uint64_t offset = 0;
+    for (const auto* array : order) {
+        offsetsInBlock.push_back(offset);
+        if (compress) {
+            compressed.push_back(compressArray(*array));
+            offset += compressed.back().size();
+        } else {
+            offset += sizeof(uint64_t) + array->bytes;
+        }
+    }
+
+    std::ostringstream xml;
+    size_t next = 0;
+    auto describe = [&](const DataArray& array) {
+        xml << "        <DataArray type=\"" << array.type << "\" Name=\"" << array.name << "\"";
+        if (array.components > 1) xml << " NumberOfComponents=\"" << array.components << "\"";
+        xml << " format=\"appended\" offset=\"" << offsetsInBlock[next++] << "\"/>\n";
+    };
+    xml << "<?xml version=\"1.0\"?>\n"
+        << "<VTKFile type=\"UnstructuredGrid\" version=\"1.0\" byte_order=\"LittleEndian\" header_type=\"UInt64\""
+        << (compress ? " compressor=\"vtkZLibDataCompressor\"" : "") << ">\n"
+        << "  <UnstructuredGrid>\n"
+        << "    <Piece NumberOfPoints=\"" << n << "\" NumberOfCells=\"" << cells << "\">\n"
+        << "      <PointData Scalars=\"temperature\">\n";
+    for (const auto& array : pointData) describe(array);
+    xml << "      </PointData>\n      <Points>\n";
+    describe(pointArray);
+    xml << "      </Points>\n      <Cells>\n";
+    for (const auto& array : cellArrays) describe(array);
+    xml << "      </Cells>\n    </Piece>\n  </UnstructuredGrid>\n  <AppendedData encoding=\"raw\">\n   _";
+
+    std::ofstream file(path, std::ios::binary | std::ios::trunc);
+    if (!file) {
+        throw std::runtime_error("VTKWriter: can't open " + path + " for writing");
+    }
+    auto text = xml.str();
+    file.write(text.data(), static_cast<std::streamsize>(text.size()));
+    for (size_t a = 0; a < order.size(); ++a) {
+        if (compress) {
+            file.write(compressed[a].data(), static_cast<std::streamsize>(compressed[a].size()));
+        } else {
+            uint64_t bytes = order[a]->bytes;
+            file.write(reinterpret_cast<const char*>(&bytes), sizeof(bytes));
+            file.write(static_cast<const char*>(order[a]->data), static_cast<std::streamsize>(bytes));
+        }
+    }
+    file << "\n  </AppendedData>\n</VTKFile>\n";
+    if (!file) {
+        throw std::runtime_error("VTKWriter: writing " + path + " failed");
+    }
+}
+
+void VTKWriter::writeLegacy(const PointCloud& cloud, const std::string& path) {
+    std::ofstream file(path, std::ios::binary | std::ios::trunc);
+    if (!file) {
+        throw std::runtime_error("VTKWriter: can't open " + path + " for writing");
+    }
+    const size_t n = cloud.size();
+    std::vector<double> points(3 * n);
+    for (size_t i = 0; i < n; ++i) {
+        points[3 * i] = cloud.getX(i);
+        points[3 * i + 1] = cloud.getY(i);
+        points[3 * i + 2] = cloud.getZ(i);
+    }
+    file << "# vtk DataFile Version 3.0\nHeat Transfer Simulation\nBINARY\nDATASET UNSTRUCTURED_GRID\n"
+         << "POINTS " << n << " double\n";
+    writeBigEndian(file, points.data(), points.size());
+    file << "\nPOINT_DATA " << n << "\n";
+    if (cloud.getPrecision() == Precision::FLOAT32) {
+        file << "SCALARS temperature float\nLOOKUP_TABLE default\n";
+        writeBigEndian(file, cloud.getTemperatures32().data(), n);
+    } else {
+        file << "SCALARS temperature double\nLOOKUP_TABLE default\n";
+        writeBigEndian(file, cloud.getTemperatures().data(), n);
+    }
+    file << "\nSCALARS material int\nLOOKUP_TABLE default\n";
+    writeBigEndian(file, reinterpret_cast<const int32_t*>(cloud.getMaterials().data()), n);
+    file << "\n";
+    if (!file) {
+        throw std::runtime_error("VTKWriter: writing " + path + " failed");
+    }
+}
+
+void VTKWriter::writeCollection(const std::string& path,
+                                const std::vector<std::pair<double, std::string>>& frames) {
+    // written next to the target and renamed over it, so a reader never sees half an index
+    auto temporary = path + ".tmp";
+    {
+        std::ofstream file(temporary, std::ios::trunc);
+        if (!file) {
+            throw std::runtime_error("VTKWriter: can't open " + temporary + " for writing");
+        }
+        file << std::setprecision(17);
+        file << "<?xml version=\"1.0\"?>\n"
+             << "<VTKFile type=\"Collection\" version=\"0.1\" byte_order=\"LittleEndian\">\n"
+             << "  <Collection>\n";
+        for (const auto& [time, name] : frames) {
+            file << "    <DataSet timestep=\"" << time << "\" group=\"\" part=\"0\" file=\"" << name << "\"/>\n";
+        }
+        file << "  </Collection>\n</VTKFile>\n";
+        if (!file) {
+            throw std::runtime_error("VTKWriter: writing " + temporary + " failed");
+        }
+    }
+    if (std::rename(temporary.c_str(), path.c_str()) != 0) {
+        throw std::runtime_error("VTKWriter: can't replace " + path);
+    }
+}
+
+VTKSeries::VTKSeries(const std::string& pvdPath, bool compress)
+    : pvdPath_(pvdPath), directory_(directoryOf(pvdPath)), compress_(compress) {
+    stem_ = pvdPath.substr(directory_.size());
+    if (stem_.size() > 4 && stem_.compare(stem_.size() - 4, 4, ".pvd") == 0) {
+        stem_.resize(stem_.size() - 4);
+    }
+    if (compress && !VTKWriter::hasCompression()) {
+        throw std::runtime_error("VTKWriter: built without zlib, compression isn't available");
+    }
+}
+
+std::string VTKSeries::addFrame(const PointCloud& cloud, double time) {
+    std::ostringstream name;
+    name << stem_ << "_" << std::setw(6) << std::setfill('0') << frames_.size() << ".vtu";
+    auto path = directory_ + name.str();
+    VTKWriter::writeVTU(cloud, path, compress_);
+    frames_.emplace_back(time, name.str());
+    VTKWriter::writeCollection(pvdPath_, frames_);
+    return path;
+}
@@ -0,0 +1,136 @@
+"""
+asyncio front end for SimulationJob: a HeatSolver run on a native worker pool, awaited and streamed from an event
+loop without executors or polling.
+
+    run = solver.run_async(600.0, report_every=0.5)
+    async for event in run:
+        print(f'{event.time:.0f} s  coffee {event.coffee:.2f} K  {event.steps_per_second:.0f} steps/s')
+    final = await run  # the last event; awaiting works without iterating too
+
+Like a Task, the run starts as soon as it is made. Progress events are the JobProgress reports of the job,
+delivered to the loop with call_soon_threadsafe; the last one (event.last) comes after the final step. run.cancel(),
+or cancelling the task that awaits or iterates the run, stops it after the step in progress. The cancellation
+propagates only once the run has stopped, so the solver can be used again right away.
+
+The loop never blocks on the job: the run resolves from the job's done callback alone, with the state and error
+read without waiting.
+
+All runs share a bounded JobPool (shared_pool) unless given their own; runs beyond its worker count wait in line.
+Each solver still uses its own OpenMP threads, so the shared pool has only SHARED_POOL_WORKERS workers; with more,
+give the solvers fewer threads (set_num_threads), as sweep.py does for its processes.
+"""
+
+import asyncio
+import threading
+
+import heat_transfer
+
+# every running solver brings its own OpenMP threads, so a few runs at a time already fill the machine
+SHARED_POOL_WORKERS = 2
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """The JobPool runs use unless given one, of SHARED_POOL_WORKERS workers, made on first use"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = heat_transfer.JobPool(SHARED_POOL_WORKERS)
+        return _shared_pool
+
+
+class AsyncRun:
+    """A solver run for duration seconds of simulated time, awaitable and async iterable over its progress"""
+
+    def __init__(self, solver, duration, report_every=1.0, pool=None):
+        self._loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue()
+        self._done = self._loop.create_future()
+        self._last = None
+        self._exhausted = False
+
+        self.job = heat_transfer.SimulationJob(solver, duration)
+        # both callbacks run on the job's thread and only hand over to the loop
+        self.job.set_progress_callback(lambda event: self._post(self._progress, event), report_every)
+        self.job.add_done_callback(lambda: self._post(self._finish))
+        self.job.start(pool if pool is not None else shared_pool())
+
+    def _post(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # the loop is closed, nobody is waiting any more
+
+    def _progress(self, event):
+        self._last = event
+        self._events.put_nowait(event)
+
+    def _finish(self):
+        # posted by the done callback, so the state is final; neither call waits for the job
+        self._events.put_nowait(None)
+        state = self.job.get_state()
+        if state == heat_transfer.JobState.CANCELLED:
+            self._done.cancel()
+            return
+        try:
+            self.job.rethrow_error()
+        except Exception as error:
+            self._done.set_exception(error)
+        else:
+            self._done.set_result(self._last)
+
+    def cancel(self):
+        """Stops the run after its current step"""
+        self.job.cancel()
+
+    def done(self):
+        return self._done.done()
+
+    async def _stop(self):
+        """Cancels the job and waits until it has stopped, whatever else happens meanwhile"""
+        self.job.cancel()
+        try:
+            await asyncio.shield(self._done)
+        except BaseException:
+            pass
+
+    async def _result(self):
+        try:
+            return await asyncio.shield(self._done)
+        except asyncio.CancelledError:
+            if not self._done.done():  # the awaiting task was cancelled, not the job
+                await self._stop()
+            raise
+
+    def __await__(self):
+        return self._result().__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._exhausted:
+            raise StopAsyncIteration
+        try:
+            event = await self._events.get()
+        except asyncio.CancelledError:
+            await self._stop()
+            raise
+        if event is None:
+            self._exhausted = True
+            # a failed run ends the iteration with its error, a cancelled one just ends it
+            if not self._done.cancelled() and self._done.exception() is not None:
+                raise self._done.exception()
+            raise StopAsyncIteration
+        return event
+
+
+def run_async(solver, duration, report_every=1.0, pool=None):
+    """
+    Starts solver on a run of duration seconds and returns its AsyncRun. report_every is the wall time between
+    progress events in seconds; pool defaults to shared_pool(). Call from a coroutine, on the loop that awaits it.
+    HeatSolver.run_async(duration, ...) is the same, bound in the extension
+    """
+    return AsyncRun(solver, duration, report_every, pool)
@@ -23,6 +23,10 @@ class HeatTransferDashboard:
         self.simulation_running = False
         self.simulation_thread = None
         self.temp_history = {'time': [], 'coffee': [], 'cup': [], 'air': []}
+        # step() runs without the GIL, so the plots never read the cloud while the simulation thread owns it:
+        # that thread takes a snapshot between steps and the callbacks read the latest one
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
         
         self.setup_layout()
         self.setup_callbacks()
@@ -191,6 +195,7 @@ class HeatTransferDashboard:
                     heat_transfer.Material.air()]
         self.solver = heat_transfer.HeatSolver(self.point_cloud, materials, 0.1)
         self.visualizer = HeatVisualizer(self.point_cloud, self.solver)
+        self.take_snapshot()
     
     def start_simulation(self):
         """Start simulation in separate thread"""
@@ -211,43 +216,44 @@ class HeatTransferDashboard:
         """Run simulation loop"""
         while self.simulation_running:
             self.solver.step()
-            
-            # Update temperature history
-            current_time = self.solver.get_current_time()
-            self.temp_history['time'].append(current_time)
-            
-            # Get average temperatures by material type
-            coffee_temp = self.solver.get_average_temperature(heat_transfer.MaterialType.COFFEE)
-            cup_temp = self.solver.get_average_temperature(heat_transfer.MaterialType.CUP_MATERIAL)
-            air_temp = self.solver.get_average_temperature(heat_transfer.MaterialType.AIR)
-            
-            self.temp_history['coffee'].append(coffee_temp)
-            self.temp_history['cup'].append(cup_temp)
-            self.temp_history['air'].append(air_temp)
+            self.take_snapshot(record_history=True)
             
             time.sleep(0.1)  # Control simulation speed
     
+    def take_snapshot(self, record_history=False):
+        """Copies the state the plots show; call only between steps, on the thread that steps the solver"""
+        snapshot = {
+            'time': self.solver.get_current_time(),
+            'temperatures': self.point_cloud.get_temperatures().copy(),
+            'max': self.solver.get_max_temperature(),
+            'min': self.solver.get_min_temperature(),
+        }
+        averages = {name: self.solver.get_average_temperature(material)
+                    for name, material in (('coffee', heat_transfer.MaterialType.COFFEE),
+                                           ('cup', heat_transfer.MaterialType.CUP_MATERIAL),
+                                           ('air', heat_transfer.MaterialType.AIR))}
+        with self.snapshot_lock:
+            self.snapshot = snapshot
+            if record_history:
+                self.temp_history['time'].append(snapshot['time'])
+                for name, value in averages.items():
+                    self.temp_history[name].append(value)
+    
+    def latest_snapshot(self):
+        with self.snapshot_lock:
+            return self.snapshot
+    
     def create_3d_plot(self):
         """Create 3D scatter plot of point cloud"""
-        points = []
-        temps = []
-        materials = []
-        
-        for i in range(self.point_cloud.size()):
-            point = self.point_cloud.get_point(i)
-            pos = point.get_position()
-            points.append([pos.x, pos.y, pos.z])
-            temps.append(point.get_temperature())
-            materials.append(int(point.get_material()))
-        
-        points = np.array(points)
-        temps = np.array(temps)
+        # the temperatures come from the latest snapshot; the geometry never changes, so it is read in place
+        temps = self.latest_snapshot()['temperatures']
+        materials = self.point_cloud.get_materials()
         
         # Create 3D scatter plot
         fig = go.Figure(data=go.Scatter3d(
-            x=points[:, 0],
-            y=points[:, 1],
-            z=points[:, 2],
+            x=self.point_cloud.get_xs(),
+            y=self.point_cloud.get_ys(),
+            z=self.point_cloud.get_zs(),
             mode='markers',
             marker=dict(
                 size=3,
@@ -276,23 +282,14 @@ class HeatTransferDashboard:
         z_target = 0.04
         tolerance = 0.005
         
-        profile_points = []
-        profile_temps = []
-        
-        for i in range(self.point_cloud.size()):
-            point = self.point_cloud.get_point(i)
-            pos = point.get_position()
-            
-            if abs(pos.z - z_target) < tolerance:
-                profile_points.append([pos.x, pos.y])
-                profile_temps.append(point.get_temperature())
+        mask = np.abs(self.point_cloud.get_zs() - z_target) < tolerance
         
-        if len(profile_points) == 0:
+        if not mask.any():
             # Return empty plot if no points found
             return go.Figure()
         
-        profile_points = np.array(profile_points)
-        profile_temps = np.array(profile_temps)
+        profile_points = np.column_stack((self.point_cloud.get_xs()[mask], self.point_cloud.get_ys()[mask]))
+        profile_temps = self.latest_snapshot()['temperatures'][mask]
         
         # Create 2D scatter plot
         fig = go.Figure(data=go.Scatter(
@@ -321,20 +318,21 @@ class HeatTransferDashboard:
         """Create statistics summary"""
         if self.solver is None:
             return html.P("No simulation running")
+        snapshot = self.latest_snapshot()
         
         stats = [
             html.H5("Current Statistics"),
             html.P([
                 html.Strong("Simulation Time: "),
-                f"{self.solver.get_current_time():.1f} seconds"
+                f"{snapshot['time']:.1f} seconds"
             ]),
             html.P([
                 html.Strong("Maximum Temperature: "),
-                f"{self.solver.get_max_temperature():.1f} K"
+                f"{snapshot['max']:.1f} K"
             ]),
             html.P([
                 html.Strong("Minimum Temperature: "),
-                f"{self.solver.get_min_temperature():.1f} K"
+                f"{snapshot['min']:.1f} K"
             ]),
             html.P([
                 html.Strong("Total Points: "),
@@ -346,27 +344,29 @@ class HeatTransferDashboard:
     
     def create_temp_history(self):
         """Create temperature history plot"""
+        with self.snapshot_lock:
+            history = {name: list(values) for name, values in self.temp_history.items()}
         fig = go.Figure()
         
         fig.add_trace(go.Scatter(
-            x=self.temp_history['time'],
-            y=self.temp_history['coffee'],
+            x=history['time'],
+            y=history['coffee'],
             mode='lines+markers',
             name='Coffee',
             line=dict(color='orange')
         ))
         
         fig.add_trace(go.Scatter(
-            x=self.temp_history['time'],
-            y=self.temp_history['cup'],
+            x=history['time'],
+            y=history['cup'],
             mode='lines+markers',
             name='Cup',
             line=dict(color='brown')
         ))
         
         fig.add_trace(go.Scatter(
-            x=self.temp_history['time'],
-            y=self.temp_history['air'],
+            x=history['time'],
+            y=history['air'],
             mode='lines+markers',
             name='Air',
             line=dict(color='lightblue')
@@ -0,0 +1,355 @@
+"""
+Domain decomposition of one cup over local worker processes.
+
+The box is cut along z into slabs of whole lattice layers, one per worker. A worker generates only its slab plus
+`ghost` layers on either side (CupParameters first_layer / last_layer), so no process ever holds the full cloud.
+Each step every worker steps its local cloud with a HeatSolver and then swaps halos with the slabs above and below:
+it sends its first and last `ghost` owned layers and overwrites its ghost layers with what the neighbors sent. The
+ghost rows are stepped with a truncated neighborhood, but they are replaced before any owned row reads them, so
+the owned points follow the single process run.
+
+    run = DecomposedRun(params, default_materials(), time_step=0.005, workers=4)
+    result = run.run(10.0)
+    print(result['time'][-1], result['coffee'][-1])
+
+Messages go through a Transport. SharedMemoryTransport passes them through one shared memory block and a barrier
+on a single machine; an MPI backed transport only has to implement exchange, allreduce and barrier.
+"""
+
+import math
+import multiprocessing
+import pickle
+import queue
+import time
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import heat_transfer
+
+try:
+    from .sweep import MATERIAL_ORDER, limit_threads
+except ImportError:  # loaded as a top level module, from the directory itself
+    from sweep import MATERIAL_ORDER, limit_threads
+
+
+class Transport(ABC):
+    """Messages between the ranks of a decomposed run. Every call is collective: all ranks make it in the same order"""
+
+    def __init__(self, rank, size):
+        self.rank = rank
+        self.size = size
+
+    @abstractmethod
+    def exchange(self, sends):
+        """Sends {rank: 1D float64 array} to linked ranks, returns {rank: array} from every rank linked to this one"""
+
+    @abstractmethod
+    def allreduce(self, values, op='sum'):
+        """Elementwise 'sum', 'max' or 'min' of values over all ranks, the same on every rank"""
+
+    @abstractmethod
+    def barrier(self):
+        """Waits for every rank"""
+
+    def abort(self):
+        """Releases the other ranks from a collective call this rank will never make"""
+
+    def close(self):
+        pass
+
+
+class SharedMemorySpec:
+    """What a worker needs to attach to a SharedMemoryTransport block, picklable for the worker processes"""
+
+    def __init__(self, name, size, links, capacity, barrier):
+        self.name = name
+        self.size = size
+        self.links = links
+        self.capacity = capacity
+        self.barrier = barrier
+
+
+class SharedMemoryTransport(Transport):
+    """
+    One float64 block holding a channel per link (source, destination) with room for capacity values, its message
+    length, and a reduction row per rank. Every collective call flips between two copies of each slot, so a rank
+    can write call t + 1 while a slower one still reads call t, and one barrier per call is enough.
+    """
+
+    REDUCE_WIDTH = 16
+
+    @staticmethod
+    def layout(links, capacity, size):
+        channels = len(links) * 2 * capacity
+        lengths = len(links) * 2
+        reduce = size * 2 * SharedMemoryTransport.REDUCE_WIDTH
+        return channels, lengths, reduce
+
+    @staticmethod
+    def create(size, links, capacity, context=None):
+        """
+        Allocates the block for size ranks. Returns the spec to hand to the workers and the block, which the caller
+        keeps open for the length of the run and then closes and unlinks
+        """
+        context = context or multiprocessing.get_context('spawn')
+        values = sum(SharedMemoryTransport.layout(links, capacity, size))
+        block = shared_memory.SharedMemory(create=True, size=max(8, 8 * values))
+        spec = SharedMemorySpec(block.name, size, list(links), capacity, context.Barrier(size))
+        return spec, block
+
+    def __init__(self, spec, rank):
+        super().__init__(rank, spec.size)
+        self._spec = spec
+        # workers are children of the process that created the block and share its resource tracker, so attaching
+        # doesn't make them unlink it when they exit
+        self._block = shared_memory.SharedMemory(name=spec.name)
+        channels, lengths, reduce = self.layout(spec.links, spec.capacity, spec.size)
+        data = np.ndarray((channels + lengths + reduce,), dtype=np.float64, buffer=self._block.buf)
+        self._channels = data[:channels].reshape(len(spec.links), 2, spec.capacity)
+        self._lengths = data[channels:channels + lengths].reshape(len(spec.links), 2)
+        self._reduce = data[channels + lengths:].reshape(spec.size, 2, self.REDUCE_WIDTH)
+        self._outgoing = {dst: k for k, (src, dst) in enumerate(spec.links) if src == rank}
+        self._incoming = {src: k for k, (src, dst) in enumerate(spec.links) if dst == rank}
+        self._calls = 0
+
+    def _parity(self):
+        self._calls += 1
+        return self._calls % 2
+
+    def exchange(self, sends):
+        parity = self._parity()
+        for dst, link in self._outgoing.items():
+            values = np.asarray(sends.get(dst, ()), dtype=np.float64)
+            if values.size > self._spec.capacity:
+                raise ValueError(f"message of {values.size} values exceeds the channel capacity "
+                                 f"{self._spec.capacity}")
+            self._channels[link, parity, :values.size] = values
+            self._lengths[link, parity] = values.size
+        self.barrier()
+        return {src: self._channels[link, parity, :int(self._lengths[link, parity])].copy()
+                for src, link in self._incoming.items()}
+
+    def allreduce(self, values, op='sum'):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size > self.REDUCE_WIDTH:
+            raise ValueError(f"allreduce takes at most {self.REDUCE_WIDTH} values")
+        parity = self._parity()
+        self._reduce[self.rank, parity, :values.size] = values
+        self.barrier()
+        # ranks are combined in order, so every rank gets the same bits
+        rows = self._reduce[:, parity, :values.size]
+        if op == 'sum':
+            return rows.sum(axis=0)
+        if op == 'max':
+            return rows.max(axis=0)
+        if op == 'min':
+            return rows.min(axis=0)
+        raise ValueError(f"unknown reduction '{op}'")
+
+    def barrier(self):
+        self._spec.barrier.wait()
+
+    def abort(self):
+        self._spec.barrier.abort()
+
+    def close(self):
+        self._channels = self._lengths = self._reduce = None
+        self._block.close()
+
+
+def ghost_layers(params, radius):
+    """Layers on each side of a slab its owned points can reach"""
+    return max(1, math.ceil(radius / params.point_spacing - 1e-9))
+
+
+def plan_slabs(layer_count, workers, ghost):
+    """[first, last) layers of each rank, as even as possible, each at least ghost layers thick"""
+    if layer_count < workers * ghost:
+        raise ValueError(f"{layer_count} layers can't be split into {workers} slabs of at least {ghost} layers")
+    bounds = [round(k * layer_count / workers) for k in range(workers + 1)]
+    return [(bounds[k], bounds[k + 1]) for k in range(workers)]
+
+
+class _Slab:
+    """The ranges of one rank's local cloud: owned points, the layers it sends, and the ghosts it receives"""
+
+    def __init__(self, cloud, spacing, first, last, ghost):
+        def start(layer):
+            return cloud.find_first_at_or_above_z((layer - 0.5) * spacing)
+
+        self.owned = (start(first), start(last))
+        self.send_down = (self.owned[0], start(first + ghost))
+        self.send_up = (start(last - ghost), self.owned[1])
+        self.ghost_down = (0, self.owned[0])
+        self.ghost_up = (self.owned[1], cloud.size())
+
+
+def _worker(rank, spec, params, materials, slabs, ghost, time_step, duration, record_steps, threads, pin,
+            return_temperatures, results):
+    transport = SharedMemoryTransport(spec, rank)
+    try:
+        limit_threads(threads, rank, pin)
+        first, last = slabs[rank]
+        layers = heat_transfer.CupGenerator.get_layer_count(params)
+        params.first_layer = max(0, first - ghost)
+        params.last_layer = min(layers, last + ghost)
+        cloud = heat_transfer.CupGenerator().generate(params)
+        slab = _Slab(cloud, params.point_spacing, first, last, ghost)
+        below = rank - 1 if rank > 0 else None
+        above = rank + 1 if rank + 1 < spec.size else None
+
+        solver = heat_transfer.HeatSolver(cloud, materials, time_step)
+        solver.set_num_threads(threads)
+
+        series = {'time': [], 'coffee': [], 'cup': [], 'air': [], 'max': [], 'min': []}
+
+        def record():
+            sums = cloud.sum_temperatures(*slab.owned)
+            totals = transport.allreduce(list(sums.weighted) + list(sums.volume))
+            extremes = transport.allreduce([sums.max, -sums.min], op='max')
+            if rank == 0:
+                series['time'].append(solver.get_current_time())
+                for m, name in enumerate(MATERIAL_ORDER):
+                    series[name].append(totals[m] / totals[3 + m] if totals[3 + m] > 0 else 0.0)
+                series['max'].append(extremes[0])
+                series['min'].append(-extremes[1])
+
+        def swap_halos():
+            sends = {}
+            if below is not None:
+                sends[below] = cloud.get_temperature_range(*slab.send_down)
+            if above is not None:
+                sends[above] = cloud.get_temperature_range(*slab.send_up)
+            received = transport.exchange(sends)
+            if below is not None:
+                cloud.set_temperature_range(slab.ghost_down[0], received[below])
+            if above is not None:
+                cloud.set_temperature_range(slab.ghost_up[0], received[above])
+
+        # every rank takes the same steps, so they stay in lockstep without asking each other
+        steps = 0
+        record()
+        while solver.get_current_time() < duration:
+            solver.step()
+            swap_halos()
+            steps += 1
+            if steps % record_steps == 0 or solver.get_current_time() >= duration:
+                record()
+
+        message = {'rank': rank, 'points': slab.owned[1] - slab.owned[0], 'local_points': cloud.size()}
+        if rank == 0:
+            message['series'] = series
+        if return_temperatures:
+            message['temperatures'] = cloud.get_temperature_range(*slab.owned)
+        results.put(message)
+    except BaseException as error:
+        transport.abort()
+        results.put({'rank': rank, 'error': f"{type(error).__name__}: {error}"})
+    finally:
+        transport.close()
+
+
+class DecomposedRun:
+    # seconds between checks that the workers are still alive while waiting for their results
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, params, materials, time_step, workers=2, threads_per_worker=1, pin_threads=True,
+                 record_interval=None, radius=0.01):
+        """
+        One cup from params stepped by workers processes with threads_per_worker OpenMP threads each. Averages are
+        recorded every record_interval seconds (every step if None); radius is the solver's neighbor cutoff,
+        which sets how many ghost layers a slab needs
+        """
+        if params.coarse_spacing > params.point_spacing:
+            raise ValueError("graded clouds can't be split into layers")
+        self.params = params
+        self.materials = materials
+        self.time_step = time_step
+        self.workers = workers
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.pin_threads = pin_threads
+        self.record_interval = record_interval
+        self.ghost = ghost_layers(params, radius)
+        self.slabs = plan_slabs(heat_transfer.CupGenerator.get_layer_count(params), workers, self.ghost)
+
+    def run(self, duration, return_temperatures=False, timeout=None):
+        """
+        Runs the cup to duration seconds. Returns the global series (time, per material averages, max and min), the
+        owned point count of every rank and, if asked, every point's final temperature in the order of the
+        single process cloud. A worker that dies without reporting fails the run with RuntimeError, and one
+        still running after timeout seconds of wall time with TimeoutError; the other workers are stopped
+        """
+        # spawned, not forked: a child forked after the parent ran OpenMP threads hangs in its first parallel region
+        context = multiprocessing.get_context('spawn')
+        capacity = self._halo_capacity()
+        links = [(k, k + 1) for k in range(self.workers - 1)] + [(k + 1, k) for k in range(self.workers - 1)]
+        spec, block = SharedMemoryTransport.create(self.workers, links, capacity, context)
+        processes = []
+        try:
+            results = context.Queue()
+            record_steps = 1 if not self.record_interval else max(1, round(self.record_interval / self.time_step))
+            processes = [context.Process(target=_worker,
+                                         args=(rank, spec, self.params, self.materials, self.slabs, self.ghost,
+                                               self.time_step, duration, record_steps, self.threads_per_worker,
+                                               self.pin_threads, return_temperatures, results))
+                         for rank in range(self.workers)]
+            for process in processes:
+                process.start()
+            messages = self._collect(processes, results, timeout)
+            for process in processes:
+                process.join()
+        except BaseException:
+            # the survivors may wait in a barrier for a rank that is gone
+            spec.barrier.abort()
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                if process.pid is not None:
+                    process.join()
+            raise
+        finally:
+            block.close()
+            block.unlink()
+
+        errors = [f"rank {m['rank']}: {m['error']}" for m in messages if 'error' in m]
+        if errors:
+            raise RuntimeError("decomposed run failed: " + "; ".join(errors))
+
+        result = dict(messages[0]['series'])
+        result['points'] = [m['points'] for m in messages]
+        if return_temperatures:
+            result['temperatures'] = np.concatenate([m['temperatures'] for m in messages])
+        return result
+
+    def _collect(self, processes, results, timeout):
+        """The message of every rank in rank order, waiting POLL_INTERVAL at a time and checking on the workers"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        messages = {}
+        # a worker puts its message before it exits, so one may be dead with its message still in the pipe; it
+        # counts as lost only if it is still missing after another poll
+        missing = set()
+        while len(messages) < len(processes):
+            try:
+                message = results.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                dead = {rank for rank, process in enumerate(processes)
+                        if rank not in messages and not process.is_alive()}
+                lost = sorted(dead & missing)
+                if lost:
+                    codes = ", ".join(f"rank {rank} exit code {processes[rank].exitcode}" for rank in lost)
+                    raise RuntimeError(f"decomposed run failed: workers died without a result ({codes})")
+                missing = dead
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"decomposed run took longer than {timeout} s")
+                continue
+            messages[message['rank']] = message
+        return [messages[rank] for rank in sorted(messages)]
+
+    def _halo_capacity(self):
+        """Values in the largest halo: ghost layers of a full lattice layer (a layer without air has fewer points)"""
+        params = pickle.loads(pickle.dumps(self.params))
+        params.include_air = True
+        params.first_layer, params.last_layer = 0, 1
+        return heat_transfer.CupGenerator().generate(params).size() * self.ghost
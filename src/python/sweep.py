@@ -0,0 +1,219 @@
+"""
+Parameter sweeps: every combination of a grid of CupParameters fields and a set of material variants, run in
+worker processes, with each run's summary time series streamed back as it finishes.
+
+    sweep = ParameterSweep({'coffee_temp': [353.15, 363.15], 'point_spacing': [0.005, 0.004]},
+                           materials={'ceramic': default_materials()},
+                           duration=60.0, results_path='sweep.jsonl')
+    for result in sweep.run():
+        print(result['params'], result['coffee'][-1])
+
+Every worker gets threads_per_worker OpenMP threads (and, where the OS allows it, its own cores), so the pool
+doesn't oversubscribe the machine. Workers are spawned, not forked, so none inherits a copy of the parent's OpenMP
+runtime. Results are appended to results_path as one JSON line per run, enum fields such as precision by name;
+running the same sweep again skips the runs already in the file, so an interrupted sweep resumes where it stopped.
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import heat_transfer
+
+# materials are indexed by MaterialType
+MATERIAL_ORDER = ('coffee', 'cup', 'air')
+
+
+def default_materials():
+    """The coffee, ceramic and air the examples use"""
+    return [heat_transfer.Material.coffee(),
+            heat_transfer.Material.ceramic(),
+            heat_transfer.Material.air()]
+
+
+def expand_grid(grid):
+    """Every combination of the grid's values, as a list of {field: value} dicts in a stable order"""
+    fields = sorted(grid)
+    return [dict(zip(fields, values)) for values in itertools.product(*(grid[f] for f in fields))]
+
+
+def _is_enum(value):
+    return hasattr(type(value), '__members__')
+
+
+def _json_default(value):
+    """Writes the bound enums (Precision, ...) by name"""
+    if _is_enum(value):
+        return value.name
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def to_json(value, **kwargs):
+    """json.dumps that also takes the bound enums"""
+    return json.dumps(value, default=_json_default, **kwargs)
+
+
+def run_key(params, material_name):
+    """Identifies a run in the results file"""
+    return to_json({'params': params, 'materials': material_name}, sort_keys=True)
+
+
+def make_parameters(params):
+    """CupParameters with the given fields set; enum fields also take the name, as the results file has it"""
+    cup = heat_transfer.CupParameters()
+    for field, value in params.items():
+        if not hasattr(cup, field):
+            raise ValueError(f"CupParameters has no field '{field}'")
+        current = getattr(cup, field)
+        if isinstance(value, str) and _is_enum(current):
+            value = type(current).__members__[value]
+        setattr(cup, field, value)
+    return cup
+
+
+def simulate(params, materials, duration, time_step=None, record_interval=1.0, num_threads=1):
+    """
+    Runs one cup and returns its summary: the average temperature of each material every record_interval
+    seconds. Without a time_step the run takes the fewest equal steps per record interval that stay under 0.9 of
+    the explicit stability limit
+    """
+    cloud = heat_transfer.CupGenerator().generate(make_parameters(params))
+    solver = heat_transfer.HeatSolver(cloud, materials, time_step or record_interval)
+    if time_step is None:
+        # the neighbor lists stay in the cloud, so the second solver only reassembles the operator
+        time_step = record_interval / max(1, math.ceil(record_interval / (0.9 * solver.get_stable_time_step())))
+        solver = heat_transfer.HeatSolver(cloud, materials, time_step)
+    solver.set_num_threads(num_threads)
+
+    summary = {'time': [], 'coffee': [], 'cup': [], 'air': []}
+
+    def record():
+        summary['time'].append(solver.get_current_time())
+        for index, name in enumerate(MATERIAL_ORDER):
+            summary[name].append(solver.get_average_temperature(heat_transfer.MaterialType(index)))
+
+    start = time.perf_counter()
+    record()
+    # each record comes after a whole number of steps, the nearest to its time, so no time comparison can land a
+    # step early or late
+    records = math.ceil(duration / record_interval - 1e-9)
+    taken = 0
+    for k in range(1, records + 1):
+        target = max(taken, round(min(k * record_interval, duration) / time_step))
+        for _ in range(target - taken):
+            solver.step()
+        taken = target
+        record()
+    summary['points'] = cloud.size()
+    summary['time_step'] = time_step
+    summary['wall_time'] = time.perf_counter() - start
+    return summary
+
+
+# per worker state, set by _init_worker
+_worker_threads = 1
+
+
+def limit_threads(threads, index, pin=True):
+    """
+    Where the OS allows it and pin is set, limits the calling worker process to the index-th block of threads
+    cores, so index = 0, 1, ... spread a pool over the machine. The thread count itself reaches the solvers through
+    set_num_threads: the OpenMP runtime is already loaded with heat_transfer, so OMP_NUM_THREADS would come too late
+    """
+    if pin and hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        if len(cpus) >= threads:
+            first = (index * threads) % len(cpus)
+            os.sched_setaffinity(0, [cpus[(first + k) % len(cpus)] for k in range(threads)])
+
+
+def _init_worker(threads, pin, counter):
+    """Limits the worker to its share of the machine before it runs anything"""
+    global _worker_threads
+    _worker_threads = threads
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    limit_threads(threads, index, pin)
+
+
+def _run(spec):
+    params, material_name, materials, duration, time_step, record_interval = spec
+    result = simulate(params, materials, duration, time_step, record_interval, _worker_threads)
+    result['params'] = params
+    result['materials'] = material_name
+    return result
+
+
+class ParameterSweep:
+    def __init__(self, grid, materials=None, duration=60.0, time_step=None, record_interval=1.0,
+                 workers=None, threads_per_worker=1, pin_threads=True, results_path=None):
+        """
+        grid maps CupParameters field names to the values to try, materials maps a variant name to a list of
+        three Materials (coffee, cup, air). workers defaults to the cores available divided by threads_per_worker
+        """
+        self.grid = grid
+        self.materials = materials or {'default': default_materials()}
+        self.duration = duration
+        self.time_step = time_step
+        self.record_interval = record_interval
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        self.pin_threads = pin_threads
+        self.results_path = results_path
+
+    def runs(self):
+        """(params, material name) of every run in the sweep"""
+        return [(params, name) for params in expand_grid(self.grid) for name in self.materials]
+
+    def completed(self):
+        """Keys of the runs already in the results file"""
+        done = set()
+        if not self.results_path or not os.path.exists(self.results_path):
+            return done
+        with open(self.results_path) as results:
+            for line in results:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short when the last sweep was interrupted
+                done.add(run_key(result['params'], result['materials']))
+        return done
+
+    def run(self):
+        """Yields each run's result dict as soon as it finishes, skipping runs already in the results file"""
+        done = self.completed()
+        pending = [(params, name) for params, name in self.runs() if run_key(params, name) not in done]
+        if not pending:
+            return
+
+        context = multiprocessing.get_context('spawn')
+        counter = context.Value('i', 0)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.threads_per_worker, self.pin_threads, counter)) as pool:
+            futures = [pool.submit(_run, (params, name, self.materials[name], self.duration, self.time_step,
+                                          self.record_interval))
+                       for params, name in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                if self.results_path:
+                    with open(self.results_path, 'a') as results:
+                        results.write(to_json(result) + '\n')
+                yield result
+
+
+def load_results(path):
+    """Every complete result in a sweep's results file"""
+    loaded = []
+    with open(path) as results:
+        for line in results:
+            try:
+                loaded.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return loaded
@@ -11,26 +11,24 @@ class HeatVisualizer:
         self.solver = solver
         self.plotter = None
         
+    def _view_cloud(self):
+        """The cloud as shown in 3D: axisymmetric clouds are swept back around the z axis"""
+        if self.point_cloud.is_axisymmetric():
+            return self.point_cloud.revolve()
+        return self.point_cloud
+        
     def setup_3d_viewer(self):
         """Setup PyVista 3D viewer"""
         self.plotter = pv.Plotter()
+        view = self._view_cloud()
         
-        # Extract points and temperatures
-        points = np.array([[self.point_cloud.get_point(i).get_position().x,
-                           self.point_cloud.get_point(i).get_position().y,
-                           self.point_cloud.get_point(i).get_position().z]
-                          for i in range(self.point_cloud.size())])
-        
-        temperatures = np.array([self.point_cloud.get_point(i).get_temperature()
-                               for i in range(self.point_cloud.size())])
-        
-        materials = np.array([int(self.point_cloud.get_point(i).get_material())
-                            for i in range(self.point_cloud.size())])
+        # Zero-copy views of the cloud's arrays; PyVista wants the points interleaved, so that's the one copy
+        points = np.column_stack((view.get_xs(), view.get_ys(), view.get_zs()))
         
         # Create point cloud
         cloud = pv.PolyData(points)
-        cloud["temperature"] = temperatures
-        cloud["material"] = materials
+        cloud["temperature"] = view.get_temperatures()
+        cloud["material"] = view.get_materials()
         
         # Add to plotter with color mapping
         self.plotter.add_mesh(cloud, 
@@ -63,9 +61,8 @@ class HeatVisualizer:
             # Update simulation
             self.solver.step()
             
-            # Update temperatures
-            temperatures = np.array([self.point_cloud.get_point(i).get_temperature()
-                                   for i in range(self.point_cloud.size())])
+            # Update temperatures (a step swaps the buffers, so the view is taken again every frame)
+            temperatures = self._view_cloud().get_temperatures()
             
             # Update visualization
             plotter.update_scalars(temperatures)
@@ -87,30 +84,18 @@ class HeatVisualizer:
         fig, ax = plt.subplots(figsize=(10, 6))
         
         # Extract points and temperatures
-        points = []
-        temps = []
-        materials = []
-        
-        for i in range(self.point_cloud.size()):
-            point = self.point_cloud.get_point(i)
-            pos = point.get_position()
-            
-            if axis == 'z':
-                coord = pos.z
-            elif axis == 'y':
-                coord = pos.y  
-            else:
-                coord = pos.x
-                
-            points.append(coord)
-            temps.append(point.get_temperature())
-            materials.append(point.get_material())
+        if axis == 'z':
+            points = self.point_cloud.get_zs()
+        elif axis == 'y':
+            points = self.point_cloud.get_ys()
+        else:
+            points = self.point_cloud.get_xs()
         
         # Sort by coordinate
         sorted_indices = np.argsort(points)
-        points = np.array(points)[sorted_indices]
-        temps = np.array(temps)[sorted_indices]
-        materials = np.array(materials)[sorted_indices]
+        points = points[sorted_indices]
+        temps = self.point_cloud.get_temperatures()[sorted_indices]
+        materials = self.point_cloud.get_materials()[sorted_indices]
         
         # Plot temperature profile
         scatter = ax.scatter(points, temps, c=materials, cmap='tab10', alpha=0.7)
@@ -129,29 +114,13 @@ class HeatVisualizer:
         """Create cross-section visualization"""
         # Filter points near the specified plane
         tolerance = 0.005  # 5mm tolerance
-        filtered_points = []
-        filtered_temps = []
-        filtered_materials = []
+        coords = {'x': self.point_cloud.get_xs(), 'y': self.point_cloud.get_ys(), 'z': self.point_cloud.get_zs()}
+        # the axis the plane cuts: xy is at a z offset, xz at a y offset, yz at an x offset
+        normal = ({'x', 'y', 'z'} - set(plane[:2])).pop()
+        mask = np.abs(coords[normal] - offset) < tolerance
         
-        for i in range(self.point_cloud.size()):
-            point = self.point_cloud.get_point(i)
-            pos = point.get_position()
-            
-            if plane == 'xy' and abs(pos.z - offset) < tolerance:
-                filtered_points.append([pos.x, pos.y])
-                filtered_temps.append(point.get_temperature())
-                filtered_materials.append(point.get_material())
-            elif plane == 'xz' and abs(pos.y - offset) < tolerance:
-                filtered_points.append([pos.x, pos.z])
-                filtered_temps.append(point.get_temperature())
-                filtered_materials.append(point.get_material())
-            elif plane == 'yz' and abs(pos.x - offset) < tolerance:
-                filtered_points.append([pos.y, pos.z])
-                filtered_temps.append(point.get_temperature())
-                filtered_materials.append(point.get_material())
-        
-        filtered_points = np.array(filtered_points)
-        filtered_temps = np.array(filtered_temps)
+        filtered_points = np.column_stack((coords[plane[0]][mask], coords[plane[1]][mask]))
+        filtered_temps = self.point_cloud.get_temperatures()[mask]
         
         # Create scatter plot
         fig, ax = plt.subplots(figsize=(8, 8))
@@ -181,23 +150,20 @@ class HeatVisualizer:
         
         fig, ax = plt.subplots(figsize=(10, 6))
         
+        xs, ys, zs = self.point_cloud.get_xs(), self.point_cloud.get_ys(), self.point_cloud.get_zs()
+        materials = self.point_cloud.get_materials()
+        temperatures = self.point_cloud.get_temperatures()
+        
         # This would need to be implemented to track temperature history
         # For now, plot current temperatures
         for point_info in monitor_points:
-            # Find closest point to specified position
-            min_dist = float('inf')
-            closest_temp = 0
-            
-            for i in range(self.point_cloud.size()):
-                point = self.point_cloud.get_point(i)
-                pos = point.get_position()
-                dist = ((pos.x - point_info['pos'][0])**2 + 
-                       (pos.y - point_info['pos'][1])**2 + 
-                       (pos.z - point_info['pos'][2])**2)**0.5
-                
-                if dist < min_dist and point.get_material() == point_info['material']:
-                    min_dist = dist
-                    closest_temp = point.get_temperature()
+            # Find closest point of the material to specified position
+            dist = np.sqrt((xs - point_info['pos'][0])**2 +
+                           (ys - point_info['pos'][1])**2 +
+                           (zs - point_info['pos'][2])**2)
+            dist[materials != int(point_info['material'])] = np.inf
+            closest = int(np.argmin(dist)) if len(dist) else None
+            closest_temp = temperatures[closest] if closest is not None and np.isfinite(dist[closest]) else 0
             
             # Plot single point for now (would need history tracking)
             ax.plot([0], [closest_temp], 'o-', label=point_info['name'])
@@ -208,5 +174,5 @@ class HeatVisualizer:
         ax.legend()
         ax.grid(True, alpha=0.3)
         
-        plt://tight_layout()
+        plt.tight_layout()
         return fig, ax
\ No newline at end of file
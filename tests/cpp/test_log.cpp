@@ -0,0 +1,32 @@
+#include <gtest/gtest.h>
+#include "Log.hpp"
+#include <utility>
+#include <vector>
+
+TEST(LogTest, MessagesBelowLevelAreNotFormatted) {
+    std::vector<std::pair<LogLevel, std::string>> captured;
+    Log::setSink([&captured](LogLevel level, const std::string& message) {
+        captured.emplace_back(level, message);
+    });
+    Log::setLevel(LogLevel::WARNING);
+
+    int formatted = 0;
+    auto count = [&formatted]() { return ++formatted; };
+    HEAT_LOG(LogLevel::INFO, "skipped " << count());
+    HEAT_LOG(LogLevel::WARNING, "kept " << count());
+
+    Log::resetSink();
+    EXPECT_EQ(formatted, 1);
+    ASSERT_EQ(captured.size(), 1u);
+    EXPECT_EQ(captured[0].first, LogLevel::WARNING);
+    EXPECT_EQ(captured[0].second, "kept 1");
+}
+
+TEST(LogTest, ProgressReporterIsRateLimited) {
+    ProgressReporter everyHour(3600.0);
+    EXPECT_FALSE(everyHour.due());
+
+    ProgressReporter always(0.0);
+    EXPECT_TRUE(always.due());
+    EXPECT_TRUE(always.due());
+}
@@ -0,0 +1,80 @@
+#include <gtest/gtest.h>
+#include "CellList.hpp"
+#include "KDTreeIndex.hpp"
+#include "CupGenerator.hpp"
+#include <cmath>
+
+namespace {
+
+std::vector<size_t> bruteForceNeighbors(const PointCloud& cloud, size_t i, double radius) {
+    std::vector<size_t> result;
+    for (size_t j = 0; j < cloud.size(); ++j) {
+        if (i == j) continue;
+        double dx = cloud.getX(j) - cloud.getX(i);
+        double dy = cloud.getY(j) - cloud.getY(i);
+        double dz = cloud.getZ(j) - cloud.getZ(i);
+        if (withinCutoff(std::sqrt(dx*dx + dy*dy + dz*dz), radius)) {
+            result.push_back(j);
+        }
+    }
+    return result;
+}
+
+}  // namespace
+
+TEST(NeighborTest, CellListMatchesBruteForce) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = 0.02;
+    PointCloud cloud = generator.generate(params);
+
+    CellList cells(cloud, 0.03);
+    cells.buildNeighbors(cloud, 0.03);
+
+    ASSERT_TRUE(cloud.hasNeighborLists());
+    for (size_t i = 0; i < cloud.size(); i += 7) {
+        EXPECT_EQ(cloud.getNeighbors(i), bruteForceNeighbors(cloud, i, 0.03));
+    }
+}
+
+TEST(NeighborTest, AddingPointInvalidatesLists) {
+    PointCloud cloud;
+    cloud.addPoint(0.0, 0.0, 0.0, 300.0, MaterialType::AIR);
+    cloud.addPoint(0.005, 0.0, 0.0, 300.0, MaterialType::AIR);
+
+    CellList(cloud, 0.01).buildNeighbors(cloud, 0.01);
+    EXPECT_EQ(cloud.getNeighbors(0), std::vector<size_t>{1});
+
+    cloud.addPoint(0.0, 0.005, 0.0, 300.0, MaterialType::AIR);
+    EXPECT_FALSE(cloud.hasNeighborLists());
+}
+
+TEST(NeighborTest, KDTreeMatchesCellListOnJitteredCloud) {
+    PointCloud cloud;
+    unsigned state = 12345;
+    auto jitter = [&state]() {
+        state = state * 1103515245u + 12345u;
+        return ((state >> 8) % 1000) / 1000.0 * 0.004 - 0.002;
+    };
+    for (int i = 0; i < 12; ++i)
+        for (int j = 0; j < 12; ++j)
+            for (int k = 0; k < 12; ++k)
+                cloud.addPoint(i * 0.005 + jitter(), j * 0.005 + jitter(), k * 0.005 + jitter(), 300.0, MaterialType::AIR);
+
+    PointCloud copy = cloud;
+    CellList(cloud, 0.01).buildNeighbors(cloud, 0.01);
+    KDTreeIndex(copy).buildNeighbors(copy, 0.01);
+
+    for (size_t i = 0; i < cloud.size(); ++i) {
+        EXPECT_EQ(copy.getPoint(i).getNeighborIndices(), cloud.getNeighbors(i));
+    }
+}
+
+TEST(NeighborTest, KDTreeRejectsMismatchedCloud) {
+    PointCloud cloud;
+    cloud.addPoint(0.0, 0.0, 0.0, 300.0, MaterialType::AIR);
+    KDTreeIndex index(cloud);
+
+    PointCloud other;
+    EXPECT_THROW(index.buildNeighbors(other, 0.01), std::invalid_argument);
+}
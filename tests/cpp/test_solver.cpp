@@ -0,0 +1,808 @@
+#include <gtest/gtest.h>
+#include "HeatSolver.hpp"
+#include "Checkpoint.hpp"
+#include "CupGenerator.hpp"
+#include "EnsembleSolver.hpp"
+#include "SimulationJob.hpp"
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <cstdio>
+#include <fstream>
+#include <iterator>
+#include <memory>
+#include <stdexcept>
+#include <thread>
+#include <utility>
+
+namespace {
+
+std::vector<Material> defaultMaterials() {
+    return {Material::Coffee(), Material::Ceramic(), Material::Air()};
+}
+
+PointCloud smallCup(double spacing = 0.008) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = spacing;
+    return generator.generate(params);
+}
+
+}  // namespace
+
+TEST(SolverTest, OperatorRowsMatchNeighborLists) {
+    PointCloud cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+
+    const auto& op = solver.getConductanceOperator();
+    ASSERT_EQ(op.rows(), cloud.size());
+    for (size_t i = 0; i < cloud.size(); i += 97) {
+        const auto& neighbors = cloud.getNeighbors(i);
+        auto begin = op.getRowPointers()[i];
+        ASSERT_EQ(static_cast<size_t>(op.getRowPointers()[i + 1] - begin), neighbors.size());
+        for (size_t k = 0; k < neighbors.size(); ++k) {
+            EXPECT_EQ(static_cast<size_t>(op.getColumnIndices()[begin + k]), neighbors[k]);
+            EXPECT_GT(op.getWeights()[begin + k], 0.0);
+        }
+    }
+}
+
+TEST(SolverTest, OperatorRebuildsWhenMaterialsChange) {
+    PointCloud cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+
+    double before = solver.getConductanceOperator().getWeights()[0];
+    solver.setMaterials({Material::Coffee(), Material::Ceramic(), Material(1.2, 1005.0, 0.05, 293.15)});
+    double after = solver.getConductanceOperator().getWeights()[0];
+
+    EXPECT_NE(before, after);
+}
+
+TEST(SolverTest, CoffeeCoolsAndHeatIsConserved) {
+    PointCloud cloud = smallCup();
+    auto materials = defaultMaterials();
+    HeatSolver solver(cloud, materials, 0.01);
+
+    auto energy = [&]() {
+        double total = 0.0;
+        for (size_t i = 0; i < cloud.size(); ++i) {
+            const Material& mat = materials[static_cast<int>(cloud.getMaterial(i))];
+            total += mat.getDensity() * mat.getSpecificHeat() * cloud.getTemperature(i);
+        }
+        return total;
+    };
+
+    double initialCoffee = solver.getAverageTemperature(MaterialType::COFFEE);
+    double initialEnergy = energy();
+    for (int k = 0; k < 20; ++k) {
+        solver.step();
+    }
+
+    EXPECT_LT(solver.getAverageTemperature(MaterialType::COFFEE), initialCoffee);
+    EXPECT_NEAR(energy(), initialEnergy, 1e-9 * initialEnergy);
+}
+
+TEST(SolverTest, DeterministicModeIgnoresThreadCount) {
+    auto run = [](int threads) {
+        PointCloud cloud = smallCup(0.006);
+        HeatSolver solver(cloud, defaultMaterials(), 0.01);
+        solver.setNumThreads(threads);
+        solver.setDeterministic(true);
+        for (int k = 0; k < 5; ++k) {
+            solver.step();
+        }
+        return std::make_pair(solver.getAverageTemperature(MaterialType::AIR), cloud.getTemperatures());
+    };
+
+    auto single = run(1);
+    auto multi = run(4);
+    EXPECT_EQ(single.first, multi.first);
+    EXPECT_EQ(single.second, multi.second);
+}
+
+TEST(SolverTest, BackwardEulerIsStableForLargeSteps) {
+    PointCloud cloud = smallCup(0.004);
+    HeatSolver solver(cloud, defaultMaterials(), 5.0, Integrator::BACKWARD_EULER);
+
+    for (int k = 0; k < 10; ++k) {
+        solver.step();
+    }
+
+    // a diverging explicit run would blow far past these bounds at this step size
+    EXPECT_LE(solver.getMaxTemperature(), 383.15 + 1e-6);
+    EXPECT_GE(solver.getMinTemperature(), 293.15 - 1e-6);
+    EXPECT_LT(solver.getAverageTemperature(MaterialType::COFFEE), 383.15);
+}
+
+TEST(SolverTest, CrankNicolsonIsMoreAccurateThanBackwardEuler) {
+    PointCloud reference = smallCup();
+    PointCloud trapezoid = reference;
+    PointCloud backward = reference;
+    HeatSolver referenceSolver(reference, defaultMaterials(), 1e-5);
+    HeatSolver trapezoidSolver(trapezoid, defaultMaterials(), 1e-3, Integrator::CRANK_NICOLSON);
+    HeatSolver backwardSolver(backward, defaultMaterials(), 1e-3, Integrator::BACKWARD_EULER);
+    trapezoidSolver.setSolverTolerance(1e-14);
+    backwardSolver.setSolverTolerance(1e-14);
+
+    for (int k = 0; k < 1000; ++k) {
+        referenceSolver.step();
+    }
+    for (int k = 0; k < 10; ++k) {
+        trapezoidSolver.step();
+        backwardSolver.step();
+    }
+
+    double trapezoidError = 0.0, backwardError = 0.0;
+    for (size_t i = 0; i < reference.size(); ++i) {
+        trapezoidError = std::max(trapezoidError, std::abs(trapezoid.getTemperature(i) - reference.getTemperature(i)));
+        backwardError = std::max(backwardError, std::abs(backward.getTemperature(i) - reference.getTemperature(i)));
+    }
+    EXPECT_LT(trapezoidError, 0.01);
+    EXPECT_LT(trapezoidError, backwardError);
+}
+
+TEST(SolverTest, AdaptiveRunStaysStableAndLandsOnEndTime) {
+    PointCloud cloud = smallCup(0.004);
+    // 1 s is orders of magnitude above the explicit limit at this spacing
+    HeatSolver solver(cloud, defaultMaterials(), 1.0);
+    solver.setAdaptiveTimeStep(true, 0.5);
+
+    double limit = solver.getStableTimeStep();
+    solver.run_for_time(0.5);
+
+    EXPECT_EQ(solver.getCurrentTime(), 0.5);
+    double total = 0.0;
+    for (double dt : solver.getStepSizes()) {
+        EXPECT_LE(dt, limit);
+        total += dt;
+    }
+    EXPECT_NEAR(total, 0.5, 1e-12);
+    EXPECT_LE(solver.getMaxTemperature(), 383.15 + 1e-6);
+    EXPECT_GE(solver.getMinTemperature(), 293.15 - 1e-6);
+}
+
+TEST(SolverTest, AdaptiveImplicitStepsGrowAsGradientsDecay) {
+    PointCloud cloud = smallCup(0.008);
+    HeatSolver solver(cloud, defaultMaterials(), 0.01, Integrator::BACKWARD_EULER);
+    solver.setAdaptiveTimeStep(true, 0.5);
+
+    solver.run_for_time(60.0);
+
+    const auto& steps = solver.getStepSizes();
+    ASSERT_GT(steps.size(), 2u);
+    EXPECT_GT(steps[steps.size() - 2], 10.0 * steps.front());
+    EXPECT_EQ(solver.getCurrentTime(), 60.0);
+}
+
+TEST(SolverTest, StepSwapsBuffersWithoutReallocating) {
+    auto cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 1e-3);
+
+    solver.step();
+    const double* front = cloud.getTemperatures().data();
+    const double* back = cloud.getNextTemperatures().data();
+
+    solver.step();
+    EXPECT_EQ(cloud.getTemperatures().data(), back);
+    EXPECT_EQ(cloud.getNextTemperatures().data(), front);
+    EXPECT_EQ(cloud.getPoint(0).getTemperature(), cloud.getTemperature(0));
+    EXPECT_NE(cloud.getTemperature(0), 0.0);
+}
+
+TEST(SolverTest, SimdKernelMatchesScalar) {
+    auto cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 1e-3);
+    const auto& op = solver.getConductanceOperator();
+
+    std::vector<double> scalar(cloud.size()), simd(cloud.size());
+    op.applyScalar(cloud.getTemperatures().data(), scalar.data(), 1e-3);
+    op.apply(cloud.getTemperatures().data(), simd.data(), 1e-3);
+    for (size_t i = 0; i < cloud.size(); ++i) {
+        EXPECT_NEAR(simd[i], scalar[i], 1e-9);
+    }
+}
+
+TEST(SolverTest, SinglePrecisionTracksDoublePrecision) {
+    auto cloud = smallCup();
+    cloud.setPrecision(Precision::FLOAT32);
+    EXPECT_TRUE(cloud.getTemperatures().empty());
+    ASSERT_EQ(cloud.getTemperatures32().size(), cloud.size());
+
+    HeatSolver solver(cloud, defaultMaterials(), 1e-3);
+    double before = solver.getAverageTemperature(MaterialType::COFFEE);
+    solver.run_for_time(0.05);
+    EXPECT_LT(solver.getAverageTemperature(MaterialType::COFFEE), before);
+
+    auto drift = measurePrecisionDrift(smallCup(), defaultMaterials(), 1e-3, 0.05);
+    EXPECT_EQ(drift.steps, 50u);
+    EXPECT_GT(drift.maxDifference, 0.0);
+    EXPECT_LT(drift.maxDifference, 0.05);
+    EXPECT_LE(drift.rmsDifference, drift.maxDifference);
+}
+
+TEST(SolverTest, StructuredGridMatchesPointCloudBackend) {
+    // 8 mm spacing gives the 7-point stencil; at 5 mm the 1 cm cutoff also reaches edge, corner and
+    // second face neighbors, some of them exactly on the cutoff
+    for (auto [spacing, stencil] : {std::make_pair(0.008, size_t{6}), std::make_pair(0.005, size_t{32})}) {
+        auto gridCloud = smallCup(spacing);
+        auto pointCloud = gridCloud;
+
+        HeatSolver gridSolver(gridCloud, defaultMaterials(), 1e-3);
+        HeatSolver pointSolver(pointCloud, defaultMaterials(), 1e-3);
+        gridSolver.setBackend(Backend::STRUCTURED_GRID);
+        pointSolver.setBackend(Backend::POINT_CLOUD);
+
+        ASSERT_TRUE(gridSolver.usesStructuredGrid());
+        EXPECT_EQ(gridSolver.getStructuredGrid().getStencilSize(), stencil);
+        EXPECT_FALSE(pointSolver.usesStructuredGrid());
+        EXPECT_NEAR(gridSolver.getStableTimeStep(), pointSolver.getStableTimeStep(), 1e-12);
+
+        gridSolver.run_for_time(0.02);
+        pointSolver.run_for_time(0.02);
+        double worst = 0.0;
+        for (size_t i = 0; i < gridCloud.size(); ++i) {
+            worst = std::max(worst, std::abs(gridCloud.getTemperature(i) - pointCloud.getTemperature(i)));
+        }
+        EXPECT_LT(worst, 1e-9) << "spacing " << spacing;
+    }
+}
+
+TEST(SolverTest, StructuredGridAppliesSurfaceSinks) {
+    // air-free cups aren't complete boxes, so give some points of the full lattice an exposed face instead
+    auto gridCloud = smallCup();
+    for (size_t i = 0; i < gridCloud.size(); i += 7) {
+        gridCloud.setSurfaceArea(i, 1.0);
+    }
+    auto pointCloud = gridCloud;
+    auto insulatedCloud = gridCloud;
+    ASSERT_TRUE(gridCloud.hasSurfaceAreas());
+
+    HeatSolver gridSolver(gridCloud, defaultMaterials(), 1e-3);
+    HeatSolver pointSolver(pointCloud, defaultMaterials(), 1e-3);
+    HeatSolver insulatedSolver(insulatedCloud, defaultMaterials(), 1e-3);
+    gridSolver.setBackend(Backend::STRUCTURED_GRID);
+    pointSolver.setBackend(Backend::POINT_CLOUD);
+    for (HeatSolver* solver : {&gridSolver, &pointSolver}) {
+        solver->setSurfaceHeatTransfer(50.0, 0.9);
+    }
+    insulatedSolver.setSurfaceHeatTransfer(0.0, 0.0);
+
+    ASSERT_TRUE(gridSolver.usesStructuredGrid());
+    ASSERT_TRUE(insulatedSolver.usesStructuredGrid());
+    EXPECT_NEAR(gridSolver.getStableTimeStep(), pointSolver.getStableTimeStep(), 1e-12);
+
+    gridSolver.run_for_time(0.05);
+    pointSolver.run_for_time(0.05);
+    insulatedSolver.run_for_time(0.05);
+    double worst = 0.0;
+    for (size_t i = 0; i < gridCloud.size(); ++i) {
+        worst = std::max(worst, std::abs(gridCloud.getTemperature(i) - pointCloud.getTemperature(i)));
+    }
+    EXPECT_LT(worst, 1e-9);
+    EXPECT_LT(gridSolver.getAverageTemperature(MaterialType::COFFEE),
+              insulatedSolver.getAverageTemperature(MaterialType::COFFEE) - 1e-6);
+}
+
+TEST(SolverTest, StructuredGridRejectsIrregularClouds) {
+    PointCloud cloud;
+    cloud.addPoint(0.0, 0.0, 0.0, 300.0, MaterialType::AIR);
+    cloud.addPoint(0.005, 0.0, 0.0, 310.0, MaterialType::AIR);
+    cloud.addPoint(0.0, 0.006, 0.001, 320.0, MaterialType::AIR);
+
+    HeatSolver solver(cloud, defaultMaterials(), 1e-3);
+    EXPECT_FALSE(solver.usesStructuredGrid());
+    solver.step();  // AUTO falls back to the point cloud
+
+    solver.setBackend(Backend::STRUCTURED_GRID);
+    EXPECT_THROW(solver.step(), std::invalid_argument);
+}
+
+TEST(SolverTest, GradedCupConservesHeatAndTracksUniformCloud) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = 0.005;
+    auto uniform = generator.generate(params);
+    params.coarseSpacing = 0.02;
+    auto graded = generator.generate(params);
+
+    ASSERT_TRUE(graded.hasPointScales());
+    EXPECT_LT(graded.size() * 2, uniform.size());
+
+    auto materials = defaultMaterials();
+    auto energy = [&](const PointCloud& cloud) {
+        double total = 0.0;
+        for (size_t i = 0; i < cloud.size(); ++i) {
+            const Material& mat = materials[static_cast<int>(cloud.getMaterial(i))];
+            double s = cloud.getPointScale(i);
+            total += mat.getDensity() * mat.getSpecificHeat() * s * s * s * cloud.getTemperature(i);
+        }
+        return total;
+    };
+
+    HeatSolver uniformSolver(uniform, materials, 0.005);
+    HeatSolver gradedSolver(graded, materials, 0.005);
+    EXPECT_FALSE(gradedSolver.usesStructuredGrid());
+    EXPECT_NEAR(gradedSolver.getAverageTemperature(MaterialType::COFFEE),
+                uniformSolver.getAverageTemperature(MaterialType::COFFEE), 1e-9);
+
+    double initialEnergy = energy(graded);
+    uniformSolver.run_for_time(2.0);
+    gradedSolver.run_for_time(2.0);
+
+    EXPECT_NEAR(energy(graded), initialEnergy, 1e-9 * initialEnergy);
+    // the coffee has cooled ~5 K and the cup warmed ~25 K by now
+    EXPECT_NEAR(gradedSolver.getAverageTemperature(MaterialType::COFFEE),
+                uniformSolver.getAverageTemperature(MaterialType::COFFEE), 0.1);
+    EXPECT_NEAR(gradedSolver.getAverageTemperature(MaterialType::CUP_MATERIAL),
+                uniformSolver.getAverageTemperature(MaterialType::CUP_MATERIAL), 1.0);
+}
+
+TEST(SolverTest, ActiveSetSkipsIdleAirAndTracksFullSteps) {
+    auto full = smallCup(0.005);
+    auto active = smallCup(0.005);
+    auto materials = defaultMaterials();
+    HeatSolver fullSolver(full, materials, 0.005);
+    HeatSolver activeSolver(active, materials, 0.005);
+    activeSolver.setActiveSetStepping(true, 0.0);
+
+    fullSolver.run_for_time(0.5);
+    activeSolver.run_for_time(0.5);
+
+    // the first step computes everything, after that only the interfaces and the air around them until the
+    // heat spreads; a zero tolerance only skips points whose step is a no-op
+    const auto& counts = activeSolver.getActiveCounts();
+    ASSERT_EQ(counts.size(), 100u);
+    EXPECT_EQ(counts[0], active.size());
+    EXPECT_LT(counts[1] * 10, active.size() * 6);
+    EXPECT_GT(counts.back(), counts[1]);
+    for (size_t i = 0; i < full.size(); ++i) {
+        ASSERT_NEAR(active.getTemperature(i), full.getTemperature(i), 1e-9);
+    }
+
+    // editing temperatures behind the solver's back needs a reset, after which idle points wake up again
+    active.setTemperature(0, 350.0);
+    activeSolver.resetActiveSet();
+    activeSolver.step();
+    EXPECT_LT(active.getTemperature(0), 350.0);
+}
+
+TEST(SolverTest, ActiveSetPicksUpTemperaturesEditedMidRun) {
+    auto full = smallCup();
+    auto active = smallCup();
+    HeatSolver fullSolver(full, defaultMaterials(), 0.005);
+    HeatSolver activeSolver(active, defaultMaterials(), 0.005);
+    activeSolver.setActiveSetStepping(true, 0.0);
+    fullSolver.run_for_time(0.1);
+    activeSolver.run_for_time(0.1);
+
+    // the topmost point is air far from the cup, idle by now; no reset, the edit alone has to wake it up
+    size_t idle = active.size() - 1;
+    ASSERT_LT(activeSolver.getActiveCount(), active.size());
+    for (auto* cloud : {&full, &active}) {
+        cloud->setTemperature(idle, 330.0);
+        double band[2] = {320.0, 320.0};
+        cloud->assignTemperatures(idle - 2, band, 2);
+    }
+    fullSolver.run_for_time(0.1);
+    activeSolver.run_for_time(0.1);
+
+    EXPECT_LT(active.getTemperature(idle), 330.0);
+    for (size_t i = 0; i < full.size(); ++i) {
+        ASSERT_NEAR(active.getTemperature(i), full.getTemperature(i), 1e-9) << "point " << i;
+    }
+}
+
+TEST(SolverTest, AirFreeCupLosesHeatThroughItsSurface) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = 0.005;
+    auto withAir = generator.generate(params);
+    params.includeAir = false;
+    auto cup = generator.generate(params);
+
+    ASSERT_TRUE(cup.hasSurfaceAreas());
+    EXPECT_LT(cup.size() * 2, withAir.size());
+    size_t exposed = 0;
+    for (size_t i = 0; i < cup.size(); ++i) {
+        ASSERT_NE(cup.getMaterial(i), MaterialType::AIR);
+        exposed += cup.getSurfaceArea(i) > 0.0;
+    }
+    EXPECT_GT(exposed, 0u);
+    EXPECT_LT(exposed, cup.size() / 2);
+
+    auto materials = defaultMaterials();
+    auto energy = [&](const PointCloud& cloud) {
+        double total = 0.0;
+        for (size_t i = 0; i < cloud.size(); ++i) {
+            const Material& mat = materials[static_cast<int>(cloud.getMaterial(i))];
+            total += mat.getDensity() * mat.getSpecificHeat() * cloud.getTemperature(i);
+        }
+        return total;
+    };
+
+    // with the surface switched off nothing leaves the cup
+    auto insulated = cup;
+    HeatSolver insulatedSolver(insulated, materials, 0.05);
+    insulatedSolver.setSurfaceHeatTransfer(0.0, 0.0);
+    double initialEnergy = energy(insulated);
+    insulatedSolver.run_for_time(1.0);
+    EXPECT_NEAR(energy(insulated), initialEnergy, 1e-9 * initialEnergy);
+
+    // the ambient comes from the air material, and without air points the step can be ~40x longer
+    HeatSolver surfaceSolver(cup, materials, 0.05);
+    HeatSolver airSolver(withAir, materials, 0.005);
+    EXPECT_DOUBLE_EQ(surfaceSolver.getAmbientTemperature(), Material::Air().getAmbientTemperature());
+    EXPECT_GT(surfaceSolver.getStableTimeStep(), 20.0 * airSolver.getStableTimeStep());
+    surfaceSolver.run_for_time(5.0);
+    airSolver.run_for_time(5.0);
+    EXPECT_LT(energy(cup), initialEnergy);
+    EXPECT_NEAR(surfaceSolver.getAverageTemperature(MaterialType::COFFEE),
+                airSolver.getAverageTemperature(MaterialType::COFFEE), 0.5);
+    EXPECT_NEAR(surfaceSolver.getAverageTemperature(MaterialType::CUP_MATERIAL),
+                airSolver.getAverageTemperature(MaterialType::CUP_MATERIAL), 1.0);
+
+    // backward Euler sees the same sink
+    auto implicitCup = generator.generate(params);
+    HeatSolver implicitSolver(implicitCup, materials, 0.5, Integrator::BACKWARD_EULER);
+    implicitSolver.run_for_time(5.0);
+    EXPECT_NEAR(implicitSolver.getAverageTemperature(MaterialType::COFFEE),
+                surfaceSolver.getAverageTemperature(MaterialType::COFFEE), 0.5);
+}
+
+TEST(SolverTest, AxisymmetricCupTracksTheFullCloud) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = 0.005;
+    params.includeAir = false;
+    auto full = generator.generate(params);
+    params.axisymmetric = true;
+    auto rings = generator.generate(params);
+
+    ASSERT_TRUE(rings.isAxisymmetric());
+    EXPECT_LT(rings.size() * 20, full.size());
+    EXPECT_NEAR(rings.getRingFactor(0), kPi / 4.0, 1e-12);  // the axis is a disc
+    EXPECT_NEAR(rings.revolve().size(), full.size(), full.size() / 50.0);
+
+    auto materials = defaultMaterials();
+    auto energy = [&](const PointCloud& cloud) {
+        double total = 0.0;
+        for (size_t i = 0; i < cloud.size(); ++i) {
+            const Material& mat = materials[static_cast<int>(cloud.getMaterial(i))];
+            total += mat.getDensity() * mat.getSpecificHeat() * cloud.getVolumeFactor(i) * cloud.getTemperature(i);
+        }
+        return total;
+    };
+
+    auto insulated = rings;
+    HeatSolver insulatedSolver(insulated, materials, 0.05);
+    insulatedSolver.setSurfaceHeatTransfer(0.0, 0.0);
+    double initialEnergy = energy(insulated);
+    insulatedSolver.run_for_time(2.0);
+    EXPECT_NEAR(energy(insulated), initialEnergy, 1e-9 * initialEnergy);
+
+    HeatSolver fullSolver(full, materials, 0.2);
+    HeatSolver ringSolver(rings, materials, 0.15);
+    EXPECT_FALSE(ringSolver.usesStructuredGrid());
+    fullSolver.run_for_time(20.0);
+    ringSolver.run_for_time(20.0);
+    EXPECT_NEAR(ringSolver.getAverageTemperature(MaterialType::COFFEE),
+                fullSolver.getAverageTemperature(MaterialType::COFFEE), 0.5);
+    EXPECT_NEAR(ringSolver.getAverageTemperature(MaterialType::CUP_MATERIAL),
+                fullSolver.getAverageTemperature(MaterialType::CUP_MATERIAL), 1.0);
+}
+
+TEST(SolverTest, EnsembleMatchesSeparateSolvers) {
+    CupGenerator generator;
+    CupGenerator::Parameters params;
+    params.pointSpacing = 0.005;
+    params.includeAir = false;
+    auto cloud = generator.generate(params);
+    auto materials = defaultMaterials();
+
+    // a hotter pour, and a cup with twice the conductivity
+    auto variant = materials;
+    const Material& ceramic = materials[static_cast<int>(MaterialType::CUP_MATERIAL)];
+    variant[static_cast<int>(MaterialType::CUP_MATERIAL)] =
+        Material(ceramic.getDensity(), ceramic.getSpecificHeat(), 2.0 * ceramic.getThermalConductivity(),
+                 ceramic.getAmbientTemperature());
+
+    const double dt = 0.1;
+    EnsembleSolver ensemble(cloud, materials, dt);
+    ensemble.addScenario();
+    auto hot = ensemble.addScenario();
+    auto conductive = ensemble.addScenario(variant);
+    ensemble.setTemperature(hot, MaterialType::COFFEE, 368.15);
+    ensemble.setRecordInterval(5);
+    ensemble.run_for_time(2.0);
+
+    ASSERT_EQ(ensemble.getScenarioCount(), 3u);
+    const auto& series = ensemble.getAverageTemperatureSeries(MaterialType::COFFEE);
+    ASSERT_EQ(ensemble.getTimes().size(), 5u);  // the start and every 5th of 20 steps
+    ASSERT_EQ(series.size(), 15u);
+    EXPECT_NEAR(series[hot], 368.15, 1e-9);
+
+    auto hotCloud = cloud;
+    for (size_t i = 0; i < hotCloud.size(); ++i) {
+        if (hotCloud.getMaterial(i) == MaterialType::COFFEE) hotCloud.setTemperature(i, 368.15);
+    }
+    auto baseCloud = cloud, variantCloud = cloud;
+    HeatSolver base(baseCloud, materials, dt), hotSolver(hotCloud, materials, dt), variantSolver(variantCloud, variant, dt);
+    base.run_for_time(2.0);
+    hotSolver.run_for_time(2.0);
+    variantSolver.run_for_time(2.0);
+
+    HeatSolver* separate[] = {&base, &hotSolver, &variantSolver};
+    PointCloud* clouds[] = {&baseCloud, &hotCloud, &variantCloud};
+    for (size_t s = 0; s < 3; ++s) {
+        auto column = ensemble.getTemperatures(s);
+        double maxDifference = 0.0;
+        for (size_t i = 0; i < column.size(); ++i) {
+            maxDifference = std::max(maxDifference, std::abs(column[i] - clouds[s]->getTemperature(i)));
+        }
+        EXPECT_LT(maxDifference, 1e-9) << "scenario " << s;
+        EXPECT_NEAR(series[4 * 3 + s], separate[s]->getAverageTemperature(MaterialType::COFFEE), 1e-9);
+    }
+    EXPECT_LT(ensemble.getAverageTemperature(conductive, MaterialType::COFFEE),
+              ensemble.getAverageTemperature(0, MaterialType::COFFEE));
+}
+
+TEST(SolverTest, CheckpointRestartMatchesUninterruptedRun) {
+    auto materials = defaultMaterials();
+    auto path = testing::TempDir() + "solver_checkpoint.bin";
+
+    // an active set with a tolerance, whose skipped rows live in the back buffer, and a single precision
+    // implicit run with a surface loss
+    for (int variant = 0; variant < 2; ++variant) {
+        PointCloud cloud = smallCup(0.006);
+        HeatSolver solver(cloud, materials, 0.005);
+        if (variant == 0) {
+            solver.setActiveSetStepping(true, 1e-4);
+        } else {
+            CupGenerator::Parameters params;
+            params.pointSpacing = 0.006;
+            params.includeAir = false;
+            cloud = CupGenerator().generate(params);
+            cloud.setPrecision(Precision::FLOAT32);
+            solver.setIntegrator(Integrator::CRANK_NICOLSON);
+            solver.setSurfaceHeatTransfer(15.0);
+        }
+        for (int s = 0; s < 40; ++s) solver.step();
+        solver.saveCheckpoint(path);
+        for (int s = 0; s < 40; ++s) solver.step();
+
+        PointCloud restored;
+        HeatSolver restart(restored, materials, 1.0);
+        restart.loadCheckpoint(path);
+        ASSERT_EQ(restored.size(), cloud.size());
+        EXPECT_EQ(restored.getPrecision(), cloud.getPrecision());
+        EXPECT_EQ(restart.getIntegrator(), solver.getIntegrator());
+        EXPECT_EQ(restart.getTimeStep(), 0.005);
+        EXPECT_TRUE(restart.getConductanceOperator().isCurrent(restored));
+        for (int s = 0; s < 40; ++s) restart.step();
+
+        EXPECT_EQ(restart.getCurrentTime(), solver.getCurrentTime());
+        for (size_t i = 0; i < cloud.size(); ++i) {
+            ASSERT_EQ(restored.getTemperature(i), cloud.getTemperature(i)) << "variant " << variant << " point " << i;
+        }
+    }
+
+    // a cloud checkpoint holds no solver state
+    PointCloud cloud = smallCup();
+    cloud.saveCheckpoint(path);
+    PointCloud copy;
+    copy.loadCheckpoint(path);
+    EXPECT_EQ(copy.size(), cloud.size());
+    HeatSolver solver(copy, materials, 0.01);
+    EXPECT_THROW(solver.loadCheckpoint(path), std::runtime_error);
+    std::remove(path.c_str());
+}
+
+TEST(SolverTest, FailedCheckpointLoadLeavesTheSolverAlone) {
+    auto materials = defaultMaterials();
+    auto path = testing::TempDir() + "good_checkpoint.bin";
+    auto cutPath = testing::TempDir() + "cut_checkpoint.bin";
+
+    PointCloud saved = smallCup(0.006);
+    HeatSolver savedSolver(saved, materials, 0.005);
+    savedSolver.setActiveSetStepping(true, 1e-4);
+    for (int s = 0; s < 6; ++s) savedSolver.step();
+    savedSolver.saveCheckpoint(path);
+
+    // a save that dies half way leaves the last good checkpoint, and no temporary file
+    {
+        CheckpointWriter interrupted(path, CHECKPOINT_CLOUD);
+        interrupted.write(1.0);
+    }
+    EXPECT_FALSE(std::ifstream(path + ".tmp").good());
+
+    std::ifstream in(path, std::ios::binary);
+    std::vector<char> bytes((std::istreambuf_iterator<char>(in)), std::istreambuf_iterator<char>());
+    ASSERT_GT(bytes.size(), 100u);
+
+    PointCloud cloud = smallCup();
+    PointCloud twin = cloud;
+    HeatSolver solver(cloud, materials, 0.01);
+    HeatSolver twinSolver(twin, materials, 0.01);
+    solver.setActiveSetStepping(true, 0.0);
+    twinSolver.setActiveSetStepping(true, 0.0);
+    for (int s = 0; s < 3; ++s) {
+        solver.step();
+        twinSolver.step();
+    }
+
+    // cut inside the cloud section, and by one byte at the end of the active set
+    for (size_t keep : {bytes.size() / 2, bytes.size() - 1}) {
+        {
+            std::ofstream out(cutPath, std::ios::binary | std::ios::trunc);
+            out.write(bytes.data(), static_cast<std::streamsize>(keep));
+        }
+        EXPECT_THROW(solver.loadCheckpoint(cutPath), std::runtime_error) << keep;
+        ASSERT_EQ(cloud.size(), twin.size());
+        EXPECT_EQ(solver.getCurrentTime(), twinSolver.getCurrentTime());
+        EXPECT_EQ(solver.getTimeStep(), 0.01);
+        EXPECT_TRUE(solver.getConductanceOperator().isCurrent(cloud));
+    }
+    solver.step();
+    twinSolver.step();
+    EXPECT_EQ(cloud.getTemperatures(), twin.getTemperatures());
+
+    // and the untouched checkpoint still loads
+    solver.loadCheckpoint(path);
+    EXPECT_EQ(cloud.size(), saved.size());
+    EXPECT_EQ(solver.getCurrentTime(), savedSolver.getCurrentTime());
+    std::remove(path.c_str());
+    std::remove(cutPath.c_str());
+}
+
+TEST(SolverTest, FrameRecorderWritesFramesInTheBackground) {
+    PointCloud cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+    auto path = testing::TempDir() + "frames.bin";
+
+    std::vector<std::vector<double>> expected;
+    {
+        FrameRecorder recorder(path, cloud, 2, QueueOverflow::BLOCK);
+        solver.setFrameRecorder(&recorder, 5);
+        for (int s = 1; s <= 30; ++s) {
+            solver.step();
+            if (s % 5 == 0) expected.push_back(cloud.getTemperatures());
+        }
+        solver.setFrameRecorder(nullptr);
+        recorder.flush();
+        EXPECT_EQ(recorder.getWrittenFrames(), expected.size());
+        EXPECT_EQ(recorder.getDroppedFrames(), 0u);
+    }
+
+    FrameReader reader(path);
+    ASSERT_EQ(reader.getPointCount(), cloud.size());
+    ASSERT_EQ(reader.getFrameCount(), expected.size());
+    EXPECT_EQ(reader.getZs(), cloud.getZs());
+    EXPECT_EQ(reader.getMaterials(), cloud.getMaterials());
+    // frames read back in any order
+    for (size_t k : {size_t(3), size_t(0), size_t(5)}) {
+        EXPECT_NEAR(reader.getTime(k), 0.05 * (k + 1), 1e-12);
+        EXPECT_EQ(reader.getTemperatures(k), expected[k]);
+    }
+    EXPECT_THROW(reader.getTime(expected.size()), std::out_of_range);
+    std::remove(path.c_str());
+}
+
+TEST(SolverTest, ClosedFrameRecorderLeavesTheRunAlone) {
+    PointCloud cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+    auto path = testing::TempDir() + "closed_frames.bin";
+
+    FrameRecorder recorder(path, cloud, 1, QueueOverflow::BLOCK);
+    solver.setFrameRecorder(&recorder);
+    solver.step();
+    // concurrent closes all return once the file is complete, and only one of them joins the writer
+    std::vector<std::thread> closers;
+    for (int t = 0; t < 4; ++t) {
+        closers.emplace_back([&recorder] { recorder.close(); });
+    }
+    for (auto& closer : closers) {
+        closer.join();
+    }
+    EXPECT_TRUE(recorder.isClosed());
+    recorder.flush();
+
+    // steps after the close commit as usual and record nothing
+    solver.step();
+    EXPECT_NEAR(solver.getCurrentTime(), 0.02, 1e-12);
+    EXPECT_FALSE(recorder.record(cloud, solver.getCurrentTime()));
+    EXPECT_EQ(recorder.getWrittenFrames(), 1u);
+    EXPECT_EQ(FrameReader(path).getFrameCount(), 1u);
+    solver.setFrameRecorder(nullptr);
+    std::remove(path.c_str());
+}
+
+TEST(SolverTest, SimulationJobRunsAndCancelsInTheBackground) {
+    PointCloud cloud = smallCup();
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+    PointCloud reference = cloud;
+    HeatSolver inline_(reference, defaultMaterials(), 0.01);
+    inline_.run_for_time(0.5);
+
+    bool called = false;
+    {
+        SimulationJob job(solver, 0.5);
+        job.addDoneCallback([&called] { called = true; });
+        job.start();
+        job.join();
+        EXPECT_EQ(job.getState(), JobState::FINISHED);
+        EXPECT_EQ(job.getProgress(), 1.0);
+        EXPECT_EQ(job.getSteps(), 50u);
+        EXPECT_TRUE(called);
+    }
+    // the same steps as on the calling thread
+    EXPECT_EQ(cloud.getTemperatures(), reference.getTemperatures());
+
+    // cancelled between two steps, leaving a time the solver carries on from
+    SimulationJob endless(solver, 1e9);
+    endless.start();
+    endless.cancel();
+    EXPECT_TRUE(endless.wait(30.0));
+    EXPECT_EQ(endless.getState(), JobState::CANCELLED);
+    EXPECT_LT(endless.getProgress(), 1.0);
+    EXPECT_NEAR(solver.getCurrentTime(), 0.5 + 0.01 * static_cast<double>(endless.getSteps()), 1e-9);
+    EXPECT_THROW(endless.start(), std::logic_error);
+}
+
+TEST(SolverTest, JobPoolRunsQueuedJobsInTurn) {
+    PointCloud first = smallCup(), second = smallCup(), third = smallCup();
+    HeatSolver a(first, defaultMaterials(), 0.01);
+    HeatSolver b(second, defaultMaterials(), 0.01);
+    HeatSolver c(third, defaultMaterials(), 0.01);
+
+    std::vector<JobProgress> reports;
+    std::atomic<bool> released{false};
+    JobPool pool(1);
+    SimulationJob running(a, 0.2), waiting(b, 0.2), dropped(c, 0.2);
+    running.setProgressCallback([&reports, &released](const JobProgress& progress) {
+        while (!released.load()) {
+            std::this_thread::yield();  // holds the only worker until the queue has been checked
+        }
+        reports.push_back(progress);
+    }, 0.0);
+    running.start(pool);
+    waiting.start(pool);
+    dropped.start(pool);
+    EXPECT_EQ(waiting.getState(), JobState::QUEUED);
+    dropped.cancel();
+    EXPECT_EQ(dropped.getState(), JobState::CANCELLED);
+    released.store(true);
+
+    running.join();
+    waiting.join();
+    EXPECT_EQ(running.getState(), JobState::FINISHED);
+    EXPECT_EQ(waiting.getState(), JobState::FINISHED);
+    EXPECT_EQ(c.getCurrentTime(), 0.0);
+    EXPECT_EQ(first.getTemperatures(), second.getTemperatures());
+
+    // a report after every step, plus the last one
+    ASSERT_EQ(reports.size(), running.getSteps() + 1);
+    EXPECT_TRUE(reports.back().last);
+    EXPECT_EQ(reports.back().steps, running.getSteps());
+    EXPECT_NEAR(reports.back().coffee, a.getAverageTemperature(MaterialType::COFFEE), 1e-12);
+}
+
+TEST(SolverTest, PoolJobsCanBeDestroyedAsSoonAsTheyAreDone) {
+    PointCloud cloud = smallCup(0.02);
+    HeatSolver solver(cloud, defaultMaterials(), 0.01);
+    JobPool pool(2);
+    // a worker still inside finish after wait returned would write to a freed job
+    for (int k = 0; k < 200; ++k) {
+        auto job = std::make_unique<SimulationJob>(solver, 0.01);
+        auto called = std::make_shared<std::atomic<bool>>(false);
+        job->addDoneCallback([called] {
+            std::this_thread::yield();
+            called->store(true);
+        });
+        job->start(pool);
+        ASSERT_TRUE(job->wait());
+        EXPECT_TRUE(job->isDone());
+        EXPECT_TRUE(called->load());  // waiters wake only after the done callbacks ran
+        job.reset();
+    }
+    EXPECT_NEAR(solver.getCurrentTime(), 2.0, 1e-9);
+}
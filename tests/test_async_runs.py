@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+import heat_transfer
+from heat_transfer.async_runs import AsyncRun, run_async
+
+
+def small_solver():
+    params = heat_transfer.CupParameters()
+    params.point_spacing = 0.008
+    params.include_air = False
+    materials = [heat_transfer.Material.coffee(), heat_transfer.Material.ceramic(), heat_transfer.Material.air()]
+    return heat_transfer.HeatSolver(heat_transfer.CupGenerator().generate(params), materials, 0.01)
+
+
+class TestAsyncRuns(unittest.IsolatedAsyncioTestCase):
+    async def test_progress_events_end_with_the_result(self):
+        solver = small_solver()
+        run = solver.run_async(0.5, report_every=0.0)
+        self.assertIsInstance(run, AsyncRun)
+        events = [event async for event in run]
+        self.assertEqual(len(events), 51)  # every step, then the last report
+        self.assertTrue(events[-1].last)
+        self.assertEqual([e.steps for e in events[:3]], [1, 2, 3])
+        final = await run
+        self.assertAlmostEqual(final.time, 0.5)
+        self.assertEqual(final.coffee, solver.get_average_temperature(heat_transfer.MaterialType.COFFEE))
+
+    async def test_cancelling_the_task_stops_the_run(self):
+        solver = small_solver()
+        run = solver.run_async(1e9, report_every=0.0)
+        task = asyncio.create_task(_await(run))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        # stopped, not just abandoned: the solver is left alone
+        self.assertEqual(run.job.get_state(), heat_transfer.JobState.CANCELLED)
+        stopped_at = solver.get_current_time()
+        await asyncio.sleep(0.05)
+        self.assertEqual(solver.get_current_time(), stopped_at)
+
+    async def test_failed_run_raises_its_error(self):
+        solver = small_solver()
+        solver.set_backend(heat_transfer.Backend.STRUCTURED_GRID)  # an air-free cup is no complete box
+        run = run_async(solver, 0.5)  # the function form of solver.run_async
+        with self.assertRaises(ValueError):
+            await run
+        self.assertEqual(run.job.get_state(), heat_transfer.JobState.FAILED)
+
+
+async def _await(run):
+    return await run
+
+
+if __name__ == '__main__':
+    unittest.main()
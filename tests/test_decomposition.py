@@ -0,0 +1,95 @@
+import os
+import unittest
+from multiprocessing import shared_memory
+from unittest import mock
+
+import numpy as np
+
+import heat_transfer
+from heat_transfer import decomposition
+from heat_transfer.decomposition import DecomposedRun, SharedMemoryTransport, plan_slabs
+
+
+def default_materials():
+    return [heat_transfer.Material.coffee(), heat_transfer.Material.ceramic(), heat_transfer.Material.air()]
+
+
+def crashing_worker(rank, *args):
+    """Stands in for the worker of rank 1: gone without a message or cleanup, while rank 0 waits in a barrier"""
+    if rank == 1:
+        os._exit(3)
+    decomposition._worker(rank, *args)
+
+
+class TestDecomposition(unittest.TestCase):
+    def test_slabs_cover_every_layer(self):
+        slabs = plan_slabs(31, 4, 2)
+        self.assertEqual(slabs[0][0], 0)
+        self.assertEqual(slabs[-1][1], 31)
+        for (first, last), (next_first, _) in zip(slabs, slabs[1:]):
+            self.assertEqual(last, next_first)
+            self.assertGreaterEqual(last - first, 2)
+        with self.assertRaises(ValueError):
+            plan_slabs(5, 4, 2)
+
+    def check_matches_single_process(self, include_air, time_step):
+        params = heat_transfer.CupParameters()
+        params.point_spacing = 0.005
+        params.include_air = include_air
+        materials = default_materials()
+
+        run = DecomposedRun(params, materials, time_step, workers=3, record_interval=10 * time_step)
+        result = run.run(20 * time_step, return_temperatures=True)
+
+        cloud = heat_transfer.CupGenerator().generate(params)
+        solver = heat_transfer.HeatSolver(cloud, materials, time_step)
+        solver.run(20 * time_step)
+        expected = np.array([cloud.get_temperature(i) for i in range(cloud.size())])
+
+        self.assertEqual(sum(result['points']), cloud.size())
+        self.assertEqual(len(result['time']), 3)
+        np.testing.assert_allclose(result['temperatures'], expected, rtol=0, atol=1e-9)
+        self.assertAlmostEqual(result['coffee'][-1],
+                               solver.get_average_temperature(heat_transfer.MaterialType.COFFEE), places=9)
+        self.assertAlmostEqual(result['max'][-1], solver.get_max_temperature(), places=9)
+
+    def test_box_lattice_matches_single_process(self):
+        self.check_matches_single_process(include_air=True, time_step=0.005)
+
+    def test_cup_without_air_matches_single_process(self):
+        self.check_matches_single_process(include_air=False, time_step=0.2)
+
+    def test_dead_worker_fails_the_run_and_frees_the_block(self):
+        params = heat_transfer.CupParameters()
+        params.point_spacing = 0.01
+        create = SharedMemoryTransport.create
+        blocks = []
+
+        def recording_create(*args):
+            spec, block = create(*args)
+            blocks.append(block.name)
+            return spec, block
+
+        run = DecomposedRun(params, default_materials(), 0.005, workers=2)
+        # the spawned workers import crashing_worker from this module and the real _worker from theirs
+        with mock.patch.object(decomposition, '_worker', crashing_worker), \
+                mock.patch.object(SharedMemoryTransport, 'create', staticmethod(recording_create)):
+            with self.assertRaisesRegex(RuntimeError, 'rank 1 exit code 3'):
+                run.run(1.0)
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=blocks[0])
+
+    def test_runs_after_the_parent_used_openmp_threads(self):
+        params = heat_transfer.CupParameters()
+        params.point_spacing = 0.01
+        parent = heat_transfer.HeatSolver(heat_transfer.CupGenerator().generate(params), default_materials(), 0.01)
+        parent.set_num_threads(4)
+        parent.step()
+
+        run = DecomposedRun(params, default_materials(), 0.01, workers=2, threads_per_worker=2)
+        result = run.run(0.05, timeout=60)
+        self.assertAlmostEqual(result['time'][-1], 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
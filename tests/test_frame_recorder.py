@@ -0,0 +1,60 @@
+import gc
+import os
+import tempfile
+import unittest
+import weakref
+
+import heat_transfer
+
+
+def small_cloud():
+    params = heat_transfer.CupParameters()
+    params.point_spacing = 0.008
+    params.include_air = False
+    return heat_transfer.CupGenerator().generate(params)
+
+
+def materials():
+    return [heat_transfer.Material.coffee(), heat_transfer.Material.ceramic(), heat_transfer.Material.air()]
+
+
+class TestFrameRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def recorder(self, cloud, name):
+        return heat_transfer.FrameRecorder(os.path.join(self.directory.name, name), cloud)
+
+    def test_solver_keeps_only_the_attached_recorder_alive(self):
+        cloud = small_cloud()
+        solver = heat_transfer.HeatSolver(cloud, materials(), 0.01)
+        first = self.recorder(cloud, "first.frames")
+        solver.set_frame_recorder(first)
+        first_ref = weakref.ref(first)
+        del first
+        gc.collect()
+        self.assertIsNotNone(first_ref())  # still attached
+
+        second = self.recorder(cloud, "second.frames")
+        solver.set_frame_recorder(second, interval=2)
+        gc.collect()
+        self.assertIsNone(first_ref())  # replaced, so released
+
+        solver.step()
+        solver.step()
+        second.flush()
+        self.assertEqual(second.get_written_frames(), 1)
+
+        second_ref = weakref.ref(second)
+        del second
+        solver.set_frame_recorder(None)
+        gc.collect()
+        self.assertIsNone(second_ref())
+        solver.step()  # detached, nothing to record into
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import heat_transfer
+from heat_transfer.sweep import ParameterSweep, default_materials, expand_grid, load_results, make_parameters, run_key
+
+
+class TestSweep(unittest.TestCase):
+    def test_parameters_and_materials_pickle(self):
+        params = heat_transfer.CupParameters()
+        params.coffee_temp = 350.0
+        params.include_air = False
+        copy = pickle.loads(pickle.dumps(params))
+        self.assertEqual(copy.coffee_temp, 350.0)
+        self.assertFalse(copy.include_air)
+
+        material = pickle.loads(pickle.dumps(heat_transfer.Material.ceramic()))
+        self.assertEqual(material.get_thermal_conductivity(),
+                         heat_transfer.Material.ceramic().get_thermal_conductivity())
+
+    def test_grid_expands_every_combination(self):
+        runs = expand_grid({'coffee_temp': [350.0, 360.0], 'point_spacing': [0.02, 0.01, 0.005]})
+        self.assertEqual(len(runs), 6)
+        self.assertIn({'coffee_temp': 360.0, 'point_spacing': 0.01}, runs)
+
+    def test_enum_fields_are_keyed_by_name(self):
+        params = {'precision': heat_transfer.Precision.FLOAT32, 'point_spacing': 0.01}
+        self.assertEqual(run_key(params, 'default'),
+                         run_key({'precision': 'FLOAT32', 'point_spacing': 0.01}, 'default'))
+        self.assertEqual(make_parameters({'precision': 'FLOAT32'}).precision, heat_transfer.Precision.FLOAT32)
+
+    def test_sweep_streams_results_and_resumes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.jsonl')
+            sweep = ParameterSweep({'coffee_temp': [353.15, 363.15], 'point_spacing': [0.01],
+                                    'include_air': [False]},
+                                   duration=2.0, record_interval=1.0, workers=2, results_path=path)
+            results = list(sweep.run())
+            self.assertEqual(len(results), 2)
+            for result in results:
+                self.assertEqual(len(result['time']), 3)
+                self.assertAlmostEqual(result['time'][-1], 2.0)
+                self.assertEqual(len(result['coffee']), len(result['time']))
+                self.assertAlmostEqual(result['coffee'][0], result['params']['coffee_temp'])
+
+            # a second run finds both in the file and has nothing left to do
+            self.assertEqual(list(sweep.run()), [])
+            self.assertEqual(len(load_results(path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import gc
+import unittest
+
+import numpy as np
+
+import heat_transfer
+
+
+def small_cup():
+    params = heat_transfer.CupParameters()
+    params.point_spacing = 0.008
+    params.include_air = False
+    return heat_transfer.CupGenerator().generate(params)
+
+
+class TestPointCloudViews(unittest.TestCase):
+    def test_views_share_the_cloud_memory(self):
+        cloud = small_cup()
+        n = cloud.size()
+        xs, temperatures = cloud.get_xs(), cloud.get_temperatures(writable=True)
+        self.assertEqual(xs.shape, (n,))
+        self.assertEqual(cloud.get_materials().dtype, np.int32)
+        self.assertEqual(xs[5], cloud.get_x(5))
+        # the same buffer every time, not a fresh copy
+        self.assertEqual(cloud.get_xs().ctypes.data, xs.ctypes.data)
+
+        temperatures[3] = 351.0
+        self.assertEqual(cloud.get_temperature(3), 351.0)
+        with self.assertRaises(ValueError):
+            xs[0] = 1.0
+        with self.assertRaises(ValueError):
+            cloud.get_temperatures()[0] = 1.0
+
+    def test_view_keeps_the_cloud_alive(self):
+        cloud = small_cup()
+        expected = [cloud.get_z(i) for i in range(cloud.size())]
+        zs = cloud.get_zs()
+        del cloud
+        gc.collect()
+        self.assertEqual(list(zs), expected)
+
+    def test_writes_through_a_view_reach_active_set_steps(self):
+        materials = [heat_transfer.Material.coffee(), heat_transfer.Material.ceramic(), heat_transfer.Material.air()]
+        clouds = [small_cup(), small_cup()]
+        solvers = [heat_transfer.HeatSolver(cloud, materials, 0.005) for cloud in clouds]
+        solvers[1].set_active_set_stepping(True, 0.0)
+        for solver in solvers:
+            solver.run(0.1)
+        for cloud in clouds:
+            view = cloud.get_temperatures(writable=True)
+            view[-1] = 330.0  # idle air at the top
+            del view
+        for solver in solvers:
+            solver.run(0.1)
+        np.testing.assert_allclose(clouds[1].get_temperatures(), clouds[0].get_temperatures(), atol=1e-9)
+        self.assertLess(clouds[1].get_temperature(clouds[1].size() - 1), 330.0)
+
+
+class TestBulkConstruction(unittest.TestCase):
+    def test_from_arrays_matches_add_point(self):
+        xyz = np.random.default_rng(3).random((50, 3))
+        temperature = np.linspace(290.0, 360.0, 50)
+        material = np.arange(50, dtype=np.int64) % 3
+        bulk = heat_transfer.PointCloud.from_arrays(xyz, temperature, material)
+        bulk.extend(xyz[:4], 300.0, heat_transfer.MaterialType.AIR)
+
+        single = heat_transfer.PointCloud()
+        for (x, y, z), temp, mat in zip(xyz, temperature, material):
+            single.add_point(x, y, z, temp, heat_transfer.MaterialType(int(mat)))
+        for x, y, z in xyz[:4]:
+            single.add_point(x, y, z, 300.0, heat_transfer.MaterialType.AIR)
+
+        self.assertEqual(bulk.size(), 54)
+        np.testing.assert_array_equal(bulk.get_zs(), single.get_zs())
+        np.testing.assert_array_equal(bulk.get_temperatures(), single.get_temperatures())
+        np.testing.assert_array_equal(bulk.get_materials(), single.get_materials())
+
+    def test_bad_arrays_are_rejected_whole(self):
+        cloud = heat_transfer.PointCloud()
+        with self.assertRaises(TypeError):
+            cloud.extend(np.zeros((2, 3)), 300.0, np.zeros(2))  # float material codes
+        with self.assertRaises(ValueError):
+            cloud.extend(np.zeros((2, 3)), 300.0, np.array([0, 9]))
+        with self.assertRaises(ValueError):
+            cloud.extend(np.zeros((2, 3)), np.zeros(3), 0)
+        self.assertEqual(cloud.size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import struct
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+import zlib
+
+import numpy as np
+
+import heat_transfer
+
+TYPES = {'Float64': np.float64, 'Float32': np.float32, 'Int32': np.int32, 'UInt8': np.uint8}
+
+
+def read_vtu(path):
+    """{array name: values} of a .vtu with raw appended data, decoding it the way VTK does"""
+    with open(path, 'rb') as vtu:
+        data = vtu.read()
+    start = data.index(b'<AppendedData encoding="raw">')
+    appended = data[data.index(b'_', start) + 1:]
+    root = ElementTree.fromstring(data[:start].decode() + '</VTKFile>')
+    compressed = root.get('compressor') == 'vtkZLibDataCompressor'
+
+    arrays = {}
+    for array in root.iter('DataArray'):
+        offset = int(array.get('offset'))
+        if compressed:
+            blocks = struct.unpack_from('<Q', appended, offset)[0]
+            sizes = struct.unpack_from(f'<{3 + blocks}Q', appended, offset)[3:]
+            position = offset + 8 * (3 + blocks)
+            raw = b''
+            for size in sizes:
+                raw += zlib.decompress(appended[position:position + size])
+                position += size
+        else:
+            size = struct.unpack_from('<Q', appended, offset)[0]
+            raw = appended[offset + 8:offset + 8 + size]
+        values = np.frombuffer(raw, dtype=TYPES[array.get('type')])
+        arrays[array.get('Name')] = values.reshape(-1, int(array.get('NumberOfComponents', 1)))
+    return root, arrays
+
+
+class TestVTKOutput(unittest.TestCase):
+    def setUp(self):
+        params = heat_transfer.CupParameters()
+        params.point_spacing = 0.008
+        params.include_air = False
+        self.cloud = heat_transfer.CupGenerator().generate(params)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check_vtu(self, path):
+        root, arrays = read_vtu(path)
+        n = self.cloud.size()
+        self.assertEqual(root.find('.//Piece').get('NumberOfPoints'), str(n))
+        points = arrays['Points']
+        for i in range(0, n, 37):
+            self.assertEqual(tuple(points[i]), (self.cloud.get_x(i), self.cloud.get_y(i), self.cloud.get_z(i)))
+            self.assertEqual(arrays['temperature'][i, 0], self.cloud.get_temperature(i))
+            self.assertEqual(arrays['material'][i, 0], int(self.cloud.get_point(i).get_material()))
+        self.assertEqual(arrays['surface_area'].shape, (n, 1))
+        self.assertEqual(list(arrays['connectivity'][:, 0]), list(range(n)))
+
+    def test_raw_and_compressed_vtu_hold_the_cloud(self):
+        raw = os.path.join(self.directory.name, 'cup.vtu')
+        self.cloud.save_to_vtk(raw)  # the extension picks the format
+        self.check_vtu(raw)
+        if heat_transfer.vtk_compression_available():
+            compressed = os.path.join(self.directory.name, 'cup_z.vtu')
+            self.cloud.save_to_vtu(compressed, compress=True)
+            self.check_vtu(compressed)
+            self.assertLess(os.path.getsize(compressed), os.path.getsize(raw))
+
+    def test_series_indexes_every_frame(self):
+        series = heat_transfer.VTKSeries(os.path.join(self.directory.name, 'run.pvd'))
+        for time in (0.0, 0.25, 0.5):
+            self.check_vtu(series.add_frame(self.cloud, time))
+        datasets = ElementTree.parse(series.get_path()).getroot().findall('.//DataSet')
+        self.assertEqual([float(d.get('timestep')) for d in datasets], [0.0, 0.25, 0.5])
+        self.assertEqual([d.get('file') for d in datasets], [f'run_{k:06d}.vtu' for k in range(3)])
+        for dataset in datasets:
+            self.assertTrue(os.path.exists(os.path.join(self.directory.name, dataset.get('file'))))
+
+
+if __name__ == '__main__':
+    unittest.main()